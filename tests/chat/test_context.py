@@ -0,0 +1,286 @@
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+from openai.types.responses.easy_input_message import EasyInputMessage
+
+from toyaikit.chat.context import (
+    ContextPolicy,
+    LLMSummarizer,
+    TrimReport,
+    collapse_tool_output,
+    get_role,
+    render_transcript,
+    split_turns,
+)
+from toyaikit.chat.conversation import Conversation
+from toyaikit.chat.runners import OpenAIResponsesRunner
+from toyaikit.llm import LLMClient
+from toyaikit.tools import Tools
+
+
+def count_messages(messages):
+    """Token counter used in tests: one token per message."""
+    return len(messages)
+
+
+def count_chars(messages):
+    return sum(len(str(message)) for message in messages)
+
+
+def user_message(text):
+    return {"role": "user", "content": text}
+
+
+def chat_history(turns, tool_output="x" * 100):
+    messages = [{"role": "system", "content": "You're a helpful assistant."}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": None, "tool_calls": []})
+        messages.append(
+            {"role": "tool", "tool_call_id": f"c{i}", "content": tool_output}
+        )
+        messages.append({"role": "assistant", "content": f"answer {i}"})
+    return messages
+
+
+class TestMessageHelpers:
+    def test_get_role(self):
+        assert get_role({"role": "system", "content": ""}) == "system"
+        assert get_role(EasyInputMessage(role="developer", content="")) == "system"
+        assert get_role(EasyInputMessage(role="user", content="")) == "user"
+        assert get_role({"type": "function_call_output", "output": ""}) == "tool"
+        assert get_role({"role": "tool", "content": ""}) == "tool"
+        assert get_role(D(type="function_call", name="f")) == "assistant"
+
+        anthropic_result = {
+            "role": "user",
+            "content": [{"type": "tool_result", "tool_use_id": "1", "content": ""}],
+        }
+        assert get_role(anthropic_result) == "tool"
+
+    def test_split_turns(self):
+        system, turns = split_turns(chat_history(3))
+
+        assert len(system) == 1
+        assert len(turns) == 3
+        assert all(len(turn) == 4 for turn in turns)
+        assert turns[1][0]["content"] == "question 1"
+
+    def test_collapse_tool_output_copies(self):
+        output = {"type": "function_call_output", "call_id": "1", "output": "long"}
+        collapsed = collapse_tool_output(output, "[removed]")
+
+        assert collapsed["output"] == "[removed]"
+        assert output["output"] == "long"
+
+        message = {"role": "tool", "tool_call_id": "1", "content": "long"}
+        assert collapse_tool_output(message, "[removed]")["content"] == "[removed]"
+
+    def test_render_transcript(self):
+        messages = [
+            {"role": "user", "content": "Hi"},
+            D(type="function_call", name="search", arguments='{"q": "rag"}'),
+            {"type": "function_call_output", "call_id": "1", "output": "found"},
+        ]
+
+        assert render_transcript(messages) == (
+            'user: Hi\n\nassistant: search({"q": "rag"})\n\ntool: found'
+        )
+
+
+class TestContextPolicy:
+    def test_no_limits_returns_messages_as_is(self):
+        messages = chat_history(3)
+        result, report = ContextPolicy().apply(messages)
+
+        assert result is messages
+        assert report is None
+
+    def test_under_budget_returns_messages_as_is(self):
+        messages = chat_history(3)
+        policy = ContextPolicy(max_tokens=100, token_counter=count_messages)
+
+        result, report = policy.apply(messages)
+
+        assert result is messages
+        assert report is None
+
+    def test_keep_turns(self):
+        messages = chat_history(5)
+        policy = ContextPolicy(keep_turns=2)
+
+        result, report = policy.apply(messages)
+
+        assert result[0] == messages[0]
+        assert result[1:] == messages[-8:]
+        assert report.dropped_messages == 12
+        assert report.tokens_after < report.tokens_before
+
+    def test_collapses_old_tool_outputs_first(self):
+        messages = chat_history(3, tool_output="x" * 1000)
+        policy = ContextPolicy(max_tokens=2200, token_counter=count_chars)
+
+        result, report = policy.apply(messages)
+
+        assert len(result) == len(messages)
+        assert report.dropped_messages == 0
+        assert report.collapsed_tool_outputs == 2
+        assert result[3]["content"].startswith("[Output removed")
+        assert result[7]["content"].startswith("[Output removed")
+        # The current turn is never changed
+        assert result[11]["content"] == "x" * 1000
+        # Neither is the history
+        assert messages[3]["content"] == "x" * 1000
+
+    def test_drops_oldest_turns_when_collapsing_is_not_enough(self):
+        messages = chat_history(4)
+        policy = ContextPolicy(max_tokens=9, token_counter=count_messages)
+
+        result, report = policy.apply(messages)
+
+        assert result[0] == messages[0]
+        assert [m["content"] for m in result[1::4]] == ["question 2", "question 3"]
+        # The kept old turn has its tool output collapsed
+        assert result[3]["content"].startswith("[Output removed")
+        assert report == TrimReport(
+            tokens_before=17,
+            tokens_after=9,
+            dropped_messages=8,
+            # Only the outputs still sent count, not those of dropped turns
+            collapsed_tool_outputs=1,
+        )
+
+    def test_keeps_current_turn_even_over_budget(self):
+        messages = chat_history(2)
+        policy = ContextPolicy(max_tokens=1, token_counter=count_messages)
+
+        result, report = policy.apply(messages)
+
+        assert result == messages[:1] + messages[-4:]
+        assert report.dropped_messages == 4
+
+    def test_model_budgets(self):
+        policy = ContextPolicy(max_tokens=1000, model_budgets={"small": 10})
+
+        assert policy.get_budget("small") == 10
+        assert policy.get_budget("large") == 1000
+
+        messages = chat_history(3)
+        policy.token_counter = count_messages
+        assert policy.apply(messages, model="large")[1] is None
+        assert policy.apply(messages, model="small")[1] is not None
+
+    def test_summarizes_dropped_turns(self):
+        summarizer = Mock(return_value="They asked two questions.")
+        policy = ContextPolicy(keep_turns=1, summarizer=summarizer)
+
+        messages = chat_history(3)
+        result, report = policy.apply(messages, user_message=user_message)
+
+        summarizer.assert_called_once_with(messages[1:9], None)
+        assert result[1] == {
+            "role": "user",
+            "content": "Summary of the earlier conversation:\nThey asked two questions.",
+        }
+        assert result[2:] == messages[-4:]
+        assert report.summarized_messages == 8
+        assert report.dropped_messages == 0
+
+    def test_summary_is_rolled_forward(self):
+        summarizer = Mock(side_effect=["first", "second"])
+        policy = ContextPolicy(keep_turns=1, summarizer=summarizer)
+
+        messages = Conversation(chat_history(2))
+        policy.apply(messages, user_message=user_message)
+        # Same dropped messages: the summary is reused
+        policy.apply(messages, user_message=user_message)
+
+        messages.extend(chat_history(3)[-4:])
+        result, _ = policy.apply(messages, user_message=user_message)
+
+        assert summarizer.call_count == 2
+        summarizer.assert_called_with(messages[5:9], "first")
+        assert result[1]["content"].endswith("second")
+
+    def test_summary_rolled_forward_with_budget_and_collapse(self):
+        """Test dropped turns reach the summarizer as they were, and only
+        the newly dropped ones are summarized"""
+        summarizer = Mock(side_effect=lambda dropped, previous: f"{len(dropped)}")
+        policy = ContextPolicy(
+            max_tokens=9, token_counter=count_messages, summarizer=summarizer
+        )
+        messages = Conversation(chat_history(3))
+
+        _, report = policy.apply(messages, user_message=user_message)
+        for i in range(3, 6):
+            messages.extend(chat_history(i + 1)[-4:])
+            _, report = policy.apply(messages, user_message=user_message)
+
+        previous_summaries = [c.args[1] for c in summarizer.call_args_list]
+        assert previous_summaries == [None, "4", "4", "4"]
+        for call in summarizer.call_args_list:
+            dropped = call.args[0]
+            assert len(dropped) == 4
+            assert not any(
+                str(m.get("content")).startswith("[Output removed") for m in dropped
+            )
+        assert report.collapsed_tool_outputs == 1
+
+    def test_summaries_kept_per_conversation(self):
+        """Test a shared policy doesn't mix up the summaries of conversations"""
+        summarizer = Mock(side_effect=["first", "second"])
+        policy = ContextPolicy(keep_turns=1, summarizer=summarizer)
+        first = Conversation(chat_history(2))
+        second = Conversation(chat_history(2))
+
+        for messages in [first, second, first, second]:
+            policy.apply(messages, user_message=user_message)
+
+        assert summarizer.call_count == 2
+        assert first.state != second.state
+        first_result, _ = policy.apply(first, user_message=user_message)
+        second_result, _ = policy.apply(second, user_message=user_message)
+        assert first_result[1]["content"].endswith("first")
+        assert second_result[1]["content"].endswith("second")
+
+
+class TestLLMSummarizer:
+    def test_summarizes_with_runner(self):
+        runner = Mock()
+        runner.loop.return_value = D(last_message="summary")
+        summarizer = LLMSummarizer(runner)
+
+        messages = [{"role": "user", "content": "Hi"}]
+        assert summarizer(messages, "earlier") == "summary"
+
+        prompt = runner.loop.call_args.kwargs["prompt"]
+        assert prompt == "Summary of the earlier conversation:\nearlier\n\nuser: Hi"
+
+
+class TestRunnerContextPolicy:
+    def test_loop_sends_trimmed_messages_and_reports_them(self):
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = D(
+            output=[D(type="message", content=[D(text="Answer")])],
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+        runner = OpenAIResponsesRunner(
+            tools=Mock(spec=Tools),
+            llm_client=llm_client,
+            context_policy=ContextPolicy(keep_turns=2),
+        )
+
+        result = runner.loop("one")
+        assert result.trimmed is None
+
+        result = runner.loop("two", previous_messages=result.all_messages)
+        result = runner.loop("three", previous_messages=result.all_messages)
+
+        sent = llm_client.send_request.call_args.kwargs["chat_messages"]
+        # developer prompt, "two", its answer and "three"
+        assert len(sent) == 4
+        assert sent[1].content == "two"
+        assert result.trimmed.dropped_messages == 2
+        # The full history is kept
+        assert len(result.all_messages) == 7
@@ -0,0 +1,156 @@
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+import pytest
+
+from toyaikit.chat.conversation import Conversation, ConversationView
+from toyaikit.chat.runners import AnthropicMessagesRunner, OpenAIResponsesRunner
+from toyaikit.llm import LLMClient
+from toyaikit.tools import Tools
+
+
+class TestConversation:
+    def test_is_append_only(self):
+        conversation = Conversation([1, 2])
+        conversation.append(3)
+        conversation.extend([4])
+        conversation += [5]
+
+        assert conversation == [1, 2, 3, 4, 5]
+
+        with pytest.raises(TypeError, match="append-only"):
+            conversation[0] = 10
+        with pytest.raises(TypeError):
+            del conversation[0]
+        with pytest.raises(TypeError):
+            conversation.insert(0, 0)
+        with pytest.raises(TypeError):
+            conversation.pop()
+        with pytest.raises(TypeError):
+            conversation.clear()
+
+    def test_view_is_a_fixed_window(self):
+        conversation = Conversation(["a", "b", "c"])
+        view = conversation.view(1)
+        conversation.append("d")
+
+        assert len(view) == 2
+        assert list(view) == ["b", "c"]
+        assert view[0] == "b"
+        assert view[-1] == "c"
+        assert view == ["b", "c"]
+        assert repr(view) == "['b', 'c']"
+        with pytest.raises(IndexError):
+            view[2]
+
+    def test_view_slicing(self):
+        conversation = Conversation(range(10))
+        view = conversation.view(2, 8)
+
+        sub_view = view[1:3]
+        assert isinstance(sub_view, ConversationView)
+        assert list(sub_view) == [3, 4]
+        assert view[::2] == [2, 4, 6]
+
+    def test_from_messages(self):
+        conversation = Conversation([1, 2])
+        assert Conversation.from_messages(conversation) is conversation
+
+        # A view that reaches the end continues the same conversation
+        assert Conversation.from_messages(conversation.view()) is conversation
+
+        # A stale view or a plain list is copied
+        stale_view = conversation.view()
+        conversation.append(3)
+        copied = Conversation.from_messages(stale_view)
+        assert copied is not conversation
+        assert copied == [1, 2]
+
+        messages = [1]
+        copied = Conversation.from_messages(messages)
+        copied.append(2)
+        assert messages == [1]
+
+        assert Conversation.from_messages(None) == []
+
+
+def text_response(text):
+    return D(
+        output=[D(type="message", content=[D(text=text)])],
+        usage=D(input_tokens=1, output_tokens=1),
+    )
+
+
+class TestRunnersWithConversation:
+    def setup_method(self):
+        self.llm_client = Mock(spec=LLMClient)
+        self.llm_client.model = "gpt-4o-mini"
+        self.runner = OpenAIResponsesRunner(
+            tools=Mock(spec=Tools), llm_client=self.llm_client
+        )
+
+    def test_loop_appends_to_conversation_in_place(self):
+        conversation = Conversation()
+        self.llm_client.send_request.side_effect = [
+            text_response("first"),
+            text_response("second"),
+        ]
+
+        first = self.runner.loop("one", previous_messages=conversation)
+        second = self.runner.loop("two", previous_messages=conversation)
+
+        # developer prompt, user, answer, user, answer
+        assert len(conversation) == 5
+        assert len(first.new_messages) == 3
+        assert len(first.all_messages) == 3
+        assert len(second.new_messages) == 2
+        assert list(second.all_messages) == list(conversation)
+        assert second.new_messages[1].content[0].text == "second"
+
+        sent = self.llm_client.send_request.call_args.kwargs["chat_messages"]
+        assert sent is conversation
+
+    def test_loop_continues_from_all_messages_without_copy(self):
+        self.llm_client.send_request.side_effect = [
+            text_response("first"),
+            text_response("second"),
+        ]
+
+        first = self.runner.loop("one")
+        second = self.runner.loop("two", previous_messages=first.all_messages)
+
+        assert second.all_messages.conversation is first.all_messages.conversation
+        # The earlier result is not affected by the later loop
+        assert len(first.all_messages) == 3
+        assert len(second.all_messages) == 5
+
+    def test_plain_list_is_not_modified(self):
+        previous = [{"role": "user", "content": "Earlier"}]
+        self.llm_client.send_request.return_value = text_response("Hi")
+
+        result = self.runner.loop("Hello", previous_messages=previous)
+
+        assert previous == [{"role": "user", "content": "Earlier"}]
+        assert len(result.all_messages) == 3
+
+    def test_run_keeps_one_conversation(self):
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "claude-sonnet-4-5-20250514"
+        llm_client.send_request.return_value = D(
+            content=[D(type="text", text="Hi")],
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+        interface = Mock()
+        interface.input.side_effect = ["hello", "again", "stop"]
+
+        runner = AnthropicMessagesRunner(
+            tools=Mock(spec=Tools),
+            chat_interface=interface,
+            llm_client=llm_client,
+        )
+        result = runner.run()
+
+        # system, (user, assistant) x 2
+        assert len(result.all_messages) == 5
+        first_call, second_call = llm_client.send_request.call_args_list
+        assert first_call.kwargs["chat_messages"] is second_call.kwargs["chat_messages"]
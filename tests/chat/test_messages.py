@@ -0,0 +1,168 @@
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+import pytest
+
+from toyaikit.chat.conversation import Conversation
+from toyaikit.chat.messages import (
+    ANTHROPIC,
+    CHAT_COMPLETIONS,
+    RESPONSES,
+    ChatMessage,
+    ToolCall,
+    decode_messages,
+    encode_messages,
+    get_chat_messages,
+)
+from toyaikit.chat.runners import (
+    AnthropicMessagesRunner,
+    OpenAIChatCompletionsRunner,
+    OpenAIResponsesRunner,
+)
+from toyaikit.formats import convert_messages
+from toyaikit.llm import LLMClient
+
+
+class TestChatMessage:
+    """Tests for the provider-neutral message"""
+
+    def test_uses_slots(self):
+        message = ChatMessage("user", "Hi")
+        assert not hasattr(message, "__dict__")
+        with pytest.raises(AttributeError):
+            message.extra = 1
+
+    def test_encode_is_memoized(self):
+        message = ChatMessage(
+            "assistant", "Checking", tool_calls=[ToolCall("c1", "search", "{}")]
+        )
+
+        first = message.encode(RESPONSES)
+        assert message.encode(RESPONSES) is first
+        assert first == [
+            {"role": "assistant", "content": "Checking"},
+            {
+                "type": "function_call",
+                "call_id": "c1",
+                "name": "search",
+                "arguments": "{}",
+            },
+        ]
+
+    def test_encode_formats(self):
+        message = ChatMessage("tool", '"sunny"', tool_call_id="c1")
+
+        assert message.encode(CHAT_COMPLETIONS) == [
+            {"role": "tool", "content": '"sunny"', "tool_call_id": "c1"}
+        ]
+        assert message.encode(ANTHROPIC) == [
+            {"role": "tool", "tool_call_id": "c1", "content": '"sunny"'}
+        ]
+
+    def test_function_calls_of_a_turn_merged(self):
+        messages = [
+            D(type="message", role="assistant", content=[D(text="Let me look")]),
+            {"type": "function_call", "call_id": "a", "name": "f", "arguments": "{}"},
+            {"type": "function_call", "call_id": "b", "name": "g", "arguments": "{}"},
+        ]
+
+        (message,) = decode_messages(messages, RESPONSES)
+
+        assert message.text == "Let me look"
+        assert [call.id for call in message.tool_calls] == ["a", "b"]
+
+    def test_round_trip(self):
+        chat_messages = [
+            ChatMessage("system", "Be brief"),
+            ChatMessage("user", "Weather?"),
+            ChatMessage("assistant", tool_calls=[ToolCall("c1", "weather", "{}")]),
+            ChatMessage("tool", "sunny", tool_call_id="c1"),
+            ChatMessage("assistant", "Sunny"),
+        ]
+
+        for message_format in (RESPONSES, CHAT_COMPLETIONS, ANTHROPIC):
+            encoded = encode_messages(chat_messages, message_format)
+            assert decode_messages(encoded, message_format) == chat_messages
+
+
+class TestConversationCache:
+    """Tests for converting a Conversation only once"""
+
+    def test_only_new_messages_decoded(self):
+        conversation = Conversation(
+            [
+                {"role": "system", "content": "Be brief"},
+                {"role": "user", "content": "Hi"},
+            ]
+        )
+
+        first = get_chat_messages(conversation, CHAT_COMPLETIONS)
+        system_message = first[0]
+
+        conversation.append({"role": "assistant", "content": "Hello"})
+        second = get_chat_messages(conversation, CHAT_COMPLETIONS)
+
+        assert len(second) == 3
+        assert second[0] is system_message
+
+    def test_encoded_messages_reused(self):
+        conversation = Conversation([{"role": "user", "content": "Hi"}])
+
+        first = convert_messages(conversation, CHAT_COMPLETIONS, RESPONSES)
+        conversation.append({"role": "assistant", "content": "Hello"})
+        second = convert_messages(conversation, CHAT_COMPLETIONS, RESPONSES)
+
+        assert second[0] is first[0]
+        assert second[1] == {"role": "assistant", "content": "Hello"}
+
+    def test_lists_are_not_cached(self):
+        messages = [{"role": "user", "content": "Hi"}]
+        assert get_chat_messages(messages, CHAT_COMPLETIONS) == [
+            ChatMessage("user", "Hi")
+        ]
+
+
+class TestRunnerMessageFormats:
+    """Tests for moving a history between runners"""
+
+    def test_message_formats(self):
+        assert OpenAIResponsesRunner.message_format == RESPONSES
+        assert OpenAIChatCompletionsRunner.message_format == CHAT_COMPLETIONS
+        assert AnthropicMessagesRunner.message_format == ANTHROPIC
+
+    def test_continue_responses_history_with_anthropic_runner(self):
+        responses_client = Mock(spec=LLMClient)
+        responses_client.model = "gpt-4o-mini"
+        responses_client.send_request.return_value = D(
+            id="resp_1",
+            output=[D(type="message", role="assistant", content=[D(text="Hi!")])],
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+        responses_runner = OpenAIResponsesRunner(
+            tools=None, llm_client=responses_client
+        )
+        result = responses_runner.loop("Hello")
+
+        anthropic_client = Mock(spec=LLMClient)
+        anthropic_client.model = "claude-haiku-4-5"
+        anthropic_client.send_request.return_value = D(
+            content=[D(type="text", text="Sure")],
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+        anthropic_runner = AnthropicMessagesRunner(
+            tools=None, llm_client=anthropic_client
+        )
+        previous_messages = convert_messages(
+            result.all_messages,
+            responses_runner.message_format,
+            anthropic_runner.message_format,
+        )
+        anthropic_runner.loop("More", previous_messages=previous_messages)
+
+        sent = anthropic_client.send_request.call_args.kwargs["chat_messages"]
+        assert sent[:4] == [
+            {"role": "system", "content": "You're a helpful assistant."},
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi!"},
+            {"role": "user", "content": "More"},
+        ]
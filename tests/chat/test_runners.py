@@ -1,4 +1,7 @@
+import asyncio
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace as D
 from unittest.mock import AsyncMock, Mock, patch
 
@@ -1197,3 +1200,510 @@ class TestAnthropicMessagesRunner:
 
         # Should stop after second message due to stop criteria
         assert self.mock_llm_client.send_request.call_count == 2
+
+    def test_loop_counts_cache_tokens(self):
+        """Test cache tokens are added to the input tokens and reported"""
+        self.mock_llm_client.model = "claude-sonnet-4-5-20250514"
+        usage = D(
+            input_tokens=10,
+            output_tokens=5,
+            cache_creation_input_tokens=1000,
+            cache_read_input_tokens=None,
+        )
+        tool_use = D(type="tool_use", id="toolu_1", name="search", input={})
+        self.mock_tools.function_call.return_value = {"output": "found"}
+        self.mock_llm_client.send_request.side_effect = [
+            D(content=[tool_use], usage=usage),
+            D(
+                content=[D(type="text", text="Done")],
+                usage=D(
+                    input_tokens=20,
+                    output_tokens=5,
+                    cache_creation_input_tokens=30,
+                    cache_read_input_tokens=1000,
+                ),
+            ),
+        ]
+
+        result = self.runner.loop("Search")
+
+        assert result.tokens == TokenUsage(
+            model="claude-sonnet-4-5-20250514",
+            input_tokens=2060,
+            output_tokens=10,
+            cache_creation_input_tokens=1030,
+            cache_read_input_tokens=1000,
+        )
+        assert result.cost == self.runner.pricing_config.calculate_usage_cost(
+            result.tokens
+        )
+
+
+class TestAsyncLoop:
+    @pytest.mark.asyncio
+    async def test_responses_aloop_with_async_client(self):
+        """Test aloop awaits an async client and runs tool calls"""
+        function_call = D(
+            type="function_call",
+            name="test_func",
+            arguments="{}",
+            call_id="call_1",
+        )
+        message_entry = D(type="message", content=[D(text="Done")])
+        usage = D(input_tokens=10, output_tokens=20)
+
+        llm_client = Mock()
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request = AsyncMock(
+            side_effect=[
+                D(output=[function_call], usage=usage),
+                D(output=[message_entry], usage=usage),
+            ]
+        )
+
+        def test_func():
+            return "result"
+
+        tools = Tools()
+        tools.add_tool(test_func)
+
+        runner = OpenAIResponsesRunner(tools=tools, llm_client=llm_client)
+        callback = Mock(spec=RunnerCallback)
+
+        result = await runner.aloop("Test prompt", callback=callback)
+
+        assert isinstance(result, LoopResult)
+        assert llm_client.send_request.await_count == 2
+        callback.on_function_call.assert_called_once_with(function_call, '"result"')
+        callback.on_message.assert_called_once_with("Done")
+        assert result.last_message == "Done"
+        assert result.tokens.input_tokens == 20
+        assert result.tokens.output_tokens == 40
+        assert len(result.new_messages) == 5
+
+    @pytest.mark.asyncio
+    async def test_chat_completions_aloop_with_sync_client(self):
+        """Test aloop also works with a synchronous client"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = D(
+            choices=[D(message=D(content="Hi", tool_calls=None))],
+            usage=D(prompt_tokens=5, completion_tokens=7),
+        )
+
+        runner = OpenAIChatCompletionsRunner(tools=Mock(spec=Tools), llm_client=llm_client)
+
+        result = await runner.aloop("Hello")
+
+        assert result.last_message == "Hi"
+        assert result.tokens.input_tokens == 5
+        assert result.tokens.output_tokens == 7
+
+    @pytest.mark.asyncio
+    async def test_anthropic_aloop_concurrent(self):
+        """Test several aloop calls can share one runner concurrently"""
+
+        async def send_request(chat_messages, tools, output_format):
+            await asyncio.sleep(0.01)
+            prompt = chat_messages[-1]["content"]
+            return D(
+                content=[D(type="text", text=f"echo {prompt}")],
+                usage=D(input_tokens=1, output_tokens=1),
+            )
+
+        llm_client = Mock()
+        llm_client.model = "claude-sonnet-4-5-20250514"
+        llm_client.send_request = send_request
+
+        runner = AnthropicMessagesRunner(tools=Mock(spec=Tools), llm_client=llm_client)
+
+        results = await asyncio.gather(
+            *(runner.aloop(f"prompt {i}") for i in range(5))
+        )
+
+        assert [r.last_message for r in results] == [
+            f"echo prompt {i}" for i in range(5)
+        ]
+
+
+class TestParallelToolCalls:
+    def make_calls(self):
+        return [
+            D(type="function_call", name="wait", arguments=json.dumps({"n": i}), call_id=f"call_{i}")
+            for i in range(3)
+        ]
+
+    def make_tools(self, parties):
+        # Each call blocks until all of them run at the same time,
+        # so sequential execution would break the barrier
+        barrier = threading.Barrier(parties, timeout=5)
+
+        def wait(n: int):
+            barrier.wait()
+            return n
+
+        tools = Tools()
+        tools.add_tool(wait)
+        return tools
+
+    def test_loop_runs_calls_of_one_turn_concurrently(self):
+        """Test tool_executor runs calls concurrently and keeps their order"""
+        calls = self.make_calls()
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        usage = D(input_tokens=1, output_tokens=1)
+        llm_client.send_request.side_effect = [
+            D(output=calls, usage=usage),
+            D(output=[D(type="message", content=[D(text="Done")])], usage=usage),
+        ]
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            runner = OpenAIResponsesRunner(
+                tools=self.make_tools(3),
+                llm_client=llm_client,
+                tool_executor=executor,
+            )
+            callback = Mock(spec=RunnerCallback)
+            result = runner.loop("go", callback=callback)
+
+        outputs = [m for m in result.new_messages if isinstance(m, dict) and m.get("type") == "function_call_output"]
+        assert [o["call_id"] for o in outputs] == ["call_0", "call_1", "call_2"]
+        assert [o["output"] for o in outputs] == ["0", "1", "2"]
+
+        reported = [c.args for c in callback.on_function_call.call_args_list]
+        assert reported == [(calls[0], "0"), (calls[1], "1"), (calls[2], "2")]
+
+    def test_chat_completions_loop_with_executor(self):
+        """Test parallel execution for Chat Completions tool calls"""
+        tool_calls = [
+            D(function=D(name="wait", arguments=json.dumps({"n": i})), id=f"call_{i}")
+            for i in range(2)
+        ]
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        usage = D(prompt_tokens=1, completion_tokens=1)
+        llm_client.send_request.side_effect = [
+            D(choices=[D(message=D(content="", tool_calls=tool_calls))], usage=usage),
+            D(choices=[D(message=D(content="Done", tool_calls=None))], usage=usage),
+        ]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            runner = OpenAIChatCompletionsRunner(
+                tools=self.make_tools(2),
+                llm_client=llm_client,
+                tool_executor=executor,
+            )
+            result = runner.loop("go")
+
+        tool_messages = [m for m in result.new_messages if isinstance(m, dict) and m.get("role") == "tool"]
+        assert [m["tool_call_id"] for m in tool_messages] == ["call_0", "call_1"]
+        assert [m["content"] for m in tool_messages] == ["0", "1"]
+
+    @pytest.mark.asyncio
+    async def test_aloop_gathers_async_tools(self):
+        """Test aloop runs async tools of one turn concurrently"""
+        started = []
+        release = asyncio.Event()
+
+        async def fetch(n: int):
+            started.append(n)
+            if len(started) == 2:
+                release.set()
+            await asyncio.wait_for(release.wait(), timeout=5)
+            return n * 10
+
+        tools = Tools()
+        tools.add_tool(fetch)
+
+        blocks = [
+            D(type="tool_use", id=f"toolu_{i}", name="fetch", input={"n": i})
+            for i in range(2)
+        ]
+        usage = D(input_tokens=1, output_tokens=1)
+        llm_client = Mock()
+        llm_client.model = "claude-sonnet-4-5-20250514"
+        llm_client.send_request = AsyncMock(
+            side_effect=[
+                D(content=blocks, usage=usage),
+                D(content=[D(type="text", text="Done")], usage=usage),
+            ]
+        )
+
+        runner = AnthropicMessagesRunner(
+            tools=tools,
+            llm_client=llm_client,
+            tool_executor=ThreadPoolExecutor(max_workers=2),
+        )
+        callback = Mock(spec=RunnerCallback)
+        result = await runner.aloop("go", callback=callback)
+
+        tool_messages = [m for m in result.new_messages if isinstance(m, dict) and m.get("role") == "tool"]
+        assert [m["content"] for m in tool_messages] == ["0", "10"]
+        reported = [c.args[0].call_id for c in callback.on_function_call.call_args_list]
+        assert reported == ["toolu_0", "toolu_1"]
+
+
+class TestLoopMany:
+    def setup_method(self):
+        self.llm_client = Mock(spec=LLMClient)
+        self.llm_client.model = "gpt-4o-mini"
+
+        def send_request(chat_messages, tools=None, output_format=None):
+            prompt = chat_messages[-1].content
+            if prompt == "fail":
+                raise RuntimeError("boom")
+            return D(
+                output=[D(type="message", content=[D(text=f"answer to {prompt}")])],
+                usage=D(input_tokens=10, output_tokens=5),
+            )
+
+        self.llm_client.send_request.side_effect = send_request
+        self.runner = OpenAIResponsesRunner(
+            tools=Mock(spec=Tools), llm_client=self.llm_client
+        )
+
+    def test_loop_many_returns_results_in_order(self):
+        """Test loop_many runs every prompt and aggregates tokens and cost"""
+        prompts = [f"q{i}" for i in range(10)]
+
+        batch = self.runner.loop_many(prompts, concurrency=3)
+
+        assert [item.index for item in batch.items] == list(range(10))
+        assert [r.last_message for r in batch.results] == [
+            f"answer to q{i}" for i in range(10)
+        ]
+        assert batch.tokens == TokenUsage(
+            model="gpt-4o-mini", input_tokens=100, output_tokens=50
+        )
+        assert isinstance(batch.cost, CostInfo)
+        assert batch.failed == []
+
+    def test_loop_many_captures_errors(self):
+        """Test an error in one loop doesn't stop the others"""
+        batch = self.runner.loop_many(["a", "fail", "b"])
+
+        assert batch.results[0].last_message == "answer to a"
+        assert batch.results[1] is None
+        assert batch.results[2].last_message == "answer to b"
+        assert len(batch.failed) == 1
+        assert batch.failed[0].prompt == "fail"
+        assert isinstance(batch.failed[0].error, RuntimeError)
+        assert batch.tokens.input_tokens == 20
+
+    def test_loop_many_bounds_concurrency(self):
+        """Test at most `concurrency` loops run at the same time"""
+        running = 0
+        max_running = 0
+        lock = threading.Lock()
+        send_request = self.llm_client.send_request.side_effect
+
+        def slow_send_request(**kwargs):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            threading.Event().wait(0.01)
+            with lock:
+                running -= 1
+            return send_request(**kwargs)
+
+        self.llm_client.send_request.side_effect = slow_send_request
+
+        batch = self.runner.loop_many([str(i) for i in range(12)], concurrency=2)
+
+        assert len(batch.items) == 12
+        assert max_running <= 2
+
+    def test_loop_many_progress_and_unordered(self):
+        """Test progress callback and as-completed ordering"""
+        progress = []
+
+        batch = self.runner.loop_many(
+            ["a", "b", "c"],
+            ordered=False,
+            on_progress=lambda item, done, total: progress.append((done, total)),
+        )
+
+        assert progress == [(1, 3), (2, 3), (3, 3)]
+        assert sorted(item.index for item in batch.items) == [0, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_aloop_many(self):
+        """Test aloop_many runs prompts with bounded concurrency"""
+        running = 0
+        max_running = 0
+
+        async def send_request(chat_messages, tools=None, output_format=None):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+            prompt = chat_messages[-1].content
+            if prompt == "fail":
+                raise RuntimeError("boom")
+            return D(
+                output=[D(type="message", content=[D(text=prompt)])],
+                usage=D(input_tokens=1, output_tokens=1),
+            )
+
+        self.llm_client.send_request = send_request
+        progress = []
+
+        batch = await self.runner.aloop_many(
+            ["a", "fail", "b", "c"],
+            concurrency=2,
+            on_progress=lambda item, done, total: progress.append(done),
+        )
+
+        assert max_running == 2
+        assert [item.prompt for item in batch.items] == ["a", "fail", "b", "c"]
+        assert batch.results[2].last_message == "b"
+        assert batch.failed[0].index == 1
+        assert batch.tokens.output_tokens == 3
+        assert progress == [1, 2, 3, 4]
+
+
+class TestStatefulResponsesRunner:
+    def setup_method(self):
+        self.llm_client = Mock(spec=LLMClient)
+        self.llm_client.model = "gpt-4o-mini"
+        self.tools = Mock(spec=Tools)
+        self.runner = OpenAIResponsesRunner(
+            tools=self.tools, llm_client=self.llm_client, stateful=True
+        )
+
+    def response(self, response_id, output):
+        return D(
+            id=response_id,
+            output=output,
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+
+    def record_requests(self, responses):
+        """Make send_request return responses, keeping a copy of each request"""
+        requests = []
+        responses = iter(responses)
+
+        def send_request(chat_messages, **kwargs):
+            requests.append(dict(kwargs, chat_messages=list(chat_messages)))
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.llm_client.send_request.side_effect = send_request
+        return requests
+
+    def test_sends_only_new_messages(self):
+        """Test requests after the first one send the delta and the previous id"""
+        function_call = D(
+            type="function_call", call_id="call_1", name="search", arguments="{}"
+        )
+        call_output = {
+            "type": "function_call_output",
+            "call_id": "call_1",
+            "output": "found",
+        }
+        self.tools.function_call.return_value = call_output
+        message = D(type="message", content=[D(text="Done")])
+        requests = self.record_requests(
+            [
+                self.response("resp_1", [function_call]),
+                self.response("resp_2", [message]),
+                self.response("resp_3", [message]),
+            ]
+        )
+
+        result = self.runner.loop("Search")
+        result = self.runner.loop("Again", previous_messages=result.all_messages)
+
+        first, second, third = requests
+        assert len(first["chat_messages"]) == 2
+        assert "previous_response_id" not in first
+
+        assert second["previous_response_id"] == "resp_1"
+        assert second["chat_messages"] == [call_output]
+
+        assert third["previous_response_id"] == "resp_2"
+        assert [m.content for m in third["chat_messages"]] == ["Again"]
+
+        # The full history is still kept locally
+        assert len(result.all_messages) == 7
+
+    def test_falls_back_to_full_history_when_response_expired(self):
+        """Test an expired previous response is replaced by a full replay"""
+        import httpx
+        import openai
+
+        request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+        expired = openai.BadRequestError(
+            "Previous response with id 'resp_1' not found.",
+            response=httpx.Response(400, request=request),
+            body={"code": "previous_response_not_found"},
+        )
+        message = D(type="message", content=[D(text="Hi")])
+        requests = self.record_requests(
+            [
+                self.response("resp_1", [message]),
+                expired,
+                self.response("resp_2", [message]),
+            ]
+        )
+
+        result = self.runner.loop("Hello")
+        result = self.runner.loop("Again", previous_messages=result.all_messages)
+
+        assert requests[1]["previous_response_id"] == "resp_1"
+        assert "previous_response_id" not in requests[2]
+        assert len(requests[2]["chat_messages"]) == 4
+        assert result.last_message == "Hi"
+        assert result.all_messages.conversation.state["previous_response"] == (
+            "resp_2",
+            5,
+        )
+
+    def test_other_errors_are_raised(self):
+        """Test errors unrelated to the stored response are not retried"""
+        message = D(type="message", content=[D(text="Hi")])
+        self.llm_client.send_request.side_effect = [
+            self.response("resp_1", [message]),
+            RuntimeError("boom"),
+        ]
+
+        result = self.runner.loop("Hello")
+        with pytest.raises(RuntimeError):
+            self.runner.loop("Again", previous_messages=result.all_messages)
+
+    @pytest.mark.asyncio
+    async def test_aloop_sends_only_new_messages(self):
+        """Test stateful mode with an async client"""
+        message = D(type="message", content=[D(text="Hi")])
+        self.llm_client.send_request = AsyncMock(
+            side_effect=[
+                self.response("resp_1", [message]),
+                self.response("resp_2", [message]),
+            ]
+        )
+
+        result = await self.runner.aloop("Hello")
+        await self.runner.aloop("Again", previous_messages=result.all_messages)
+
+        second = self.llm_client.send_request.call_args_list[1]
+        assert second.kwargs["previous_response_id"] == "resp_1"
+        assert len(second.kwargs["chat_messages"]) == 1
+
+    def test_not_stateful_by_default(self):
+        """Test the full history is sent without stateful=True"""
+        runner = OpenAIResponsesRunner(tools=self.tools, llm_client=self.llm_client)
+        message = D(type="message", content=[D(text="Hi")])
+        requests = self.record_requests(
+            [self.response("resp_1", [message]), self.response("resp_2", [message])]
+        )
+
+        result = runner.loop("Hello")
+        runner.loop("Again", previous_messages=result.all_messages)
+
+        assert "previous_response_id" not in requests[1]
+        assert len(requests[1]["chat_messages"]) == 4
@@ -0,0 +1,538 @@
+import asyncio
+import threading
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+import pytest
+from anthropic.types import Message, MessageDeltaUsage, TextBlock, ToolUseBlock
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+
+from toyaikit.chat.runners import (
+    AnthropicMessagesRunner,
+    OpenAIChatCompletionsRunner,
+    OpenAIResponsesRunner,
+    RunnerCallback,
+)
+from toyaikit.chat.streaming import (
+    AnthropicStreamAccumulator,
+    ChatCompletionsStreamAccumulator,
+    LoopCompletedEvent,
+    ReasoningDeltaEvent,
+    ResponsesStreamAccumulator,
+    TextDeltaEvent,
+    ToolCallFinishedEvent,
+    ToolCallStartedEvent,
+    UsageEvent,
+)
+from toyaikit.llm import LLMClient
+from toyaikit.tools import Tools
+
+
+def responses_stream(output, deltas=(), reasoning=()):
+    events = []
+    for text in reasoning:
+        events.append(D(type="response.reasoning_summary_text.delta", delta=text))
+    for item in output:
+        events.append(D(type="response.output_item.added", item=item))
+    for text in deltas:
+        events.append(D(type="response.output_text.delta", delta=text))
+    usage = D(input_tokens=10, output_tokens=5)
+    events.append(D(type="response.completed", response=D(output=output, usage=usage)))
+    return events
+
+
+def chat_chunk(delta, finish_reason=None, usage=None):
+    choices = (
+        []
+        if delta is None
+        else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    )
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 1,
+            "model": "gpt-4o-mini",
+            "choices": choices,
+            "usage": usage,
+        }
+    )
+
+
+def anthropic_message_start():
+    message = Message.model_validate(
+        {
+            "id": "msg_1",
+            "type": "message",
+            "role": "assistant",
+            "model": "claude-sonnet-4-5-20250514",
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": 12, "output_tokens": 1},
+        }
+    )
+    return D(type="message_start", message=message)
+
+
+def anthropic_message_delta(output_tokens):
+    return D(
+        type="message_delta",
+        delta=D(stop_reason="end_turn", stop_sequence=None),
+        usage=MessageDeltaUsage(output_tokens=output_tokens),
+    )
+
+
+class TestResponsesStreamAccumulator:
+    def test_text_reasoning_and_tool_events(self):
+        function_call = D(type="function_call", name="search", call_id="call_1")
+        accumulator = ResponsesStreamAccumulator()
+
+        events = []
+        for raw in responses_stream(
+            [function_call], deltas=["Hel", "lo"], reasoning=["Think"]
+        ):
+            events.extend(accumulator.add(raw))
+
+        assert events == [
+            ReasoningDeltaEvent(text="Think"),
+            ToolCallStartedEvent(call_id="call_1", name="search"),
+            TextDeltaEvent(text="Hel"),
+            TextDeltaEvent(text="lo"),
+        ]
+        assert accumulator.get_response().output == [function_call]
+
+    def test_failed_response_raises(self):
+        accumulator = ResponsesStreamAccumulator()
+        failed = D(type="response.failed", response=D(error="boom"))
+
+        with pytest.raises(RuntimeError, match="boom"):
+            accumulator.add(failed)
+
+    def test_incomplete_stream_raises(self):
+        with pytest.raises(RuntimeError):
+            ResponsesStreamAccumulator().get_response()
+
+
+class TestChatCompletionsStreamAccumulator:
+    def test_rebuilds_message_with_tool_calls(self):
+        accumulator = ChatCompletionsStreamAccumulator()
+        chunks = [
+            chat_chunk({"role": "assistant", "content": "Let me "}),
+            chat_chunk({"content": "check"}),
+            chat_chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": 0,
+                            "id": "call_1",
+                            "type": "function",
+                            "function": {"name": "search", "arguments": '{"q": '},
+                        }
+                    ]
+                }
+            ),
+            chat_chunk(
+                {"tool_calls": [{"index": 0, "function": {"arguments": '"x"}'}}]}
+            ),
+            chat_chunk({}, finish_reason="tool_calls"),
+            chat_chunk(
+                None,
+                usage={"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10},
+            ),
+        ]
+
+        events = []
+        for chunk in chunks:
+            events.extend(accumulator.add(chunk))
+
+        assert events == [
+            TextDeltaEvent(text="Let me "),
+            TextDeltaEvent(text="check"),
+            ToolCallStartedEvent(call_id="call_1", name="search"),
+        ]
+
+        response = accumulator.get_response()
+        message = response.choices[0].message
+        assert message.content == "Let me check"
+        assert message.tool_calls[0].id == "call_1"
+        assert message.tool_calls[0].function.arguments == '{"q": "x"}'
+        assert response.choices[0].finish_reason == "tool_calls"
+        assert response.usage.prompt_tokens == 7
+
+
+class TestAnthropicStreamAccumulator:
+    def test_rebuilds_message(self):
+        accumulator = AnthropicStreamAccumulator()
+        raw_events = [
+            anthropic_message_start(),
+            D(
+                type="content_block_start",
+                index=0,
+                content_block=TextBlock(type="text", text=""),
+            ),
+            D(
+                type="content_block_delta",
+                index=0,
+                delta=D(type="text_delta", text="Hi "),
+            ),
+            D(
+                type="content_block_delta",
+                index=0,
+                delta=D(type="text_delta", text="there"),
+            ),
+            D(type="content_block_stop", index=0),
+            D(
+                type="content_block_start",
+                index=1,
+                content_block=ToolUseBlock(
+                    type="tool_use", id="toolu_1", name="search", input={}
+                ),
+            ),
+            D(
+                type="content_block_delta",
+                index=1,
+                delta=D(type="input_json_delta", partial_json='{"q": '),
+            ),
+            D(
+                type="content_block_delta",
+                index=1,
+                delta=D(type="input_json_delta", partial_json='"x"}'),
+            ),
+            D(type="content_block_stop", index=1),
+            anthropic_message_delta(output_tokens=9),
+            D(type="message_stop"),
+        ]
+
+        events = []
+        for raw in raw_events:
+            events.extend(accumulator.add(raw))
+
+        assert events == [
+            TextDeltaEvent(text="Hi "),
+            TextDeltaEvent(text="there"),
+            ToolCallStartedEvent(call_id="toolu_1", name="search"),
+        ]
+
+        message = accumulator.get_response()
+        assert message.content[0].text == "Hi there"
+        assert message.content[1].input == {"q": "x"}
+        assert message.usage.input_tokens == 12
+        assert message.usage.output_tokens == 9
+        assert message.stop_reason == "end_turn"
+
+
+def make_tools():
+    def search(q: str):
+        return f"results for {q}"
+
+    tools = Tools()
+    tools.add_tool(search)
+    return tools
+
+
+class TestStreamLoop:
+    def test_responses_stream_loop(self):
+        function_call = D(
+            type="function_call",
+            name="search",
+            arguments='{"q": "x"}',
+            call_id="call_1",
+        )
+        message = D(type="message", content=[D(text="Found it")])
+
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = [
+            iter(responses_stream([function_call])),
+            iter(responses_stream([message], deltas=["Found", " it"])),
+        ]
+
+        runner = OpenAIResponsesRunner(tools=make_tools(), llm_client=llm_client)
+        callback = Mock(spec=RunnerCallback)
+
+        events = list(runner.stream_loop("find x", callback=callback))
+
+        assert llm_client.send_request.call_args.kwargs["stream"] is True
+        assert events[:3] == [
+            ToolCallStartedEvent(call_id="call_1", name="search"),
+            UsageEvent(input_tokens=10, output_tokens=5),
+            ToolCallFinishedEvent(
+                function_call=function_call, result='"results for x"'
+            ),
+        ]
+        assert events[3:6] == [
+            TextDeltaEvent(text="Found"),
+            TextDeltaEvent(text=" it"),
+            UsageEvent(input_tokens=10, output_tokens=5),
+        ]
+
+        completed = events[-1]
+        assert isinstance(completed, LoopCompletedEvent)
+        assert completed.result.last_message == "Found it"
+        assert completed.result.tokens.input_tokens == 20
+        callback.on_message.assert_called_once_with("Found it")
+
+    def test_chat_completions_stream_loop(self):
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = iter(
+            [
+                chat_chunk({"role": "assistant", "content": "Hello"}),
+                chat_chunk({}, finish_reason="stop"),
+                chat_chunk(
+                    None,
+                    usage={
+                        "prompt_tokens": 4,
+                        "completion_tokens": 2,
+                        "total_tokens": 6,
+                    },
+                ),
+            ]
+        )
+
+        runner = OpenAIChatCompletionsRunner(tools=make_tools(), llm_client=llm_client)
+        events = list(runner.stream_loop("hi"))
+
+        assert events[0] == TextDeltaEvent(text="Hello")
+        assert events[1] == UsageEvent(input_tokens=4, output_tokens=2)
+        assert events[2].result.last_message == "Hello"
+        assert len(events[2].result.new_messages) == 3
+
+    @pytest.mark.asyncio
+    async def test_anthropic_astream_loop_with_async_client(self):
+        async def stream():
+            for raw in [
+                anthropic_message_start(),
+                D(
+                    type="content_block_start",
+                    index=0,
+                    content_block=TextBlock(type="text", text=""),
+                ),
+                D(
+                    type="content_block_delta",
+                    index=0,
+                    delta=D(type="text_delta", text="Hi"),
+                ),
+                D(type="content_block_stop", index=0),
+                anthropic_message_delta(output_tokens=3),
+            ]:
+                yield raw
+
+        async def send_request(chat_messages, tools, stream):
+            return stream_gen
+
+        stream_gen = stream()
+        llm_client = Mock()
+        llm_client.model = "claude-sonnet-4-5-20250514"
+        llm_client.send_request = send_request
+
+        runner = AnthropicMessagesRunner(tools=make_tools(), llm_client=llm_client)
+        events = [event async for event in runner.astream_loop("hello")]
+
+        assert events[0] == TextDeltaEvent(text="Hi")
+        assert events[1] == UsageEvent(input_tokens=12, output_tokens=3)
+        assert events[2].result.last_message == "Hi"
+
+    @pytest.mark.asyncio
+    async def test_astream_loop_with_sync_client(self):
+        message = D(type="message", content=[D(text="Hi")])
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = iter(
+            responses_stream([message], deltas=["Hi"])
+        )
+
+        runner = OpenAIResponsesRunner(tools=make_tools(), llm_client=llm_client)
+        events = [event async for event in runner.astream_loop("hello")]
+
+        assert [type(e) for e in events] == [
+            TextDeltaEvent,
+            UsageEvent,
+            LoopCompletedEvent,
+        ]
+        assert events[0].text == "Hi"
+
+
+class TestEarlyToolDispatch:
+    def test_responses_accumulator_reports_completed_calls(self):
+        function_call = D(type="function_call", name="search", call_id="call_1")
+        accumulator = ResponsesStreamAccumulator()
+
+        accumulator.add(D(type="response.output_item.added", item=function_call))
+        assert accumulator.pop_completed_calls() == []
+
+        accumulator.add(D(type="response.output_item.done", item=function_call))
+        assert accumulator.pop_completed_calls() == [function_call]
+        assert accumulator.pop_completed_calls() == []
+
+    def test_chat_accumulator_completes_call_when_next_one_starts(self):
+        accumulator = ChatCompletionsStreamAccumulator()
+
+        def call_chunk(index, call_id=None, name=None, arguments=""):
+            function = {"arguments": arguments}
+            if name:
+                function["name"] = name
+            tool_call = {"index": index, "function": function}
+            if call_id:
+                tool_call["id"] = call_id
+                tool_call["type"] = "function"
+            return chat_chunk({"tool_calls": [tool_call]})
+
+        accumulator.add(call_chunk(0, "call_0", "search", '{"q": "a"}'))
+        assert accumulator.pop_completed_calls() == []
+
+        accumulator.add(call_chunk(1, "call_1", "search", '{"q": '))
+        completed = accumulator.pop_completed_calls()
+        assert [(c.call_id, c.arguments) for c in completed] == [
+            ("call_0", '{"q": "a"}')
+        ]
+
+        accumulator.add(call_chunk(1, arguments='"b"}'))
+        accumulator.add(chat_chunk({}, finish_reason="tool_calls"))
+        completed = accumulator.pop_completed_calls()
+        assert [(c.call_id, c.arguments) for c in completed] == [
+            ("call_1", '{"q": "b"}')
+        ]
+
+    def test_anthropic_accumulator_completes_call_on_block_stop(self):
+        accumulator = AnthropicStreamAccumulator()
+        accumulator.add(anthropic_message_start())
+        accumulator.add(
+            D(
+                type="content_block_start",
+                index=0,
+                content_block=ToolUseBlock(
+                    type="tool_use", id="toolu_1", name="search", input={}
+                ),
+            )
+        )
+        accumulator.add(
+            D(
+                type="content_block_delta",
+                index=0,
+                delta=D(type="input_json_delta", partial_json='{"q": "x"}'),
+            )
+        )
+        assert accumulator.pop_completed_calls() == []
+
+        accumulator.add(D(type="content_block_stop", index=0))
+        completed = accumulator.pop_completed_calls()
+        assert [(c.call_id, c.name, c.arguments) for c in completed] == [
+            ("toolu_1", "search", '{"q": "x"}')
+        ]
+
+    def test_stream_loop_runs_tool_while_stream_continues(self):
+        tool_started = threading.Event()
+
+        def search(q: str):
+            tool_started.set()
+            return q
+
+        tools = Tools()
+        tools.add_tool(search)
+
+        function_call = D(
+            type="function_call",
+            name="search",
+            arguments='{"q": "x"}',
+            call_id="call_1",
+        )
+        message = D(type="message", content=[D(text="Done")])
+        usage = D(input_tokens=1, output_tokens=1)
+        seen_during_stream = []
+
+        def first_stream():
+            yield D(type="response.output_item.added", item=function_call)
+            yield D(type="response.output_item.done", item=function_call)
+            # The model is still generating, the tool must already be running
+            seen_during_stream.append(tool_started.wait(timeout=5))
+            yield D(
+                type="response.completed",
+                response=D(output=[function_call], usage=usage),
+            )
+
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = [
+            first_stream(),
+            iter(
+                [
+                    D(
+                        type="response.completed",
+                        response=D(output=[message], usage=usage),
+                    )
+                ]
+            ),
+        ]
+
+        runner = OpenAIResponsesRunner(tools=tools, llm_client=llm_client)
+        events = list(runner.stream_loop("go"))
+
+        assert seen_during_stream == [True]
+        finished = [e for e in events if isinstance(e, ToolCallFinishedEvent)]
+        assert [e.result for e in finished] == ['"x"']
+        assert events[-1].result.last_message == "Done"
+
+    @pytest.mark.asyncio
+    async def test_astream_loop_runs_tool_while_stream_continues(self):
+        tool_started = asyncio.Event()
+
+        async def search(q: str):
+            tool_started.set()
+            return q
+
+        tools = Tools()
+        tools.add_tool(search)
+
+        seen_during_stream = []
+
+        async def first_stream():
+            yield anthropic_message_start()
+            yield D(
+                type="content_block_start",
+                index=0,
+                content_block=ToolUseBlock(
+                    type="tool_use", id="toolu_1", name="search", input={}
+                ),
+            )
+            yield D(
+                type="content_block_delta",
+                index=0,
+                delta=D(type="input_json_delta", partial_json='{"q": "x"}'),
+            )
+            yield D(type="content_block_stop", index=0)
+            await asyncio.wait_for(tool_started.wait(), timeout=5)
+            seen_during_stream.append(True)
+            yield anthropic_message_delta(output_tokens=3)
+
+        async def second_stream():
+            yield anthropic_message_start()
+            yield D(
+                type="content_block_start",
+                index=0,
+                content_block=TextBlock(type="text", text=""),
+            )
+            yield D(
+                type="content_block_delta",
+                index=0,
+                delta=D(type="text_delta", text="Done"),
+            )
+            yield D(type="content_block_stop", index=0)
+
+        streams = [first_stream(), second_stream()]
+
+        async def send_request(chat_messages, tools, stream):
+            return streams.pop(0)
+
+        llm_client = Mock()
+        llm_client.model = "claude-sonnet-4-5-20250514"
+        llm_client.send_request = send_request
+
+        runner = AnthropicMessagesRunner(tools=tools, llm_client=llm_client)
+        events = [event async for event in runner.astream_loop("go")]
+
+        assert seen_during_stream == [True]
+        finished = [e for e in events if isinstance(e, ToolCallFinishedEvent)]
+        assert [e.result for e in finished] == ['"x"']
+        assert events[-1].result.last_message == "Done"
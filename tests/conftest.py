@@ -0,0 +1,59 @@
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import openai
+import pytest
+
+from toyaikit.llm import LLMClient
+
+
+class FakeClock:
+    """Monotonic clock for tests, moved forward by hand or by sleep()."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_status_error(status_code: int, headers: dict = None) -> openai.APIStatusError:
+    """The error the OpenAI SDK raises for a response with status_code."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    response = httpx.Response(status_code, request=request, headers=headers)
+    if status_code == 429:
+        return openai.RateLimitError("rate limited", response=response, body=None)
+    if status_code >= 500:
+        return openai.InternalServerError("server error", response=response, body=None)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def make_mock_client(model="gpt-4o-mini", response=None, error=None, spec=LLMClient):
+    """A client mock of model answering with response, or raising error."""
+    client = Mock(spec=spec) if spec is LLMClient else AsyncMock(spec=spec)
+    client.model = model
+    if error is not None:
+        client.send_request.side_effect = error
+    else:
+        client.send_request.return_value = response
+    return client
+
+
+@pytest.fixture
+def status_error():
+    return make_status_error
+
+
+@pytest.fixture
+def mock_client():
+    return make_mock_client
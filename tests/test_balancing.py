@@ -0,0 +1,142 @@
+import threading
+
+import openai
+import pytest
+
+from toyaikit.balancing import (
+    ROUND_ROBIN,
+    AsyncBalancingClient,
+    BalancingClient,
+)
+from toyaikit.failover import NoBackendAvailableError
+from toyaikit.llm import AsyncLLMClient
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+class TestBalancingClient:
+    def test_round_robin_follows_weights(self, mock_client):
+        """Test clients take turns in proportion to their weights"""
+        llm_client = BalancingClient(
+            [mock_client(response="a"), mock_client(response="b")],
+            weights=[2, 1],
+            strategy=ROUND_ROBIN,
+        )
+
+        responses = [llm_client.send_request(MESSAGES) for _ in range(6)]
+
+        assert responses == ["a", "b", "a", "a", "b", "a"]
+        assert [stats.requests for stats in llm_client.stats] == [4, 2]
+
+    def test_least_outstanding(self, mock_client):
+        """Test a request goes to the client with the fewest requests in flight"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(**kwargs):
+            started.set()
+            release.wait(5)
+            return "a"
+
+        slow_client = mock_client(response="a")
+        slow_client.send_request.side_effect = slow
+        llm_client = BalancingClient([slow_client, mock_client(response="b")])
+
+        thread = threading.Thread(target=llm_client.send_request, args=(MESSAGES,))
+        thread.start()
+        started.wait(5)
+
+        assert llm_client.stats[0].in_flight == 1
+        assert llm_client.send_request(MESSAGES) == "b"
+        assert llm_client.send_request(MESSAGES) == "b"
+
+        release.set()
+        thread.join(5)
+        assert llm_client.stats[0].in_flight == 0
+        assert llm_client.stats[0].average_latency is not None
+
+    def test_rate_limited_client_out_of_rotation(
+        self, clock, mock_client, status_error
+    ):
+        """Test a 429 sends the request to another client and pauses the first"""
+        limited = mock_client(
+            response="a", error=status_error(429, {"retry-after": "10"})
+        )
+        llm_client = BalancingClient([limited, mock_client(response="b")], clock=clock)
+
+        assert llm_client.send_request(MESSAGES) == "b"
+        assert llm_client.send_request(MESSAGES) == "b"
+        assert limited.send_request.call_count == 1
+        assert llm_client.stats[0].rate_limited == 1
+
+        clock.now = 10
+        limited.send_request.side_effect = None
+        limited.send_request.return_value = "a"
+        assert llm_client.send_request(MESSAGES) == "a"
+
+    def test_auth_error_disables_until_enabled(self, mock_client, status_error):
+        """Test a client with an authentication error stays out of rotation"""
+        revoked = mock_client(response="a", error=status_error(401))
+        llm_client = BalancingClient([revoked, mock_client(response="b")])
+
+        for _ in range(3):
+            assert llm_client.send_request(MESSAGES) == "b"
+        assert revoked.send_request.call_count == 1
+        assert llm_client.stats[0].auth_failed
+
+        llm_client.enable(0)
+        assert not llm_client.stats[0].auth_failed
+
+    def test_other_errors_raised(self, mock_client, status_error):
+        """Test errors about the request are raised without trying other clients"""
+        other = mock_client(response="b")
+        llm_client = BalancingClient(
+            [mock_client(response="a", error=status_error(400)), other]
+        )
+
+        with pytest.raises(openai.APIStatusError):
+            llm_client.send_request(MESSAGES)
+
+        other.send_request.assert_not_called()
+        assert llm_client.stats[0].errors == 1
+
+    def test_all_clients_out_of_rotation(self, mock_client, status_error):
+        """Test the last error is raised, then NoBackendAvailableError"""
+        llm_client = BalancingClient(
+            [
+                mock_client(response="a", error=status_error(429)),
+                mock_client(response="b", error=status_error(429)),
+            ]
+        )
+
+        with pytest.raises(openai.APIStatusError):
+            llm_client.send_request(MESSAGES)
+        with pytest.raises(NoBackendAvailableError):
+            llm_client.send_request(MESSAGES)
+
+    def test_invalid_arguments(self, mock_client):
+        """Test clients, weights and strategy are checked"""
+        with pytest.raises(ValueError):
+            BalancingClient([])
+        with pytest.raises(ValueError):
+            BalancingClient([mock_client(response="a")], weights=[1, 2])
+        with pytest.raises(ValueError):
+            BalancingClient([mock_client(response="a")], strategy="random")
+
+
+class TestAsyncBalancingClient:
+    @pytest.mark.asyncio
+    async def test_rate_limited_client_out_of_rotation(self, mock_client, status_error):
+        """Test the async client skips rate-limited clients"""
+        limited = mock_client(
+            response="a", error=status_error(429), spec=AsyncLLMClient
+        )
+        other = mock_client(response="b", spec=AsyncLLMClient)
+        llm_client = AsyncBalancingClient([limited, other])
+
+        assert await llm_client.send_request(MESSAGES, stream=True) == "b"
+        assert await llm_client.send_request(MESSAGES) == "b"
+
+        other.send_request.assert_awaited_with(chat_messages=MESSAGES, tools=None)
+        assert limited.send_request.await_count == 1
+        assert [stats.in_flight for stats in llm_client.stats] == [0, 0]
@@ -0,0 +1,233 @@
+import json
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+import pytest
+
+from toyaikit.batch_api import (
+    AnthropicBatchBackend,
+    BatchError,
+    BatchExecutor,
+    BatchRequest,
+    BatchRequestError,
+    LocalBatchBackend,
+    OpenAIBatchBackend,
+)
+from toyaikit.chat.runners import OpenAIChatCompletionsRunner
+from toyaikit.deadlines import MAX_ITERATIONS
+from toyaikit.llm import OpenAIChatCompletionsClient
+from toyaikit.pricing import PricingConfig
+from toyaikit.raw import RawObject
+from toyaikit.tools import Tools
+
+
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def completion(message, prompt_tokens=100, completion_tokens=10):
+    return {
+        "id": "chatcmpl",
+        "object": "chat.completion",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        },
+    }
+
+
+def tool_call(call_id):
+    return completion(
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+                }
+            ],
+        }
+    )
+
+
+def answer(text):
+    return completion({"role": "assistant", "content": text, "tool_calls": None})
+
+
+def respond(request: BatchRequest) -> dict:
+    """Calls the tool for prompts with "add", answers after tool results"""
+    messages = request.body["messages"]
+    last = messages[-1]
+    if last["role"] == "tool":
+        return answer(f"The sum is {last['content']}")
+    if "fail" in last["content"]:
+        raise ValueError("model unavailable")
+    if "add" in last["content"]:
+        return tool_call(f"call_{len(messages)}")
+    return answer("Hello")
+
+
+def make_runner():
+    tools = Tools()
+    tools.add_tool(add)
+    pricing = PricingConfig()
+    pricing.register_model("batch-model", input_price=1, output_price=2)
+    return OpenAIChatCompletionsRunner(
+        tools=tools,
+        llm_client=OpenAIChatCompletionsClient(model="batch-model", client=Mock()),
+        pricing_config=pricing,
+    )
+
+
+class TestBatchExecutor:
+    def test_runs_loops_in_batches(self, tmp_path):
+        """Test follow-up tool iterations are submitted as new batches"""
+        sleep = Mock()
+        backend = LocalBatchBackend(tmp_path, respond, polls_until_done=3)
+        executor = BatchExecutor(make_runner(), backend, poll_interval=5, sleep=sleep)
+
+        batch = executor.run(["Say hi", "Please add 1 and 2", "fail please"])
+
+        assert len(executor.batch_ids) == 2
+        assert sleep.call_count == 4
+        sleep.assert_called_with(5)
+
+        hello, added, failed = batch.items
+        assert hello.result.last_message == "Hello"
+        assert added.result.last_message == "The sum is 3"
+        assert added.result.tokens.input_tokens == 200
+        assert isinstance(failed.error, BatchRequestError)
+        assert "model unavailable" in str(failed.error)
+        assert batch.failed == [failed]
+
+        # Only the loop with the tool call went into the second batch
+        second_input = tmp_path / f"{executor.batch_ids[1]}.input.jsonl"
+        [line] = second_input.read_text().splitlines()
+        assert json.loads(line)["body"]["model"] == "batch-model"
+
+    def test_batch_discount(self, tmp_path):
+        """Test costs are at the batch price"""
+        backend = LocalBatchBackend(tmp_path, respond)
+        runner = make_runner()
+        executor = BatchExecutor(runner, backend, sleep=Mock())
+
+        batch = executor.run(["Say hi"])
+
+        full_price = runner.pricing_config.calculate_usage_cost(batch.tokens)
+        assert batch.cost.total_cost == full_price.total_cost / 2
+        assert batch.items[0].result.cost.total_cost == full_price.total_cost / 2
+
+    def test_max_iterations(self, tmp_path):
+        """Test loops still calling tools after max_iterations are truncated"""
+        backend = LocalBatchBackend(tmp_path, lambda request: tool_call("call_again"))
+        executor = BatchExecutor(make_runner(), backend, max_iterations=2)
+
+        [item] = executor.run(["Please add"]).items
+
+        assert len(executor.batch_ids) == 2
+        assert item.result.stop_reason == MAX_ITERATIONS
+        assert item.result.tokens.input_tokens == 200
+
+    def test_needs_a_client_building_requests(self):
+        """Test wrapper clients without build_request_args are rejected"""
+        runner = make_runner()
+        runner.llm_client = Mock(spec=["send_request", "model"])
+
+        with pytest.raises(ValueError):
+            BatchExecutor(runner, Mock())
+
+
+class TestOpenAIBatchBackend:
+    def test_submit_and_results(self):
+        """Test requests are uploaded as JSONL and results read from files"""
+        client = Mock()
+        client.files.create.return_value = D(id="file_in")
+        client.batches.create.return_value = D(id="batch_1")
+        client.batches.retrieve.return_value = D(
+            status="completed",
+            output_file_id="file_out",
+            error_file_id="file_err",
+            errors=None,
+        )
+        output = json.dumps(
+            {
+                "custom_id": "item-0",
+                "response": {"status_code": 200, "body": answer("Hi")},
+                "error": None,
+            }
+        )
+        error = json.dumps(
+            {
+                "custom_id": "item-1",
+                "response": {
+                    "status_code": 400,
+                    "body": {"error": {"message": "bad request"}},
+                },
+                "error": None,
+            }
+        )
+        client.files.content.side_effect = lambda file_id: D(
+            text=output if file_id == "file_out" else error
+        )
+        backend = OpenAIBatchBackend(client)
+        request = BatchRequest("item-0", "/v1/chat/completions", {"model": "m"})
+
+        assert backend.submit([request]) == "batch_1"
+        name, data = client.files.create.call_args.kwargs["file"]
+        assert json.loads(data)["url"] == "/v1/chat/completions"
+        client.batches.create.assert_called_once_with(
+            input_file_id="file_in",
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+
+        assert backend.is_done("batch_1")
+        results = backend.results("batch_1")
+        assert isinstance(results["item-0"], RawObject)
+        assert results["item-0"].choices[0].message.content == "Hi"
+        assert results["item-1"].status_code == 400
+
+    def test_failed_batch(self):
+        """Test a failed batch raises BatchError"""
+        client = Mock()
+        client.batches.retrieve.return_value = D(status="failed", errors="invalid")
+
+        with pytest.raises(BatchError):
+            OpenAIBatchBackend(client).is_done("batch_1")
+
+
+class TestAnthropicBatchBackend:
+    def test_submit_and_results(self):
+        """Test Message Batches requests and results"""
+        client = Mock()
+        client.messages.batches.create.return_value = D(id="msgbatch_1")
+        client.messages.batches.retrieve.return_value = D(processing_status="ended")
+        message = Mock()
+        message.model_dump_json.return_value = json.dumps(
+            {"content": [{"type": "text", "text": "Hi"}]}
+        )
+        client.messages.batches.results.return_value = [
+            D(custom_id="item-0", result=D(type="succeeded", message=message)),
+            D(
+                custom_id="item-1",
+                result=D(type="errored", error=D(error=D(message="overloaded"))),
+            ),
+            D(custom_id="item-2", result=D(type="expired")),
+        ]
+        backend = AnthropicBatchBackend(client)
+        request = BatchRequest("item-0", "/v1/messages", {"model": "claude"})
+
+        assert backend.submit([request]) == "msgbatch_1"
+        client.messages.batches.create.assert_called_once_with(
+            requests=[{"custom_id": "item-0", "params": {"model": "claude"}}]
+        )
+        assert backend.is_done("msgbatch_1")
+
+        results = backend.results("msgbatch_1")
+        assert results["item-0"].content[0].text == "Hi"
+        assert str(results["item-1"]) == "overloaded"
+        assert isinstance(results["item-2"], BatchRequestError)
@@ -0,0 +1,211 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from anthropic.types import Message, TextBlock, Usage
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.parsed_chat_completion import ParsedChatCompletion
+from pydantic import BaseModel
+
+from toyaikit.cache import AsyncCachedClient, CachedClient, ResponseCache, request_key
+from toyaikit.llm import LLMClient, OpenAIChatCompletionsClient
+from toyaikit.tools import Tools
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def chat_completion(content="Hello"):
+    return ChatCompletion(
+        id="chatcmpl-1",
+        object="chat.completion",
+        created=0,
+        model="gpt-4o-mini",
+        choices=[
+            Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(role="assistant", content=content),
+            )
+        ],
+    )
+
+
+def anthropic_message():
+    return Message(
+        id="msg_1",
+        type="message",
+        role="assistant",
+        model="claude-sonnet-4-5-20250514",
+        content=[TextBlock(type="text", text="Hi")],
+        stop_reason="end_turn",
+        usage=Usage(input_tokens=3, output_tokens=1),
+    )
+
+
+def make_client(response):
+    inner = Mock(spec=LLMClient)
+    inner.model = "gpt-4o-mini"
+    inner.extra_kwargs = {}
+    inner.send_request.return_value = response
+    return inner
+
+
+class TestRequestKey:
+    def test_same_request_same_key(self):
+        client = make_client(None)
+        messages = [{"role": "user", "content": "Hi", "name": "a"}]
+        reordered = [{"name": "a", "content": "Hi", "role": "user"}]
+
+        assert request_key(client, messages) == request_key(client, reordered)
+
+    def test_key_depends_on_request(self):
+        client = make_client(None)
+        messages = [{"role": "user", "content": "Hi"}]
+        key = request_key(client, messages)
+
+        tools = Tools()
+        tools.add_tool(
+            lambda q: q, {"name": "search", "description": "", "parameters": {}}
+        )
+
+        assert request_key(client, [{"role": "user", "content": "Hey"}]) != key
+        assert request_key(client, messages, tools=tools) != key
+        assert request_key(client, messages, output_format=Answer) != key
+
+        client.extra_kwargs = {"temperature": 0}
+        assert request_key(client, messages) != key
+
+        client.model = "gpt-4o"
+        assert request_key(client, messages) != key
+
+        assert request_key(client, messages, previous_response_id="resp_1") != key
+
+    def test_pydantic_messages(self):
+        client = make_client(None)
+        message = ChatCompletionMessage(role="assistant", content="Hi")
+
+        assert request_key(client, [message]) == request_key(
+            client, [message.model_copy()]
+        )
+
+
+class TestResponseCache:
+    def test_round_trip_keeps_type(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+
+        cache.put("a", chat_completion())
+        cache.put("b", anthropic_message())
+
+        assert cache.get("a") == chat_completion()
+        assert isinstance(cache.get("b"), Message)
+        assert cache.get("missing") is None
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_persists_between_instances(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        ResponseCache(path).put("a", chat_completion())
+
+        assert ResponseCache(path).get("a") == chat_completion()
+
+    def test_parsed_response_is_parametrized_again(self):
+        cache = ResponseCache(":memory:")
+        completion = chat_completion('{"text": "Hi"}')
+        parsed = ParsedChatCompletion[Answer].model_validate(completion.model_dump())
+
+        cache.put("a", parsed)
+        loaded = cache.get("a", output_format=Answer)
+
+        assert isinstance(loaded, ParsedChatCompletion)
+        assert loaded.choices[0].message.content == '{"text": "Hi"}'
+
+    def test_ttl(self, monkeypatch):
+        cache = ResponseCache(":memory:", ttl=10)
+        now = [1000.0]
+        monkeypatch.setattr("toyaikit.cache.time.time", lambda: now[0])
+
+        cache.put("a", chat_completion())
+        now[0] += 5
+        assert cache.get("a") is not None
+        now[0] += 10
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self, monkeypatch):
+        size = len(chat_completion().model_dump_json())
+        cache = ResponseCache(":memory:", max_size_bytes=size * 2)
+        now = [1000.0]
+        monkeypatch.setattr("toyaikit.cache.time.time", lambda: now[0])
+
+        for key in ["a", "b"]:
+            now[0] += 1
+            cache.put(key, chat_completion())
+
+        # "a" is used, so "b" is the least recently used
+        now[0] += 1
+        cache.get("a")
+        now[0] += 1
+        cache.put("c", chat_completion())
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+
+class TestCachedClient:
+    def test_second_request_is_served_from_cache(self):
+        inner = make_client(chat_completion())
+        client = CachedClient(inner, ResponseCache(":memory:"))
+        messages = [{"role": "user", "content": "Hi"}]
+
+        first = client.send_request(chat_messages=messages)
+        second = client.send_request(chat_messages=messages)
+
+        assert inner.send_request.call_count == 1
+        assert first == second
+        assert isinstance(second, ChatCompletion)
+        assert client.model == "gpt-4o-mini"
+        assert (client.cache.hits, client.cache.misses) == (1, 1)
+
+    def test_streams_are_not_cached(self):
+        inner = make_client(iter([]))
+        client = CachedClient(inner, ResponseCache(":memory:"))
+
+        client.send_request(chat_messages=[], stream=True)
+        client.send_request(chat_messages=[], stream=True)
+
+        assert inner.send_request.call_count == 2
+        assert len(client.cache) == 0
+
+    def test_with_real_client_and_runner(self):
+        from toyaikit.chat.runners import OpenAIChatCompletionsRunner
+
+        openai_client = Mock()
+        openai_client.chat.completions.create.return_value = chat_completion()
+        llm_client = CachedClient(
+            OpenAIChatCompletionsClient(client=openai_client),
+            ResponseCache(":memory:"),
+        )
+        runner = OpenAIChatCompletionsRunner(tools=Tools(), llm_client=llm_client)
+
+        first = runner.loop("Hi")
+        second = runner.loop("Hi")
+
+        assert openai_client.chat.completions.create.call_count == 1
+        assert first.last_message == second.last_message == "Hello"
+
+    @pytest.mark.asyncio
+    async def test_async_cached_client(self):
+        inner = Mock()
+        inner.model = "claude-sonnet-4-5-20250514"
+        inner.send_request = AsyncMock(return_value=anthropic_message())
+        client = AsyncCachedClient(inner, ResponseCache(":memory:"))
+
+        await client.send_request(chat_messages=[{"role": "user", "content": "Hi"}])
+        response = await client.send_request(
+            chat_messages=[{"role": "user", "content": "Hi"}]
+        )
+
+        assert inner.send_request.call_count == 1
+        assert response.content[0].text == "Hi"
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+from anthropic import Anthropic, AsyncAnthropic
+from openai import AsyncOpenAI, OpenAI
+
+from toyaikit.connections import (
+    ClientRegistry,
+    ConnectionSettings,
+    get_shared_registry,
+    share_connections,
+    stop_sharing_connections,
+)
+from toyaikit.llm import (
+    AnthropicClient,
+    AsyncOpenAIClient,
+    OpenAIChatCompletionsClient,
+    OpenAIClient,
+)
+from toyaikit.main import init
+
+
+@pytest.fixture
+def shared():
+    registry = share_connections(max_connections=10)
+    yield registry
+    stop_sharing_connections()
+    registry.close()
+
+
+class TestClientRegistry:
+    def test_one_client_per_provider_base_url_and_key(self):
+        """Test clients are shared by provider, base_url and api_key"""
+        registry = ClientRegistry()
+
+        client = registry.openai(api_key="key")
+
+        assert isinstance(client, OpenAI)
+        assert registry.openai(api_key="key") is client
+        assert registry.openai(api_key="other") is not client
+        assert (
+            registry.openai(api_key="key", base_url="http://localhost:8000/v1")
+            is not client
+        )
+        assert isinstance(registry.anthropic(api_key="key"), Anthropic)
+
+    def test_settings(self):
+        """Test the pool limits and timeouts are applied to the clients"""
+        settings = ConnectionSettings(
+            max_connections=7, keepalive_expiry=15, timeout=30, connect_timeout=2
+        )
+        registry = ClientRegistry(settings)
+
+        clients = [registry.openai(api_key="key"), registry.anthropic(api_key="key")]
+        for client in clients:
+            assert client.timeout.connect == 2
+            assert client.timeout.read == 30
+            pool = client._client._transport._pool
+            assert pool._max_connections == 7
+            assert pool._keepalive_expiry == 15
+
+    def test_close(self):
+        """Test close forgets the clients"""
+        registry = ClientRegistry()
+        client = registry.openai(api_key="key")
+
+        registry.close()
+
+        assert client.is_closed()
+        assert registry.openai(api_key="key") is not client
+
+    def test_async_clients_shared_per_event_loop(self):
+        """Test async clients are shared within the running event loop"""
+        registry = ClientRegistry()
+
+        async def get_clients():
+            return (
+                registry.async_openai(api_key="key"),
+                registry.async_openai(api_key="key"),
+                registry.async_anthropic(api_key="key"),
+            )
+
+        first, second, anthropic_client = asyncio.run(get_clients())
+        other_loop, _, _ = asyncio.run(get_clients())
+
+        assert isinstance(first, AsyncOpenAI)
+        assert isinstance(anthropic_client, AsyncAnthropic)
+        assert second is first
+        assert other_loop is not first
+
+    def test_async_clients_outside_event_loop_not_shared(self):
+        """Test async clients created outside an event loop are new"""
+        registry = ClientRegistry()
+
+        assert registry.async_openai(api_key="key") is not registry.async_openai(
+            api_key="key"
+        )
+
+
+class TestShareConnections:
+    def test_disabled_by_default(self):
+        """Test there is no shared registry unless share_connections is called"""
+        assert get_shared_registry() is None
+
+    def test_llm_clients_use_shared_registry(self, shared, monkeypatch):
+        """Test LLM clients created without a client share the SDK clients"""
+        monkeypatch.setenv("OPENAI_API_KEY", "key")
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "key")
+
+        responses_client = OpenAIClient()
+        chat_client = OpenAIChatCompletionsClient()
+
+        assert get_shared_registry() is shared
+        assert responses_client.client is chat_client.client
+        assert responses_client.client is shared.openai()
+        assert AnthropicClient().client is AnthropicClient().client
+        assert AnthropicClient(api_key="other").client is not AnthropicClient().client
+        assert init("prompt").runner.llm_client.client is responses_client.client
+
+    def test_async_llm_clients_use_shared_registry(self, shared, monkeypatch):
+        """Test async LLM clients share the SDK clients of the event loop"""
+        monkeypatch.setenv("OPENAI_API_KEY", "key")
+
+        async def create():
+            return AsyncOpenAIClient(), AsyncOpenAIClient()
+
+        first, second = asyncio.run(create())
+
+        assert isinstance(first.client, AsyncOpenAI)
+        assert first.client is second.client
+
+    def test_stop_sharing(self, shared, monkeypatch):
+        """Test clients create their own SDK clients after stop_sharing_connections"""
+        monkeypatch.setenv("OPENAI_API_KEY", "key")
+        stop_sharing_connections()
+
+        assert OpenAIClient().client is not OpenAIClient().client
+
+    def test_settings_or_fields(self):
+        """Test settings are given either as ConnectionSettings or as fields"""
+        with pytest.raises(ValueError):
+            share_connections(ConnectionSettings(), http2=True)
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace as D
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from toyaikit.chat.runners import OpenAIResponsesRunner
+from toyaikit.deadlines import (
+    CANCELLED,
+    DEADLINE,
+    MAX_ITERATIONS,
+    CancellationToken,
+    Deadline,
+    DeadlineExceeded,
+    deadline_scope,
+    request_timeout,
+)
+from toyaikit.llm import AsyncLLMClient, LLMClient, OpenAIClient
+from toyaikit.tools import Tools
+
+USAGE = D(input_tokens=10, output_tokens=1)
+
+
+def tool_call_response(name="lookup", call_id="call_1"):
+    call = D(type="function_call", name=name, arguments="{}", call_id=call_id)
+    return D(id="resp", output=[call], usage=USAGE)
+
+
+def message_response(text):
+    message = D(type="message", content=[D(text=text)])
+    return D(id="resp", output=[message], usage=USAGE)
+
+
+def make_tools(release: threading.Event = None):
+    def lookup():
+        return "found"
+
+    def slow_lookup():
+        release.wait(5)
+        return "found"
+
+    tools = Tools()
+    tools.add_tool(lookup)
+    if release is not None:
+        tools.add_tool(slow_lookup)
+    return tools
+
+
+def tool_outputs(messages):
+    return [
+        m["output"]
+        for m in messages
+        if isinstance(m, dict) and m.get("type") == "function_call_output"
+    ]
+
+
+class TestDeadline:
+    def test_remaining_and_expired(self, clock):
+        """Test a Deadline counts down with its clock"""
+        deadline = Deadline(10, clock=clock)
+
+        assert deadline.remaining() == 10
+        clock.now = 4
+        assert deadline.remaining() == 6
+        assert not deadline.expired
+        clock.now = 12
+        assert deadline.remaining() == 0
+        assert deadline.expired
+
+    def test_coerce(self):
+        """Test seconds become a Deadline, Deadlines and None are kept"""
+        deadline = Deadline(5)
+
+        assert Deadline.coerce(deadline) is deadline
+        assert Deadline.coerce(None) is None
+        assert 0 < Deadline.coerce(5).remaining() <= 5
+
+    def test_request_timeout(self, clock):
+        """Test clients get the time left as the timeout of their requests"""
+        llm_client = OpenAIClient(model="gpt-4o-mini", client=Mock())
+        messages = [{"role": "user", "content": "Hi"}]
+
+        assert request_timeout() is None
+        assert "timeout" not in llm_client.build_request_args(messages)
+
+        with deadline_scope(Deadline(30, clock=clock)):
+            clock.now = 10
+            args = llm_client.build_request_args(messages)
+            assert args["timeout"] == 20
+
+            llm_client.extra_kwargs = {"timeout": 5}
+            assert llm_client.build_request_args(messages)["timeout"] == 5
+
+        assert request_timeout() is None
+
+    def test_no_sdk_retries_within_deadline(self):
+        """Test the SDK doesn't retry requests of a loop with a deadline"""
+        sdk_client = Mock()
+        llm_client = OpenAIClient(model="gpt-4o-mini", client=sdk_client)
+        messages = [{"role": "user", "content": "Hi"}]
+
+        llm_client.send_request(messages)
+        sdk_client.with_options.assert_not_called()
+        sdk_client.responses.create.assert_called_once()
+
+        with deadline_scope(Deadline(30)):
+            llm_client.send_request(messages)
+
+        sdk_client.with_options.assert_called_once_with(max_retries=0)
+        without_retries = sdk_client.with_options.return_value
+        without_retries.responses.create.assert_called_once()
+
+
+class TestLoopBounds:
+    def make_runner(self, llm_client, tools=None, **kwargs):
+        return OpenAIResponsesRunner(
+            tools=tools or make_tools(), llm_client=llm_client, **kwargs
+        )
+
+    def test_max_iterations(self):
+        """Test the loop stops after max_iterations requests"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = [
+            tool_call_response(call_id=f"call_{i}") for i in range(5)
+        ]
+
+        result = self.make_runner(llm_client).loop("Find it", max_iterations=2)
+
+        assert llm_client.send_request.call_count == 2
+        assert result.truncated
+        assert result.stop_reason == MAX_ITERATIONS
+        assert result.last_message is None
+        assert tool_outputs(result.new_messages) == ['"found"', '"found"']
+        assert result.tokens.input_tokens == 20
+
+    def test_finished_loop_not_truncated(self):
+        """Test a loop that gets its answer within the bounds isn't truncated"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = [
+            tool_call_response(),
+            message_response("Done"),
+        ]
+
+        result = self.make_runner(llm_client).loop(
+            "Find it", deadline=60, max_iterations=2
+        )
+
+        assert result.last_message == "Done"
+        assert not result.truncated
+        assert result.stop_reason is None
+
+    def test_cancellation(self):
+        """Test a cancelled token stops the loop before its next request"""
+        cancellation = CancellationToken()
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+
+        def send_request(**kwargs):
+            cancellation.cancel()
+            return tool_call_response()
+
+        llm_client.send_request.side_effect = send_request
+
+        result = self.make_runner(llm_client).loop("Find it", cancellation=cancellation)
+
+        assert llm_client.send_request.call_count == 1
+        assert result.stop_reason == CANCELLED
+        assert tool_outputs(result.new_messages) == ['"found"']
+
+    def test_deadline_during_slow_tool(self):
+        """Test a tool call still running at the deadline gets a timeout output"""
+        release = threading.Event()
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = tool_call_response("slow_lookup")
+
+        try:
+            result = self.make_runner(llm_client, tools=make_tools(release)).loop(
+                "Find it", deadline=0.2
+            )
+        finally:
+            release.set()
+
+        assert llm_client.send_request.call_count == 1
+        assert result.stop_reason == DEADLINE
+        [output] = tool_outputs(result.new_messages)
+        assert json.loads(output)["error"].startswith("TimeoutError")
+
+    def test_request_failing_after_deadline(self, clock):
+        """Test a request that fails because the deadline passed ends the loop"""
+        deadline = Deadline(10, clock=clock)
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+
+        def send_request(**kwargs):
+            assert request_timeout() == 10
+            clock.now = 11
+            raise TimeoutError()
+
+        llm_client.send_request.side_effect = send_request
+
+        result = self.make_runner(llm_client).loop("Find it", deadline=deadline)
+
+        assert result.stop_reason == DEADLINE
+        assert result.last_message is None
+
+    def test_request_missing_deadline(self):
+        """Test a request that can't be sent before the deadline ends the loop"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = DeadlineExceeded()
+
+        result = self.make_runner(llm_client).loop("Find it", deadline=60)
+
+        assert result.stop_reason == DEADLINE
+
+    def test_request_errors_raised_before_deadline(self):
+        """Test errors are raised as before while there's time left"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.side_effect = ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            self.make_runner(llm_client).loop("Find it", deadline=60)
+
+
+class TestAsyncLoopBounds:
+    @pytest.mark.asyncio
+    async def test_slow_async_tool_cancelled(self):
+        """Test an async tool running at the deadline is cancelled"""
+        cancelled = asyncio.Event()
+
+        async def slow_lookup():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "found"
+
+        tools = Tools()
+        tools.add_tool(slow_lookup)
+
+        llm_client = AsyncMock(spec=AsyncLLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = tool_call_response("slow_lookup")
+
+        runner = OpenAIResponsesRunner(tools=tools, llm_client=llm_client)
+        result = await runner.aloop("Find it", deadline=0.1)
+
+        assert result.stop_reason == DEADLINE
+        assert cancelled.is_set()
+        [output] = tool_outputs(result.new_messages)
+        assert json.loads(output)["error"].startswith("TimeoutError")
+
+    @pytest.mark.asyncio
+    async def test_max_iterations(self):
+        """Test aloop stops after max_iterations requests"""
+        llm_client = AsyncMock(spec=AsyncLLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = tool_call_response()
+
+        runner = OpenAIResponsesRunner(tools=make_tools(), llm_client=llm_client)
+        result = await runner.aloop("Find it", max_iterations=3)
+
+        assert llm_client.send_request.await_count == 3
+        assert result.stop_reason == MAX_ITERATIONS
@@ -0,0 +1,290 @@
+from types import SimpleNamespace as D
+
+import openai
+import pytest
+from anthropic.types import Message, TextBlock, ToolUseBlock
+from anthropic.types import Usage as AnthropicUsage
+
+from toyaikit.chat.runners import OpenAIResponsesRunner
+from toyaikit.deadlines import Deadline, DeadlineExceeded, deadline_scope
+from toyaikit.failover import (
+    AsyncFailoverClient,
+    CircuitBreaker,
+    FailoverClient,
+    NoBackendAvailableError,
+)
+from toyaikit.formats import ANTHROPIC, RESPONSES
+from toyaikit.llm import AsyncLLMClient
+from toyaikit.tools import Tools
+
+
+def responses_response(text):
+    message = D(type="message", content=[D(text=text)])
+    return D(id="resp_1", output=[message], usage=D(input_tokens=1, output_tokens=1))
+
+
+def anthropic_message(content):
+    return Message(
+        id="msg_1",
+        type="message",
+        role="assistant",
+        model="claude-haiku-4-5",
+        content=content,
+        stop_reason="end_turn",
+        stop_sequence=None,
+        usage=AnthropicUsage(input_tokens=10, output_tokens=5),
+    )
+
+
+class TestCircuitBreaker:
+    """Tests for the health tracking of a backend"""
+
+    def test_opens_after_consecutive_failures(self, clock):
+        circuit = CircuitBreaker(failure_threshold=2, clock=clock)
+
+        circuit.record_failure()
+        assert circuit.allow_request()
+        circuit.record_failure()
+
+        assert circuit.state == CircuitBreaker.OPEN
+        assert not circuit.allow_request()
+
+    def test_opens_on_error_rate(self):
+        circuit = CircuitBreaker(
+            failure_threshold=100, max_error_rate=0.3, min_requests=4, alpha=0.5
+        )
+        for _ in range(3):
+            circuit.record_success(1.0)
+            circuit.record_failure()
+
+        assert circuit.state == CircuitBreaker.OPEN
+
+    def test_half_open_after_cooldown(self, clock):
+        circuit = CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock)
+        circuit.record_failure()
+
+        clock.now = 31
+        assert circuit.allow_request()
+        assert circuit.state == CircuitBreaker.HALF_OPEN
+        # only one trial request at a time
+        assert not circuit.allow_request()
+
+        circuit.record_success(0.5)
+        assert circuit.state == CircuitBreaker.CLOSED
+
+    def test_failed_trial_opens_again(self, clock):
+        circuit = CircuitBreaker(failure_threshold=5, cooldown=30, clock=clock)
+        for _ in range(5):
+            circuit.record_failure()
+
+        clock.now = 31
+        assert circuit.allow_request()
+        circuit.record_failure()
+
+        assert circuit.state == CircuitBreaker.OPEN
+        assert not circuit.allow_request()
+
+    def test_latency_average(self):
+        circuit = CircuitBreaker(slow_latency=2.0, alpha=0.5)
+        circuit.record_success(1.0)
+        circuit.record_success(5.0)
+
+        assert circuit.latency == 3.0
+        assert circuit.is_slow
+
+
+class TestFailoverClient:
+    """Tests for routing requests to the first healthy client"""
+
+    def test_uses_first_client(self, mock_client):
+        primary = mock_client("gpt-4o-mini", responses_response("Hi"))
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        response = client.send_request(chat_messages=[], tools=None)
+
+        assert response.output[0].content[0].text == "Hi"
+        backup.send_request.assert_not_called()
+        assert client.model == "gpt-4o-mini"
+
+    def test_fails_over_on_server_errors(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(503))
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        response = client.send_request(chat_messages=[])
+
+        assert response.output[0].content[0].text == "Backup"
+        assert client.model == "gpt-4.1"
+        assert client.backends[0].circuit.consecutive_failures == 1
+
+    def test_does_not_fail_over_on_bad_requests(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(400))
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        with pytest.raises(openai.APIStatusError):
+            client.send_request(chat_messages=[])
+        backup.send_request.assert_not_called()
+
+    def test_skips_open_circuits(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(500))
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient(
+            [primary, backup], formats=[RESPONSES, RESPONSES], failure_threshold=1
+        )
+
+        client.send_request(chat_messages=[])
+        client.send_request(chat_messages=[])
+
+        assert primary.send_request.call_count == 1
+        assert backup.send_request.call_count == 2
+
+    def test_raises_last_error_when_all_fail(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(500))
+        backup = mock_client("gpt-4.1", error=status_error(503))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        with pytest.raises(openai.APIStatusError) as e:
+            client.send_request(chat_messages=[])
+        assert e.value.status_code == 503
+
+    def test_no_backend_available(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(500))
+        client = FailoverClient([primary], formats=[RESPONSES], failure_threshold=1)
+
+        with pytest.raises(openai.APIStatusError):
+            client.send_request(chat_messages=[])
+        with pytest.raises(NoBackendAvailableError):
+            client.send_request(chat_messages=[])
+
+    def test_deadline_errors_not_failed_over(self, mock_client):
+        """Test a request out of time is neither failed over nor counted
+        against the backend"""
+        primary = mock_client("gpt-4o-mini", error=DeadlineExceeded())
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        with pytest.raises(DeadlineExceeded):
+            client.send_request(chat_messages=[])
+
+        backup.send_request.assert_not_called()
+        assert client.backends[0].circuit.consecutive_failures == 0
+
+    def test_timeout_after_deadline_not_failed_over(self, clock, mock_client):
+        """Test a timeout caused by the loop's deadline ends the request"""
+        deadline = Deadline(10, clock=clock)
+
+        def send_request(**kwargs):
+            clock.now = 10
+            raise TimeoutError()
+
+        primary = mock_client("gpt-4o-mini")
+        primary.send_request.side_effect = send_request
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+
+        with deadline_scope(deadline), pytest.raises(TimeoutError):
+            client.send_request(chat_messages=[])
+
+        backup.send_request.assert_not_called()
+        assert client.backends[0].circuit.consecutive_failures == 0
+
+    def test_streams_only_go_to_the_same_format(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(500))
+        backup = mock_client("claude-haiku-4-5", anthropic_message([]))
+        client = FailoverClient([primary, backup], formats=[RESPONSES, ANTHROPIC])
+
+        with pytest.raises(openai.APIStatusError):
+            client.send_request(chat_messages=[], stream=True)
+        backup.send_request.assert_not_called()
+
+    def test_translates_history_and_response(self, mock_client, status_error):
+        primary = mock_client("gpt-4o-mini", error=status_error(500))
+        backup = mock_client(
+            "claude-haiku-4-5",
+            anthropic_message(
+                [
+                    TextBlock(type="text", text="Let me check"),
+                    ToolUseBlock(
+                        type="tool_use", id="toolu_1", name="add", input={"a": 1}
+                    ),
+                ]
+            ),
+        )
+        client = FailoverClient([primary, backup], formats=[RESPONSES, ANTHROPIC])
+
+        response = client.send_request(
+            chat_messages=[
+                {"role": "developer", "content": "Be brief"},
+                {"role": "user", "content": "Add"},
+            ]
+        )
+
+        sent = backup.send_request.call_args.kwargs["chat_messages"]
+        assert sent == [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "Add"},
+        ]
+        assert [item.type for item in response.output] == ["message", "function_call"]
+        assert response.output[1].call_id == "toolu_1"
+
+
+class TestFailoverWithRunner:
+    """Tests for a runner whose client fails over to another API"""
+
+    def test_responses_runner_with_anthropic_backup(self, mock_client, status_error):
+        def add(a: int, b: int) -> int:
+            """Add two numbers."""
+            return a + b
+
+        tools = Tools()
+        tools.add_tool(add)
+
+        primary = mock_client("gpt-4o-mini", error=status_error(502))
+        backup = mock_client("claude-haiku-4-5")
+        backup.send_request.side_effect = [
+            anthropic_message(
+                [
+                    ToolUseBlock(
+                        type="tool_use",
+                        id="toolu_1",
+                        name="add",
+                        input={"a": 1, "b": 2},
+                    )
+                ]
+            ),
+            anthropic_message([TextBlock(type="text", text="It's 3")]),
+        ]
+
+        runner = OpenAIResponsesRunner(
+            tools=tools,
+            llm_client=FailoverClient(
+                [primary, backup], formats=[RESPONSES, ANTHROPIC], failure_threshold=1
+            ),
+        )
+        result = runner.loop("1 + 2?")
+
+        assert result.last_message == "It's 3"
+        second_request = backup.send_request.call_args_list[1].kwargs["chat_messages"]
+        assert second_request[-1] == {
+            "role": "tool",
+            "tool_call_id": "toolu_1",
+            "content": "3",
+        }
+        assert result.tokens.input_tokens == 20
+        assert result.tokens.model == "claude-haiku-4-5"
+        assert list(result.tokens_by_model) == ["claude-haiku-4-5"]
+
+    @pytest.mark.asyncio
+    async def test_async_failover(self, mock_client, status_error):
+        primary = mock_client(
+            "gpt-4o-mini", error=status_error(500), spec=AsyncLLMClient
+        )
+        backup = mock_client("gpt-4.1", responses_response("Backup"))
+
+        client = AsyncFailoverClient([primary, backup], formats=[RESPONSES, RESPONSES])
+        runner = OpenAIResponsesRunner(tools=None, llm_client=client)
+
+        result = await runner.aloop("Hello")
+        assert result.last_message == "Backup"
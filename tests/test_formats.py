@@ -0,0 +1,226 @@
+import json
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+import pytest
+from anthropic.types import Message, TextBlock, ToolUseBlock
+from anthropic.types import Usage as AnthropicUsage
+from openai.types.chat import ChatCompletion
+from openai.types.responses import Response, ResponseFunctionToolCall
+from openai.types.responses.easy_input_message import EasyInputMessage
+
+from toyaikit.cache import CachedClient
+from toyaikit.formats import (
+    ANTHROPIC,
+    CHAT_COMPLETIONS,
+    RESPONSES,
+    convert_messages,
+    convert_response,
+    get_message_format,
+)
+from toyaikit.llm import (
+    AnthropicClient,
+    LLMClient,
+    OpenAIChatCompletionsClient,
+    OpenAIClient,
+)
+
+RESPONSES_HISTORY = [
+    EasyInputMessage(role="developer", content="Be brief"),
+    EasyInputMessage(role="user", content="Weather?"),
+    ResponseFunctionToolCall(
+        type="function_call",
+        call_id="call_1",
+        name="weather",
+        arguments='{"city": "Berlin"}',
+    ),
+    {"type": "function_call_output", "call_id": "call_1", "output": '"sunny"'},
+    {"type": "reasoning", "id": "rs_1", "summary": []},
+    D(
+        type="message",
+        role="assistant",
+        content=[D(type="output_text", text="It's sunny")],
+    ),
+]
+
+CHAT_HISTORY = [
+    {"role": "system", "content": "Be brief"},
+    {"role": "user", "content": "Weather?"},
+    {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": "call_1",
+                "type": "function",
+                "function": {"name": "weather", "arguments": '{"city": "Berlin"}'},
+            }
+        ],
+    },
+    {"role": "tool", "tool_call_id": "call_1", "content": '"sunny"'},
+    {"role": "assistant", "content": "It's sunny"},
+]
+
+ANTHROPIC_HISTORY = [
+    {"role": "system", "content": "Be brief"},
+    {"role": "user", "content": "Weather?"},
+    {
+        "role": "assistant",
+        "content": [
+            ToolUseBlock(
+                type="tool_use", id="call_1", name="weather", input={"city": "Berlin"}
+            )
+        ],
+    },
+    {"role": "tool", "tool_call_id": "call_1", "content": '"sunny"'},
+    {"role": "assistant", "content": [TextBlock(type="text", text="It's sunny")]},
+]
+
+
+class TestGetMessageFormat:
+    """Tests for detecting the format of a client"""
+
+    def test_clients(self):
+        assert get_message_format(OpenAIClient(client=Mock())) == RESPONSES
+        assert (
+            get_message_format(OpenAIChatCompletionsClient(client=Mock()))
+            == CHAT_COMPLETIONS
+        )
+        anthropic_client = AnthropicClient.__new__(AnthropicClient)
+        assert get_message_format(anthropic_client) == ANTHROPIC
+
+    def test_wrapped_client(self):
+        client = CachedClient(OpenAIClient(client=Mock()), cache=Mock())
+        assert get_message_format(client) == RESPONSES
+
+    def test_unknown_client(self):
+        with pytest.raises(ValueError):
+            get_message_format(Mock(spec=LLMClient))
+
+
+class TestConvertMessages:
+    """Tests for translating histories between formats"""
+
+    def test_same_format_unchanged(self):
+        assert convert_messages(CHAT_HISTORY, RESPONSES, RESPONSES) is CHAT_HISTORY
+
+    def test_responses_to_chat(self):
+        assert convert_messages(RESPONSES_HISTORY, RESPONSES, CHAT_COMPLETIONS) == (
+            CHAT_HISTORY
+        )
+
+    def test_anthropic_to_chat(self):
+        assert convert_messages(ANTHROPIC_HISTORY, ANTHROPIC, CHAT_COMPLETIONS) == (
+            CHAT_HISTORY
+        )
+
+    def test_chat_to_responses(self):
+        messages = convert_messages(CHAT_HISTORY, CHAT_COMPLETIONS, RESPONSES)
+        assert messages == [
+            {"role": "developer", "content": "Be brief"},
+            {"role": "user", "content": "Weather?"},
+            {
+                "type": "function_call",
+                "call_id": "call_1",
+                "name": "weather",
+                "arguments": '{"city": "Berlin"}',
+            },
+            {"type": "function_call_output", "call_id": "call_1", "output": '"sunny"'},
+            {"role": "assistant", "content": "It's sunny"},
+        ]
+
+    def test_responses_to_anthropic(self):
+        messages = convert_messages(RESPONSES_HISTORY, RESPONSES, ANTHROPIC)
+        assert messages[2] == {
+            "role": "assistant",
+            "content": [
+                {
+                    "type": "tool_use",
+                    "id": "call_1",
+                    "name": "weather",
+                    "input": {"city": "Berlin"},
+                }
+            ],
+        }
+        assert messages[3] == {
+            "role": "tool",
+            "tool_call_id": "call_1",
+            "content": '"sunny"',
+        }
+
+    def test_anthropic_tool_result_blocks(self):
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "tool_result", "tool_use_id": "t1", "content": "a"},
+                    {"type": "tool_result", "tool_use_id": "t2", "content": "b"},
+                ],
+            }
+        ]
+        assert convert_messages(messages, ANTHROPIC, CHAT_COMPLETIONS) == [
+            {"role": "tool", "tool_call_id": "t1", "content": "a"},
+            {"role": "tool", "tool_call_id": "t2", "content": "b"},
+        ]
+
+
+class TestConvertResponse:
+    """Tests for translating responses between APIs"""
+
+    def message(self):
+        return Message(
+            id="msg_1",
+            type="message",
+            role="assistant",
+            model="claude-haiku-4-5",
+            content=[
+                TextBlock(type="text", text="Checking"),
+                ToolUseBlock(
+                    type="tool_use",
+                    id="toolu_1",
+                    name="weather",
+                    input={"city": "Paris"},
+                ),
+            ],
+            stop_reason="tool_use",
+            stop_sequence=None,
+            usage=AnthropicUsage(
+                input_tokens=10, output_tokens=5, cache_read_input_tokens=20
+            ),
+        )
+
+    def test_anthropic_to_responses(self):
+        response = convert_response(self.message(), ANTHROPIC, RESPONSES)
+
+        assert isinstance(response, Response)
+        assert response.model == "claude-haiku-4-5"
+        message, call = response.output
+        assert message.content[0].text == "Checking"
+        assert call.type == "function_call"
+        assert call.call_id == "toolu_1"
+        assert json.loads(call.arguments) == {"city": "Paris"}
+        assert response.usage.input_tokens == 30
+        assert response.usage.output_tokens == 5
+
+    def test_anthropic_to_chat_completions(self):
+        response = convert_response(self.message(), ANTHROPIC, CHAT_COMPLETIONS)
+
+        assert isinstance(response, ChatCompletion)
+        message = response.choices[0].message
+        assert message.content == "Checking"
+        assert message.tool_calls[0].function.name == "weather"
+        assert response.choices[0].finish_reason == "tool_calls"
+        assert response.usage.prompt_tokens == 30
+
+    def test_chat_completions_to_anthropic(self):
+        completion = convert_response(self.message(), ANTHROPIC, CHAT_COMPLETIONS)
+        message = convert_response(completion, CHAT_COMPLETIONS, ANTHROPIC)
+
+        assert isinstance(message, Message)
+        assert [block.type for block in message.content] == ["text", "tool_use"]
+        assert message.content[1].input == {"city": "Paris"}
+        assert message.stop_reason == "tool_use"
+
+    def test_same_format_unchanged(self):
+        message = self.message()
+        assert convert_response(message, ANTHROPIC, ANTHROPIC) is message
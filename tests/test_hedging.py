@@ -0,0 +1,272 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace as D
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from toyaikit.chat.runners import OpenAIResponsesRunner
+from toyaikit.hedging import (
+    AsyncHedgingClient,
+    HedgeOutcome,
+    HedgingClient,
+    collect_hedges,
+)
+from toyaikit.llm import AsyncLLMClient, LLMClient
+from toyaikit.pricing import PricingConfig
+
+
+def slow_client(name, delay, error=None):
+    """Sync client mock answering with D(name=name) after delay seconds."""
+
+    def send_request(**kwargs):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return D(name=name)
+
+    client = Mock(spec=LLMClient)
+    client.model = "gpt-4o-mini"
+    client.send_request.side_effect = send_request
+    return client
+
+
+def aslow_client(name, delay, error=None):
+    """Async client mock answering with D(name=name) after delay seconds."""
+    cancelled = []
+
+    async def send_request(**kwargs):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        if error is not None:
+            raise error
+        return D(name=name)
+
+    client = AsyncMock(spec=AsyncLLMClient)
+    client.model = "gpt-4o-mini"
+    client.send_request.side_effect = send_request
+    client.cancelled = cancelled
+    return client
+
+
+class TestHedgingClient:
+    """Tests for hedged requests with a sync client"""
+
+    def test_fast_request_not_hedged(self):
+        primary = slow_client("primary", 0)
+        backup = slow_client("backup", 0)
+        client = HedgingClient(primary, hedge_client=backup, delay=0.5)
+
+        with collect_hedges() as outcomes:
+            response = client.send_request(chat_messages=[])
+
+        assert response.name == "primary"
+        backup.send_request.assert_not_called()
+        assert outcomes == []
+        assert client.hedges_fired == 0
+
+    def test_slow_request_hedged(self):
+        primary = slow_client("primary", 0.5)
+        backup = slow_client("backup", 0)
+        client = HedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        with collect_hedges() as outcomes:
+            response = client.send_request(chat_messages=["hi"], tools=None)
+
+        assert response.name == "backup"
+        assert backup.send_request.call_args.kwargs["chat_messages"] == ["hi"]
+        assert outcomes == [HedgeOutcome(won=True)]
+        assert (client.hedges_fired, client.hedges_won) == (1, 1)
+
+    def test_primary_can_still_win(self):
+        primary = slow_client("primary", 0.1)
+        backup = slow_client("backup", 1)
+        client = HedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        assert client.send_request(chat_messages=[]).name == "primary"
+        assert (client.hedges_fired, client.hedges_won) == (1, 0)
+
+    def test_failed_request_falls_back_to_the_other(self):
+        primary = slow_client("primary", 0.1, error=RuntimeError("boom"))
+        backup = slow_client("backup", 0.2)
+        client = HedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        assert client.send_request(chat_messages=[]).name == "backup"
+
+    def test_both_failed(self):
+        primary = slow_client("primary", 0.1, error=RuntimeError("boom"))
+        client = HedgingClient(primary, delay=0.05)
+
+        with pytest.raises(RuntimeError):
+            client.send_request(chat_messages=[])
+
+    def test_streams_not_hedged(self):
+        primary = slow_client("primary", 0.1)
+        client = HedgingClient(primary, delay=0)
+
+        client.send_request(chat_messages=[], stream=True)
+        assert primary.send_request.call_count == 1
+        assert client.hedges_fired == 0
+
+    def test_delay_from_latency_percentile(self):
+        client = HedgingClient(
+            slow_client("primary", 0), percentile=0.9, min_samples=10, initial_delay=7
+        )
+        assert client.get_delay() == 7
+
+        client._latencies.extend(float(i) for i in range(1, 11))
+        assert client.get_delay() == 9
+
+    def test_primaries_not_limited_by_executor(self):
+        """Test concurrent requests don't queue behind each other"""
+        primary = slow_client("primary", 0.3)
+        client = HedgingClient(
+            primary, delay=0.2, executor=ThreadPoolExecutor(max_workers=1)
+        )
+
+        with ThreadPoolExecutor(max_workers=16) as callers:
+            started_at = time.monotonic()
+            responses = list(
+                callers.map(lambda _: client.send_request(chat_messages=[]), range(16))
+            )
+            elapsed = time.monotonic() - started_at
+
+        assert {r.name for r in responses} == {"primary"}
+        assert elapsed < 1
+
+    def test_records_latency_of_primary(self):
+        """Test the primary's latency is recorded, even if the backup won"""
+        primary = slow_client("primary", 0.3)
+        backup = slow_client("backup", 0)
+        client = HedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        assert client.send_request(chat_messages=[]).name == "backup"
+        assert len(client._latencies) == 0
+
+        time.sleep(0.4)
+        assert len(client._latencies) == 1
+        assert client._latencies[0] >= 0.3
+
+    def test_context_is_passed_to_requests(self):
+        var = contextvars.ContextVar("var", default=None)
+        seen = []
+
+        primary = Mock(spec=LLMClient)
+        primary.send_request.side_effect = lambda **kwargs: seen.append(var.get())
+        client = HedgingClient(primary, delay=1)
+
+        var.set("key")
+        client.send_request(chat_messages=[])
+        assert seen == ["key"]
+
+
+class TestAsyncHedgingClient:
+    """Tests for hedged requests with an async client"""
+
+    @pytest.mark.asyncio
+    async def test_slow_request_hedged_and_cancelled(self):
+        primary = aslow_client("primary", 1)
+        backup = aslow_client("backup", 0)
+        client = AsyncHedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        with collect_hedges() as outcomes:
+            response = await client.send_request(chat_messages=[])
+
+        await asyncio.sleep(0)
+        assert response.name == "backup"
+        assert primary.cancelled == ["primary"]
+        assert outcomes == [HedgeOutcome(won=True)]
+
+    @pytest.mark.asyncio
+    async def test_fast_request_not_hedged(self):
+        primary = aslow_client("primary", 0)
+        backup = aslow_client("backup", 0)
+        client = AsyncHedgingClient(primary, hedge_client=backup, delay=0.5)
+
+        response = await client.send_request(chat_messages=[])
+
+        assert response.name == "primary"
+        backup.send_request.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_records_latency_of_cancelled_primary(self):
+        """Test a cancelled primary counts as at least as slow as it ran"""
+        primary = aslow_client("primary", 1)
+        backup = aslow_client("backup", 0.1)
+        client = AsyncHedgingClient(primary, hedge_client=backup, delay=0.05)
+
+        await client.send_request(chat_messages=[])
+        await asyncio.sleep(0)
+
+        assert len(client._latencies) == 1
+        assert client._latencies[0] >= 0.15
+
+
+class TestRunnerHedgeReport:
+    """Tests for hedges reported in LoopResult"""
+
+    def make_runner(self, llm_client):
+        pricing = PricingConfig()
+        pricing.register_model("gpt-4o-mini", input_price=1, output_price=2)
+        return OpenAIResponsesRunner(
+            tools=None, llm_client=llm_client, pricing_config=pricing
+        )
+
+    def response(self, text):
+        message = D(type="message", content=[D(text=text)])
+        return D(
+            id="resp", output=[message], usage=D(input_tokens=100, output_tokens=10)
+        )
+
+    def test_hedges_in_loop_result(self):
+        calls = []
+        lock = threading.Lock()
+
+        def send_request(**kwargs):
+            with lock:
+                calls.append(len(calls))
+                first = calls[-1] == 0
+            if first:
+                time.sleep(0.5)
+            return self.response("Hi")
+
+        primary = Mock(spec=LLMClient)
+        primary.model = "gpt-4o-mini"
+        primary.send_request.side_effect = send_request
+
+        runner = self.make_runner(HedgingClient(primary, delay=0.05))
+        result = runner.loop("Hello")
+
+        assert result.hedges.fired == 1
+        assert result.hedges.won == 1
+        assert result.hedges.extra_tokens.input_tokens == 100
+        assert result.hedges.extra_cost.total_cost > 0
+        assert result.tokens.input_tokens == 100
+
+    def test_no_hedges(self):
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = self.response("Hi")
+
+        result = self.make_runner(llm_client).loop("Hello")
+        assert result.hedges is None
+
+    @pytest.mark.asyncio
+    async def test_hedges_in_aloop_result(self):
+        primary = aslow_client("primary", 1)
+        backup = AsyncMock(spec=AsyncLLMClient)
+        backup.send_request.return_value = self.response("Hi")
+
+        runner = self.make_runner(
+            AsyncHedgingClient(primary, hedge_client=backup, delay=0.05)
+        )
+        result = await runner.aloop("Hello")
+
+        assert result.hedges.fired == 1
+        assert result.last_message == "Hi"
@@ -1,10 +1,21 @@
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-from openai import OpenAI
+from anthropic.types import TextBlock, ThinkingBlock, ToolUseBlock
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 
-from toyaikit.llm import LLMClient, OpenAIChatCompletionsClient, OpenAIClient, AnthropicClient
+from toyaikit.chat.conversation import Conversation
+from toyaikit.llm import (
+    AnthropicClient,
+    AsyncAnthropicClient,
+    AsyncLLMClient,
+    AsyncOpenAIChatCompletionsClient,
+    AsyncOpenAIClient,
+    LLMClient,
+    OpenAIChatCompletionsClient,
+    OpenAIClient,
+)
 from toyaikit.tools import Tools
 
 
@@ -123,6 +134,21 @@ class TestOpenAIClient:
             max_tokens=1000,
         )
 
+    def test_send_request_with_previous_response_id(self):
+        """Test previous_response_id is passed to the Responses API"""
+        mock_client = Mock(spec=OpenAI)
+        client = OpenAIClient(client=mock_client)
+        chat_messages = [{"role": "user", "content": "Again"}]
+
+        client.send_request(chat_messages, previous_response_id="resp_1")
+
+        mock_client.responses.create.assert_called_once_with(
+            model="gpt-4o-mini",
+            input=chat_messages,
+            tools=[],
+            previous_response_id="resp_1",
+        )
+
 
 class TestOpenAIChatCompletionsClient:
     def test_initialization_with_defaults(self):
@@ -293,6 +319,41 @@ class TestOpenAIChatCompletionsClient:
             model="gpt-4o-mini", messages=chat_messages, tools=expected_tools
         )
 
+    def test_converted_tools_cached_per_version(self):
+        """Test the tools are converted once per Tools version and strictness"""
+        def search(q: str):
+            return q
+
+        def fetch(url: str):
+            return url
+
+        tools = Tools()
+        tools.add_tool(search)
+        client = OpenAIChatCompletionsClient(client=Mock(spec=OpenAI))
+        messages = [{"role": "user", "content": "Hello"}]
+
+        with patch.object(
+            client,
+            "convert_api_tools_to_chat_functions",
+            wraps=client.convert_api_tools_to_chat_functions,
+        ) as convert:
+            first = client.build_request_args(messages, tools)["tools"]
+            second = client.build_request_args(messages, tools)["tools"]
+            assert second is first
+            assert convert.call_count == 1
+
+            strict = client.build_request_args(messages, tools, BaseModel)["tools"]
+            assert strict[0]["function"]["strict"] is True
+            assert convert.call_count == 2
+
+            tools.add_tool(fetch)
+            names = [
+                tool["function"]["name"]
+                for tool in client.build_request_args(messages, tools)["tools"]
+            ]
+            assert names == ["search", "fetch"]
+            assert convert.call_count == 3
+
     def test_send_request_with_output_format(self):
         """Test send_request with output_format parameter"""
         mock_client = Mock(spec=OpenAI)
@@ -599,3 +660,345 @@ class TestAnthropicClient:
             kwargs = call_args[1]
             assert "response_format" in kwargs
             assert kwargs["response_format"]["type"] == "json_schema"
+
+
+class TestAnthropicPromptCaching:
+    def build_args(self, chat_messages, tools=None):
+        with patch("anthropic.Anthropic"):
+            client = AnthropicClient(prompt_caching=True)
+        return client.build_request_args(chat_messages, tools=tools)
+
+    def test_disabled_by_default(self):
+        """Test no cache_control is added without prompt_caching"""
+        with patch("anthropic.Anthropic"):
+            client = AnthropicClient()
+
+        args = client.build_request_args(
+            [{"role": "system", "content": "Be brief"}, {"role": "user", "content": "Hi"}]
+        )
+
+        assert args["system"] == "Be brief"
+        assert args["messages"] == [{"role": "user", "content": "Hi"}]
+
+    def test_breakpoints_on_system_tools_and_last_message(self):
+        """Test cache_control is placed on system, last tool and last message"""
+        tools = Mock(spec=Tools)
+        tools.get_tools.return_value = [
+            {"name": name, "description": "", "parameters": {}}
+            for name in ["search", "read"]
+        ]
+        chat_messages = [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello"},
+            {"role": "user", "content": "Search"},
+        ]
+
+        args = self.build_args(chat_messages, tools=tools)
+
+        ephemeral = {"type": "ephemeral"}
+        assert args["system"] == [
+            {"type": "text", "text": "Be brief", "cache_control": ephemeral}
+        ]
+        assert "cache_control" not in args["tools"][0]
+        assert args["tools"][1]["cache_control"] == ephemeral
+        assert args["messages"][1] == {"role": "assistant", "content": "Hello"}
+        assert args["messages"][-1]["content"] == [
+            {"type": "text", "text": "Search", "cache_control": ephemeral}
+        ]
+        # The history is not changed
+        assert chat_messages[-1] == {"role": "user", "content": "Search"}
+
+    def test_breakpoint_on_tool_result(self):
+        """Test the last tool result is marked in a tool-call loop"""
+        tool_use = ToolUseBlock(type="tool_use", id="toolu_1", name="search", input={})
+        content = [
+            ThinkingBlock(type="thinking", thinking="...", signature="sig"),
+            tool_use,
+        ]
+        chat_messages = [
+            {"role": "user", "content": "Search"},
+            {"role": "assistant", "content": content},
+            {"role": "tool", "tool_call_id": "toolu_1", "content": "found"},
+        ]
+
+        args = self.build_args(chat_messages)
+
+        assert args["messages"][-1]["content"] == [
+            {
+                "type": "tool_result",
+                "tool_use_id": "toolu_1",
+                "content": "found",
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+        assert args["messages"][1]["content"] is content
+
+    def test_skips_thinking_blocks(self):
+        """Test the breakpoint goes on the last block that can be marked"""
+        blocks = [
+            TextBlock(type="text", text="Let me think"),
+            ThinkingBlock(type="thinking", thinking="...", signature="sig"),
+        ]
+
+        marked = AnthropicClient._with_cache_control(blocks)
+
+        assert marked[0] == {
+            "type": "text",
+            "text": "Let me think",
+            "cache_control": {"type": "ephemeral"},
+        }
+        assert marked[1] is blocks[1]
+
+
+
+class TestAnthropicMessageConversion:
+    def make_client(self, **kwargs):
+        with patch("anthropic.Anthropic"):
+            return AnthropicClient(**kwargs)
+
+    def tool_turn(self):
+        return [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "Weather in Berlin and Paris?"},
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "tool_use", "id": "a", "name": "weather", "input": {}},
+                    {"type": "tool_use", "id": "b", "name": "weather", "input": {}},
+                ],
+            },
+            {"role": "tool", "tool_call_id": "a", "content": "sunny"},
+            {"role": "tool", "tool_call_id": "b", "content": "rainy"},
+        ]
+
+    def test_merges_consecutive_tool_results(self):
+        """Test the tool results of a turn go into one user message"""
+        client = self.make_client()
+
+        args = client.build_request_args(self.tool_turn())
+
+        assert args["system"] == "Be brief"
+        assert len(args["messages"]) == 3
+        assert args["messages"][2] == {
+            "role": "user",
+            "content": [
+                {"type": "tool_result", "tool_use_id": "a", "content": "sunny"},
+                {"type": "tool_result", "tool_use_id": "b", "content": "rainy"},
+            ],
+        }
+
+    def test_conversation_converted_incrementally(self):
+        """Test only the messages appended since the last request are
+        converted"""
+        client = self.make_client()
+        conversation = Conversation(self.tool_turn())
+
+        first = client.build_request_args(conversation)["messages"]
+
+        conversation.append({"role": "assistant", "content": "Sunny and rainy"})
+        conversation.append({"role": "user", "content": "Thanks"})
+        with patch.object(
+            AnthropicClient, "_add_message", wraps=AnthropicClient._add_message
+        ) as add_message:
+            args = client.build_request_args(conversation)
+
+        assert add_message.call_count == 2
+        assert args["system"] == "Be brief"
+        assert len(args["messages"]) == 5
+        assert all(a is b for a, b in zip(args["messages"], first))
+        assert len(first) == 3
+
+    def test_tool_result_after_cached_conversion(self):
+        """Test a tool result appended later joins the cached tool results"""
+        client = self.make_client()
+        messages = self.tool_turn()
+        conversation = Conversation(messages[:-1])
+
+        client.build_request_args(conversation)
+        conversation.append(messages[-1])
+        args = client.build_request_args(conversation)
+
+        assert args["messages"] == client.build_request_args(messages)["messages"]
+
+    def test_breakpoints_do_not_change_cached_messages(self):
+        """Test cache_control is only added to the messages of the request"""
+        client = self.make_client(prompt_caching=True)
+        conversation = Conversation(self.tool_turn())
+
+        first = client.build_request_args(conversation)["messages"]
+        conversation.append({"role": "assistant", "content": "Done"})
+        args = client.build_request_args(conversation)
+
+        assert "cache_control" in first[2]["content"][-1]
+        assert "cache_control" not in args["messages"][2]["content"][-1]
+        assert args["messages"][3]["content"][-1]["cache_control"] == {
+            "type": "ephemeral"
+        }
+
+
+class TestAsyncClients:
+    @pytest.mark.asyncio
+    async def test_base_class_send_request_not_implemented(self):
+        """Test async base class raises NotImplementedError"""
+        client = AsyncLLMClient()
+        with pytest.raises(
+            NotImplementedError, match="Subclasses must implement this method"
+        ):
+            await client.send_request([])
+
+    def test_async_openai_client_creates_async_openai(self):
+        """Test AsyncOpenAIClient creates an AsyncOpenAI client by default"""
+        with patch("toyaikit.llm.AsyncOpenAI") as mock_async_openai:
+            client = AsyncOpenAIClient(model="gpt-4o")
+
+            assert client.model == "gpt-4o"
+            assert client.client == mock_async_openai.return_value
+            assert isinstance(client, AsyncLLMClient)
+
+    @pytest.mark.asyncio
+    async def test_async_openai_client_send_request(self):
+        """Test AsyncOpenAIClient awaits responses.create with the same args"""
+        mock_client = Mock(spec=AsyncOpenAI)
+        mock_response = Mock()
+        mock_client.responses.create = AsyncMock(return_value=mock_response)
+
+        client = AsyncOpenAIClient(client=mock_client, extra_kwargs={"temperature": 0})
+        chat_messages = [{"role": "user", "content": "Hello"}]
+
+        result = await client.send_request(chat_messages)
+
+        assert result == mock_response
+        mock_client.responses.create.assert_awaited_once_with(
+            model="gpt-4o-mini", input=chat_messages, tools=[], temperature=0
+        )
+
+    @pytest.mark.asyncio
+    async def test_async_openai_client_send_request_with_output_format(self):
+        """Test AsyncOpenAIClient uses responses.parse for structured output"""
+        mock_client = Mock(spec=AsyncOpenAI)
+        mock_client.responses.parse = AsyncMock(return_value="parsed")
+
+        class Answer(BaseModel):
+            text: str
+
+        client = AsyncOpenAIClient(client=mock_client)
+        result = await client.send_request([], output_format=Answer)
+
+        assert result == "parsed"
+        kwargs = mock_client.responses.parse.call_args.kwargs
+        assert kwargs["text_format"] is Answer
+
+    @pytest.mark.asyncio
+    async def test_async_chat_completions_client_send_request(self):
+        """Test AsyncOpenAIChatCompletionsClient converts tools and awaits create"""
+        mock_client = Mock(spec=AsyncOpenAI)
+        mock_client.chat.completions.create = AsyncMock(return_value="completion")
+
+        tools = Mock(spec=Tools)
+        tools.get_tools.return_value = [
+            {
+                "type": "function",
+                "name": "search",
+                "description": "Search",
+                "parameters": {"type": "object", "properties": {}},
+            }
+        ]
+
+        client = AsyncOpenAIChatCompletionsClient(client=mock_client)
+        result = await client.send_request([], tools=tools)
+
+        assert result == "completion"
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        assert kwargs["tools"][0]["function"]["name"] == "search"
+
+    @pytest.mark.asyncio
+    async def test_async_anthropic_client_send_request(self):
+        """Test AsyncAnthropicClient converts messages and awaits messages.create"""
+        mock_client = Mock()
+        mock_client.messages.create = AsyncMock(return_value="message")
+
+        with patch("anthropic.AsyncAnthropic", return_value=mock_client) as mock_cls:
+            client = AsyncAnthropicClient(api_key="key")
+            mock_cls.assert_called_once_with(api_key="key")
+
+            result = await client.send_request(
+                [
+                    {"role": "system", "content": "Be brief"},
+                    {"role": "user", "content": "Hello"},
+                ]
+            )
+
+        assert result == "message"
+        kwargs = mock_client.messages.create.call_args.kwargs
+        assert kwargs["system"] == "Be brief"
+        assert kwargs["messages"] == [{"role": "user", "content": "Hello"}]
+
+
+class TestStreamingRequests:
+    def test_openai_client_stream(self):
+        """Test stream=True passes through to responses.create"""
+        mock_client = Mock(spec=OpenAI)
+        client = OpenAIClient(client=mock_client)
+
+        result = client.send_request([], stream=True)
+
+        assert result == mock_client.responses.create.return_value
+        mock_client.responses.create.assert_called_once_with(
+            stream=True, model="gpt-4o-mini", input=[], tools=[]
+        )
+
+    def test_stream_with_output_format_not_supported(self):
+        """Test structured output cannot be combined with streaming"""
+        class Answer(BaseModel):
+            text: str
+
+        client = OpenAIClient(client=Mock(spec=OpenAI))
+        with pytest.raises(ValueError, match="cannot be streamed"):
+            client.send_request([], output_format=Answer, stream=True)
+
+    def test_chat_completions_client_stream_includes_usage(self):
+        """Test Chat Completions streaming asks for usage in the last chunk"""
+        mock_client = Mock(spec=OpenAI)
+        client = OpenAIChatCompletionsClient(client=mock_client)
+
+        client.send_request([], stream=True)
+
+        kwargs = mock_client.chat.completions.create.call_args.kwargs
+        assert kwargs["stream"] is True
+        assert kwargs["stream_options"] == {"include_usage": True}
+
+    def test_anthropic_client_stream(self):
+        """Test stream=True passes through to messages.create"""
+        mock_client = Mock()
+
+        with patch("anthropic.Anthropic", return_value=mock_client):
+            client = AnthropicClient()
+            client.send_request([{"role": "user", "content": "Hi"}], stream=True)
+
+        kwargs = mock_client.messages.create.call_args.kwargs
+        assert kwargs["stream"] is True
+
+    def test_anthropic_stream_with_output_format_not_supported(self):
+        """Test the Anthropic clients refuse structured output in a stream"""
+
+        class Answer(BaseModel):
+            text: str
+
+        with patch("anthropic.Anthropic"):
+            client = AnthropicClient()
+        with pytest.raises(ValueError, match="cannot be streamed"):
+            client.send_request([], output_format=Answer, stream=True)
+        client.client.messages.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_async_anthropic_stream_with_output_format_not_supported(self):
+        """Test the same for the async Anthropic client"""
+
+        class Answer(BaseModel):
+            text: str
+
+        with patch("anthropic.AsyncAnthropic"):
+            client = AsyncAnthropicClient()
+        with pytest.raises(ValueError, match="cannot be streamed"):
+            await client.send_request([], output_format=Answer, stream=True)
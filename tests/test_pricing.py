@@ -4,7 +4,13 @@ from decimal import Decimal
 import pytest
 from genai_prices import Usage, calc_price
 
-from toyaikit.pricing import PricingConfig, CostInfo, UnknownModelWarning
+from toyaikit.pricing import (
+    CostInfo,
+    PricingConfig,
+    TokenUsage,
+    UnknownModelWarning,
+    UsageByModel,
+)
 
 
 class TestPricingConfig:
@@ -191,3 +197,129 @@ class TestPricingConfig:
 
         with pytest.warns(UnknownModelWarning):
             assert other.calculate_cost("scoped-model", 100, 100) is None
+
+
+class TestCacheTokens:
+    def setup_method(self):
+        self.pricing_config = PricingConfig()
+
+    def test_cache_tokens_are_priced_by_genai_prices(self):
+        """Cache reads and writes are priced with the model's cache prices."""
+        model = "anthropic:claude-sonnet-4-5"
+
+        genai_result = calc_price(
+            Usage(
+                input_tokens=10_000,
+                output_tokens=100,
+                cache_write_tokens=2_000,
+                cache_read_tokens=7_000,
+            ),
+            provider_id="anthropic",
+            model_ref="claude-sonnet-4-5",
+        )
+
+        result = self.pricing_config.calculate_cost(
+            model,
+            input_tokens=10_000,
+            output_tokens=100,
+            cache_creation_input_tokens=2_000,
+            cache_read_input_tokens=7_000,
+        )
+        uncached = self.pricing_config.calculate_cost(model, 10_000, 100)
+
+        assert result.input_cost == genai_result.input_price
+        assert result.input_cost < uncached.input_cost
+
+    def test_registered_cache_prices(self):
+        """Fallback pricing uses the registered cache prices."""
+        self.pricing_config.register_model(
+            "cached-model",
+            input_price=1,
+            output_price=2,
+            cache_write_price="1.25",
+            cache_read_price="0.1",
+        )
+
+        result = self.pricing_config.calculate_cost(
+            "cached-model",
+            input_tokens=3_000_000,
+            output_tokens=0,
+            cache_creation_input_tokens=1_000_000,
+            cache_read_input_tokens=1_000_000,
+        )
+
+        assert result.input_cost == Decimal("2.35")
+
+    def test_cache_prices_default_to_input_price(self):
+        """Without cache prices, cached tokens cost as much as input tokens."""
+        self.pricing_config.register_model("plain-model", input_price=1, output_price=2)
+
+        result = self.pricing_config.calculate_cost(
+            "plain-model",
+            input_tokens=1_000_000,
+            output_tokens=0,
+            cache_read_input_tokens=500_000,
+        )
+
+        assert result.input_cost == Decimal("1")
+
+    def test_calculate_usage_cost(self):
+        usage = TokenUsage(
+            model="gpt-4o-mini",
+            input_tokens=1000,
+            output_tokens=10,
+            cache_read_input_tokens=500,
+        )
+
+        assert self.pricing_config.calculate_usage_cost(usage) == (
+            self.pricing_config.calculate_cost(
+                "gpt-4o-mini", 1000, 10, cache_read_input_tokens=500
+            )
+        )
+
+
+class TestTokenUsage:
+    def test_add(self):
+        total = TokenUsage("m", 10, 5, cache_read_input_tokens=4) + TokenUsage(
+            "m", 1, 2, cache_creation_input_tokens=3
+        )
+
+        assert total == TokenUsage(
+            model="m",
+            input_tokens=11,
+            output_tokens=7,
+            cache_creation_input_tokens=3,
+            cache_read_input_tokens=4,
+        )
+
+    def test_add_refuses_different_models(self):
+        """Test tokens of models with different prices aren't merged"""
+        with pytest.raises(ValueError):
+            TokenUsage("gpt-4o", 10, 5) + TokenUsage("gpt-4o-mini", 1, 2)
+
+
+class TestUsageByModel:
+    def test_total_and_cost_per_model(self):
+        """Test each model's tokens are priced with its own prices"""
+        pricing = PricingConfig()
+        pricing.register_model("large-model", input_price=10, output_price=0)
+        pricing.register_model("small-model", input_price=1, output_price=0)
+
+        usage = UsageByModel()
+        usage.add(TokenUsage("large-model", 1_000_000, 0))
+        usage.add(TokenUsage("small-model", 1_000_000, 0))
+        usage.add(TokenUsage("small-model", 1_000_000, 0))
+
+        assert usage["small-model"].input_tokens == 2_000_000
+        total = usage.total("large-model")
+        assert total.model == "large-model+small-model"
+        assert total.input_tokens == 3_000_000
+        assert pricing.calculate_total_cost(usage.values()).total_cost == 12
+
+    def test_total_of_one_model(self):
+        """Test the total keeps the model when there's only one"""
+        usage = UsageByModel()
+        assert usage.total("m") == TokenUsage("m", 0, 0)
+
+        usage.add(TokenUsage("other", 1, 2))
+        assert usage.total("m") == TokenUsage("other", 1, 2)
@@ -0,0 +1,246 @@
+from types import SimpleNamespace as D
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import openai
+import pytest
+
+from toyaikit.deadlines import Deadline, DeadlineExceeded, deadline_scope
+from toyaikit.llm import LLMClient
+from toyaikit.ratelimit import (
+    AsyncRateLimitedClient,
+    RateLimit,
+    RateLimitedClient,
+    RateLimitScheduler,
+    TokenBucket,
+    get_response_tokens,
+    parse_reset,
+)
+
+
+def make_scheduler(clock, **kwargs):
+    kwargs.setdefault("token_counter", lambda messages: 100)
+    return RateLimitScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def response(total_tokens=None):
+    usage = D(input_tokens=total_tokens or 0, output_tokens=0)
+    return D(usage=usage if total_tokens is not None else None)
+
+
+class TestParseReset:
+    def test_formats(self):
+        assert parse_reset("1s") == 1
+        assert parse_reset("6m0s") == 360
+        assert parse_reset("20ms") == pytest.approx(0.02)
+        assert parse_reset("1h2m3.5s") == pytest.approx(3723.5)
+        assert parse_reset("12") == 12
+        assert parse_reset("2025-01-01T00:00:10Z", now=1735689600) == 10
+        assert parse_reset("soon") is None
+        assert parse_reset(None) is None
+
+
+class TestTokenBucket:
+    def test_callers_wait_for_their_share(self):
+        bucket = TokenBucket(capacity=60, period=60.0, now=0.0)
+
+        assert bucket.reserve(60, now=0.0) == 0
+        # Refills at one per second, callers queue behind each other
+        assert bucket.reserve(1, now=0.0) == pytest.approx(1)
+        assert bucket.reserve(1, now=0.0) == pytest.approx(2)
+        assert bucket.reserve(1, now=10.0) == 0
+
+    def test_update_from_provider(self):
+        bucket = TokenBucket(capacity=100, period=60.0, now=0.0)
+        bucket.update(now=0.0, limit=50, remaining=0, reset=5.0)
+
+        assert bucket.capacity == 50
+        assert bucket.reserve(0, now=1.0) == pytest.approx(4)
+
+
+class TestRateLimitScheduler:
+    def test_requests_per_minute(self, clock):
+        scheduler = make_scheduler(
+            clock, limits={"gpt-4o-mini": RateLimit(requests_per_minute=2)}
+        )
+
+        for _ in range(3):
+            scheduler.call("gpt-4o-mini", [], lambda: response())
+
+        assert clock.sleeps == [pytest.approx(30)]
+        # Other models aren't limited
+        scheduler.call("gpt-4o", [], lambda: response())
+        assert len(clock.sleeps) == 1
+
+    def test_tokens_per_minute_settled_with_usage(self, clock):
+        scheduler = make_scheduler(
+            clock, default_limit=RateLimit(tokens_per_minute=600)
+        )
+
+        # Estimated 100 tokens, but the response used 400
+        scheduler.call("m", [], lambda: response(total_tokens=400))
+        buckets = scheduler._buckets["m"]
+        assert buckets.tokens.level == pytest.approx(200)
+
+        scheduler.call("m", [], lambda: response(total_tokens=100))
+        scheduler.call("m", [], lambda: response(total_tokens=100))
+        # 0 tokens left, the next request of 100 waits 10 seconds
+        scheduler.call("m", [], lambda: response(total_tokens=100))
+        assert clock.sleeps == [pytest.approx(10)]
+
+    def test_retries_rate_limit_errors(self, clock, status_error):
+        scheduler = make_scheduler(clock, base_delay=0.5)
+        ok = response()
+        send = Mock(
+            side_effect=[
+                status_error(429, {"retry-after": "3"}),
+                status_error(500),
+                ok,
+            ]
+        )
+
+        result = scheduler.call("m", [], send)
+
+        assert result is ok
+        assert send.call_count == 3
+        assert scheduler.retries == 2
+        assert clock.sleeps[0] >= 3
+        assert clock.sleeps[1] <= 1.0
+
+    def test_gives_up_after_max_retries(self, clock, status_error):
+        scheduler = make_scheduler(clock, max_retries=2)
+        send = Mock(side_effect=status_error(429))
+
+        with pytest.raises(openai.RateLimitError):
+            scheduler.call("m", [], send)
+
+        assert send.call_count == 3
+
+    def test_wait_past_deadline_fails(self, clock):
+        """Test a request doesn't wait for the rate limit past the deadline"""
+        scheduler = make_scheduler(
+            clock, limits={"m": RateLimit(requests_per_minute=2)}
+        )
+        send = Mock(return_value=response())
+
+        with deadline_scope(Deadline(10, clock=clock)):
+            scheduler.call("m", [], send)
+            scheduler.call("m", [], send)
+            with pytest.raises(DeadlineExceeded):
+                scheduler.call("m", [], send)
+
+        assert send.call_count == 2
+        assert clock.sleeps == []
+
+    def test_retry_past_deadline_fails(self, clock, status_error):
+        """Test a retry that would start after the deadline isn't waited for"""
+        scheduler = make_scheduler(clock)
+        send = Mock(side_effect=status_error(429, {"retry-after": "30"}))
+
+        with deadline_scope(Deadline(10, clock=clock)):
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                scheduler.call("m", [], send)
+
+        assert isinstance(exc_info.value.__cause__, openai.RateLimitError)
+        assert send.call_count == 1
+        assert clock.sleeps == []
+
+    def test_does_not_retry_client_errors(self, clock):
+        scheduler = make_scheduler(clock)
+        send = Mock(side_effect=ValueError("bad request"))
+
+        with pytest.raises(ValueError):
+            scheduler.call("m", [], send)
+
+        assert send.call_count == 1
+        assert clock.sleeps == []
+
+    def test_learns_limits_from_headers(self, clock):
+        scheduler = make_scheduler(clock)
+
+        scheduler.update_from_headers(
+            "m",
+            {
+                "x-ratelimit-limit-requests": "60",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-reset-requests": "2s",
+                "x-ratelimit-limit-tokens": "10000",
+                "x-ratelimit-remaining-tokens": "9000",
+            },
+        )
+
+        buckets = scheduler._buckets["m"]
+        assert buckets.requests.capacity == 60
+        assert buckets.tokens.level == 9000
+        assert scheduler.reserve("m", 100) == pytest.approx(2)
+
+    def test_anthropic_headers(self, clock):
+        scheduler = make_scheduler(clock)
+
+        scheduler.update_from_headers(
+            "claude",
+            {
+                "anthropic-ratelimit-requests-limit": "50",
+                "anthropic-ratelimit-requests-remaining": "49",
+                "anthropic-ratelimit-input-tokens-limit": "40000",
+                "anthropic-ratelimit-input-tokens-remaining": "39000",
+            },
+        )
+
+        buckets = scheduler._buckets["claude"]
+        assert buckets.requests.level == 49
+        assert buckets.tokens.capacity == 40000
+
+    def test_event_hook_updates_the_current_key(self, clock):
+        scheduler = make_scheduler(clock)
+        headers = {"x-ratelimit-limit-requests": "10"}
+
+        def send():
+            hook = scheduler.event_hooks["response"][0]
+            hook(httpx.Response(200, headers=headers))
+            return response()
+
+        scheduler.call("gpt-4o-mini", [], send)
+
+        assert scheduler._buckets["gpt-4o-mini"].requests.capacity == 10
+
+
+class TestRateLimitedClient:
+    def test_send_request_goes_through_scheduler(self, clock):
+        scheduler = make_scheduler(
+            clock, limits={"team-a/gpt-4o-mini": RateLimit(requests_per_minute=1)}
+        )
+        inner = Mock(spec=LLMClient)
+        inner.model = "gpt-4o-mini"
+        inner.send_request.return_value = response()
+
+        client = RateLimitedClient(inner, scheduler, key="team-a")
+        client.send_request(chat_messages=[], tools=None, output_format=None)
+        client.send_request(chat_messages=[], stream=True)
+
+        assert client.model == "gpt-4o-mini"
+        assert clock.sleeps == [pytest.approx(60)]
+        assert inner.send_request.call_args.kwargs == {
+            "chat_messages": [],
+            "tools": None,
+            "stream": True,
+        }
+
+    @pytest.mark.asyncio
+    async def test_async_client_retries(self, status_error):
+        scheduler = RateLimitScheduler(base_delay=0.001)
+        inner = Mock()
+        inner.model = "gpt-4o-mini"
+        inner.send_request = AsyncMock(side_effect=[status_error(429), response()])
+
+        client = AsyncRateLimitedClient(inner, scheduler)
+        await client.send_request(chat_messages=[])
+
+        assert inner.send_request.call_count == 2
+        assert scheduler.retries == 1
+
+
+def test_get_response_tokens():
+    assert get_response_tokens(D(usage=D(input_tokens=3, output_tokens=2))) == 5
+    assert get_response_tokens(D(usage=D(prompt_tokens=3, completion_tokens=1))) == 4
+    assert get_response_tokens(D(usage=None)) is None
@@ -0,0 +1,280 @@
+import json
+from types import SimpleNamespace as D
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from toyaikit.cache import CachedClient, ResponseCache
+from toyaikit.chat.runners import (
+    AnthropicMessagesRunner,
+    OpenAIChatCompletionsRunner,
+    OpenAIResponsesRunner,
+)
+from toyaikit.llm import (
+    AnthropicClient,
+    AsyncOpenAIChatCompletionsClient,
+    LLMClient,
+    OpenAIClient,
+)
+from toyaikit.raw import RawObject, parse_raw_json
+from toyaikit.tools import Tools
+
+RESPONSES_BODY = {
+    "id": "resp_1",
+    "object": "response",
+    "output": [
+        {
+            "type": "message",
+            "id": "msg_1",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": "Hi", "annotations": []}],
+        }
+    ],
+    "usage": {
+        "input_tokens": 12,
+        "output_tokens": 3,
+        "input_tokens_details": {"cached_tokens": 4},
+    },
+}
+
+CHAT_TOOL_CALL_BODY = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "refusal": None,
+                "tool_calls": [
+                    {
+                        "id": "call_1",
+                        "type": "function",
+                        "function": {"name": "add", "arguments": '{"a": 1, "b": 2}'},
+                    }
+                ],
+            },
+        }
+    ],
+    "usage": {"prompt_tokens": 20, "completion_tokens": 5},
+}
+
+CHAT_ANSWER_BODY = {
+    "id": "chatcmpl-2",
+    "object": "chat.completion",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "3", "tool_calls": None},
+        }
+    ],
+    "usage": {"prompt_tokens": 30, "completion_tokens": 1},
+}
+
+ANTHROPIC_TOOL_USE_BODY = {
+    "id": "msg_1",
+    "type": "message",
+    "role": "assistant",
+    "content": [
+        {"type": "text", "text": "Adding"},
+        {"type": "tool_use", "id": "toolu_1", "name": "add", "input": {"a": 1, "b": 2}},
+    ],
+    "usage": {
+        "input_tokens": 10,
+        "output_tokens": 5,
+        "cache_read_input_tokens": 6,
+    },
+}
+
+ANTHROPIC_ANSWER_BODY = {
+    "id": "msg_2",
+    "type": "message",
+    "role": "assistant",
+    "content": [{"type": "text", "text": "3"}],
+    "usage": {"input_tokens": 20, "output_tokens": 1},
+}
+
+
+def raw_response(body):
+    """What with_raw_response.create returns, as far as the clients use it."""
+    return D(content=json.dumps(body).encode())
+
+
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def make_tools():
+    tools = Tools()
+    tools.add_tool(add)
+    return tools
+
+
+class TestRawObject:
+    def test_attribute_access(self):
+        """Test fields of nested objects are attributes, lists stay lists"""
+        response = parse_raw_json(json.dumps(RESPONSES_BODY))
+
+        assert isinstance(response, RawObject)
+        assert response.output[0].content[0].text == "Hi"
+        assert response.usage.input_tokens_details.cached_tokens == 4
+        assert getattr(response, "missing", None) is None
+        with pytest.raises(AttributeError):
+            response.missing
+
+    def test_is_plain_json(self):
+        """Test a RawObject serializes like the dict it was parsed from"""
+        response = parse_raw_json(json.dumps(CHAT_TOOL_CALL_BODY))
+
+        assert json.loads(json.dumps(response)) == CHAT_TOOL_CALL_BODY
+        message = response.model_dump(exclude_none=True)["choices"][0]["message"]
+        assert "content" not in message
+        assert type(message) is dict
+
+    def test_response_cache_round_trip(self, tmp_path):
+        """Test raw responses can be stored in a ResponseCache"""
+        cache = ResponseCache(tmp_path / "cache.db")
+        response = parse_raw_json(json.dumps(RESPONSES_BODY))
+
+        cache.put("key", response)
+        cached = cache.get("key")
+
+        assert isinstance(cached, RawObject)
+        assert cached == response
+
+    def test_cached_client(self, tmp_path):
+        """Test raw responses are cached by a CachedClient"""
+        mock_client = Mock(spec=OpenAI)
+        mock_client.responses.with_raw_response.create.return_value = raw_response(
+            RESPONSES_BODY
+        )
+        cache = ResponseCache(tmp_path / "cache.db")
+        llm_client = CachedClient(
+            OpenAIClient(client=mock_client, raw_responses=True), cache
+        )
+        messages = [{"role": "user", "content": "Hello"}]
+
+        responses = [llm_client.send_request(messages) for _ in range(3)]
+
+        assert mock_client.responses.with_raw_response.create.call_count == 1
+        assert len(cache) == 1
+        assert all(isinstance(r, RawObject) for r in responses)
+        assert responses[2] == responses[0]
+
+
+class TestRawClients:
+    def test_openai_client(self):
+        """Test the Responses client parses the raw body instead of the model"""
+        mock_client = Mock(spec=OpenAI)
+        mock_client.responses.with_raw_response.create.return_value = raw_response(
+            RESPONSES_BODY
+        )
+        llm_client = OpenAIClient(client=mock_client, raw_responses=True)
+        messages = [{"role": "user", "content": "Hello"}]
+
+        response = llm_client.send_request(messages)
+
+        assert response.id == "resp_1"
+        mock_client.responses.create.assert_not_called()
+        mock_client.responses.with_raw_response.create.assert_called_once_with(
+            model="gpt-4o-mini", input=messages, tools=[]
+        )
+
+    def test_structured_output_still_parsed(self):
+        """Test output_format uses the SDK's parsing as before"""
+        mock_client = Mock(spec=OpenAI)
+        mock_client.responses.parse.return_value = "parsed"
+        llm_client = OpenAIClient(client=mock_client, raw_responses=True)
+
+        result = llm_client.send_request([], output_format=Mock())
+
+        assert result == "parsed"
+        mock_client.responses.with_raw_response.create.assert_not_called()
+
+    def test_anthropic_client(self):
+        """Test the Anthropic client parses the raw body instead of the Message"""
+        with patch("anthropic.Anthropic") as mock_anthropic:
+            mock_client = mock_anthropic.return_value
+            mock_client.messages.with_raw_response.create.return_value = raw_response(
+                ANTHROPIC_ANSWER_BODY
+            )
+            llm_client = AnthropicClient(raw_responses=True)
+
+            response = llm_client.send_request([{"role": "user", "content": "Hi"}])
+
+        assert response.content[0].text == "3"
+        mock_client.messages.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_async_chat_completions_client(self):
+        """Test the async clients await the raw response"""
+        mock_client = Mock(spec=AsyncOpenAI)
+        mock_client.chat.completions.with_raw_response.create = AsyncMock(
+            return_value=raw_response(CHAT_ANSWER_BODY)
+        )
+        llm_client = AsyncOpenAIChatCompletionsClient(
+            client=mock_client, raw_responses=True
+        )
+
+        response = await llm_client.send_request([])
+
+        assert response.choices[0].message.content == "3"
+
+
+class TestRawResponsesInRunners:
+    def make_llm_client(self, model, *bodies):
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = model
+        llm_client.send_request.side_effect = [
+            parse_raw_json(json.dumps(body)) for body in bodies
+        ]
+        return llm_client
+
+    def test_responses_runner(self):
+        """Test the Responses runner reads the answer and usage of a raw response"""
+        llm_client = self.make_llm_client("gpt-4o-mini", RESPONSES_BODY)
+        runner = OpenAIResponsesRunner(tools=make_tools(), llm_client=llm_client)
+
+        result = runner.loop("Hello")
+
+        assert result.last_message == "Hi"
+        assert result.tokens.input_tokens == 12
+        assert result.tokens.cache_read_input_tokens == 4
+
+    def test_chat_completions_runner(self):
+        """Test tool calls of a raw Chat Completions response are executed"""
+        llm_client = self.make_llm_client(
+            "gpt-4o-mini", CHAT_TOOL_CALL_BODY, CHAT_ANSWER_BODY
+        )
+        runner = OpenAIChatCompletionsRunner(tools=make_tools(), llm_client=llm_client)
+
+        result = runner.loop("1 + 2?")
+
+        assert result.last_message == "3"
+        assert result.tokens.input_tokens == 50
+        tool_message = result.new_messages[3]
+        assert tool_message["tool_call_id"] == "call_1"
+        assert tool_message["content"] == "3"
+        # The assistant message goes back into the next request as it came
+        second_request = llm_client.send_request.call_args_list[1].kwargs
+        assistant_message = CHAT_TOOL_CALL_BODY["choices"][0]["message"]
+        assert second_request["chat_messages"][2] == assistant_message
+
+    def test_anthropic_runner(self):
+        """Test tool_use blocks of a raw Anthropic response are executed"""
+        llm_client = self.make_llm_client(
+            "claude-sonnet-4-5-20250514", ANTHROPIC_TOOL_USE_BODY, ANTHROPIC_ANSWER_BODY
+        )
+        runner = AnthropicMessagesRunner(tools=make_tools(), llm_client=llm_client)
+
+        result = runner.loop("1 + 2?")
+
+        assert result.last_message == "3"
+        assert result.tokens.input_tokens == 36
+        assert result.new_messages[3]["content"] == "3"
@@ -0,0 +1,236 @@
+from types import SimpleNamespace as D
+
+import pytest
+
+from toyaikit.chat.runners import OpenAIResponsesRunner
+from toyaikit.formats import CHAT_COMPLETIONS, RESPONSES
+from toyaikit.llm import AsyncLLMClient
+from toyaikit.pricing import PricingConfig, UnknownModelWarning
+from toyaikit.routing import LARGE, SMALL, AsyncRoutingClient, RoutingClient
+from toyaikit.tools import Tools
+
+
+def response(text, input_tokens=1000, output_tokens=100):
+    message = D(type="message", content=[D(text=text)])
+    return D(
+        output=[message],
+        usage=D(input_tokens=input_tokens, output_tokens=output_tokens),
+    )
+
+
+@pytest.fixture
+def make_router(mock_client):
+    def make(**kwargs):
+        return RoutingClient(
+            large=mock_client("gpt-4o", response("gpt-4o")),
+            small=mock_client("gpt-4o-mini", response("gpt-4o-mini")),
+            message_format=RESPONSES,
+            **kwargs,
+        )
+
+    return make
+
+
+USER_TURN = [{"role": "user", "content": "Plan a trip"}]
+AFTER_TOOL = [
+    {"role": "user", "content": "Weather in Berlin?"},
+    {"type": "function_call", "call_id": "c1", "name": "weather", "arguments": "{}"},
+    {"type": "function_call_output", "call_id": "c1", "output": "sunny"},
+]
+
+
+class TestRoutingClient:
+    def test_routes_after_tool_results_to_small_model(self, make_router):
+        """Test the answer after tool results goes to the small model"""
+        router = make_router()
+
+        assert router.send_request(USER_TURN).output[0].content[0].text == "gpt-4o"
+        assert router.model == "gpt-4o"
+
+        result = router.send_request(AFTER_TOOL)
+        assert result.output[0].content[0].text == "gpt-4o-mini"
+        assert router.model == "gpt-4o-mini"
+        assert router.stats[SMALL].requests == 1
+        assert router.stats[LARGE].requests == 1
+
+    def test_long_history_goes_to_large_model(self, make_router):
+        """Test histories longer than max_small_messages use the large model"""
+        router = make_router(max_small_messages=2)
+
+        router.send_request(AFTER_TOOL)
+
+        assert router.last_route == LARGE
+
+    def test_chat_completions_tool_messages(self, mock_client):
+        """Test tool results are detected in other message formats"""
+        router = RoutingClient(
+            large=mock_client("gpt-4o", response("gpt-4o")),
+            small=mock_client("gpt-4o-mini", response("gpt-4o-mini")),
+            message_format=CHAT_COMPLETIONS,
+        )
+
+        assert router.choose_route([{"role": "tool", "content": "ok"}]) == SMALL
+        assert router.choose_route([{"role": "user", "content": "Hi"}]) == LARGE
+
+    def test_classifier_decides_first(self, make_router):
+        """Test the classifier overrides the rules unless it returns None"""
+        decisions = iter([True, False, None])
+        router = make_router(classifier=lambda messages: next(decisions))
+
+        assert router.choose_route(USER_TURN) == SMALL
+        assert router.choose_route(AFTER_TOOL) == LARGE
+        assert router.choose_route(AFTER_TOOL) == SMALL
+
+    def test_rejected_small_response_escalates(self, make_router):
+        """Test rejected and failed small responses go to the large model"""
+        router = make_router(
+            accept=lambda r: r.output[0].content[0].text != "gpt-4o-mini",
+            min_success_rate=0,
+        )
+
+        result = router.send_request(AFTER_TOOL)
+        assert result.output[0].content[0].text == "gpt-4o"
+
+        router.small.send_request.side_effect = TimeoutError()
+        result = router.send_request(AFTER_TOOL)
+        assert result.output[0].content[0].text == "gpt-4o"
+
+        assert router.stats[SMALL].escalations == 2
+        assert router.stats[SMALL].errors == 1
+        assert router.small_success_rate == 0
+
+    def test_small_model_only_probed_when_failing(self, make_router):
+        """Test a small model below min_success_rate gets every n-th request"""
+        router = make_router(accept=lambda r: False, probe_every=3)
+
+        router.send_request(AFTER_TOOL)
+        routes = [router.choose_route(AFTER_TOOL) for _ in range(6)]
+
+        assert routes == [LARGE, LARGE, SMALL, LARGE, LARGE, SMALL]
+
+    def test_cost_and_savings(self, make_router):
+        """Test tokens and cost are recorded per route"""
+        router = make_router()
+
+        router.send_request(USER_TURN)
+        router.send_request(AFTER_TOOL)
+
+        small = router.stats[SMALL]
+        large = router.stats[LARGE]
+        assert small.tokens.input_tokens == 1000
+        assert small.tokens.output_tokens == 100
+        assert small.average_latency is not None
+        assert 0 < small.cost.total_cost < large.cost.total_cost
+        assert router.savings() == large.cost.total_cost - small.cost.total_cost
+
+    def test_no_savings_without_prices(self, mock_client):
+        """Test savings() is None when a model has no price"""
+        router = RoutingClient(
+            large=mock_client("gpt-4o", response("gpt-4o")),
+            small=mock_client("unpriced-model", response("unpriced-model")),
+            message_format=RESPONSES,
+        )
+
+        with pytest.warns(UnknownModelWarning, match="unpriced-model"):
+            router.send_request(AFTER_TOOL)
+            assert router.savings() is None
+
+        assert router.stats[SMALL].requests == 1
+
+
+class TestRoutingClientInRunner:
+    def test_loop_cost_priced_per_model(self, mock_client):
+        """Test each response of a loop is priced with the model that answered"""
+        large = mock_client("large-model", response("large-model"))
+        call = D(type="function_call", name="lookup", arguments="{}", call_id="c1")
+        large.send_request.return_value = D(
+            id="r1",
+            output=[call],
+            usage=D(input_tokens=1_000_000, output_tokens=0),
+        )
+        small = mock_client("small-model", response("small-model"))
+        small.send_request.return_value = response("Done", 1_000_000, 0)
+
+        pricing = PricingConfig()
+        pricing.register_model("large-model", input_price=10, output_price=0)
+        pricing.register_model("small-model", input_price=1, output_price=0)
+
+        def lookup():
+            return "found"
+
+        tools = Tools()
+        tools.add_tool(lookup)
+        router = RoutingClient(
+            large=large, small=small, message_format=RESPONSES, pricing_config=pricing
+        )
+        runner = OpenAIResponsesRunner(
+            tools=tools, llm_client=router, pricing_config=pricing
+        )
+
+        costs = [runner.loop("Find it").cost.total_cost for _ in range(2)]
+
+        assert costs == [11, 11]
+        result = runner.loop("Find it")
+        assert set(result.tokens_by_model) == {"large-model", "small-model"}
+        assert result.tokens.input_tokens == 2_000_000
+
+    def test_escalated_turn_priced_with_both_models(self, mock_client):
+        """Test an escalated answer is priced as the large model, and the
+        rejected small-model answer is counted under the small one"""
+        large = mock_client("large-model", response("large-model"))
+        call = D(type="function_call", name="lookup", arguments="{}", call_id="c1")
+        large.send_request.side_effect = [
+            D(id="r1", output=[call], usage=D(input_tokens=1_000_000, output_tokens=0)),
+            response("Done", 1_000_000, 0),
+        ]
+        small = mock_client("small-model", response("small-model"))
+        small.send_request.return_value = response("Not sure", 1_000_000, 0)
+
+        pricing = PricingConfig()
+        pricing.register_model("large-model", input_price=10, output_price=0)
+        pricing.register_model("small-model", input_price=1, output_price=0)
+
+        def lookup():
+            return "found"
+
+        tools = Tools()
+        tools.add_tool(lookup)
+        router = RoutingClient(
+            large=large,
+            small=small,
+            accept=lambda response: False,
+            message_format=RESPONSES,
+            pricing_config=pricing,
+        )
+        runner = OpenAIResponsesRunner(
+            tools=tools, llm_client=router, pricing_config=pricing
+        )
+
+        result = runner.loop("Find it")
+
+        assert result.last_message == "Done"
+        assert router.stats[SMALL].escalations == 1
+        assert result.tokens_by_model["large-model"].input_tokens == 2_000_000
+        assert result.tokens_by_model["small-model"].input_tokens == 1_000_000
+        assert result.cost.total_cost == 21
+
+
+class TestAsyncRoutingClient:
+    @pytest.mark.asyncio
+    async def test_routes_and_escalates(self, mock_client):
+        """Test the async client routes and escalates like the sync one"""
+        router = AsyncRoutingClient(
+            large=mock_client("gpt-4o", response("gpt-4o"), spec=AsyncLLMClient),
+            small=mock_client(
+                "gpt-4o-mini", response("gpt-4o-mini"), spec=AsyncLLMClient
+            ),
+            message_format=RESPONSES,
+        )
+
+        result = await router.send_request(AFTER_TOOL)
+        assert result.output[0].content[0].text == "gpt-4o-mini"
+
+        router.small.send_request.side_effect = TimeoutError()
+        result = await router.send_request(AFTER_TOOL)
+        assert result.output[0].content[0].text == "gpt-4o"
+        assert router.stats[SMALL].escalations == 1
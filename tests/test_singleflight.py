@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace as D
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from toyaikit.llm import AsyncLLMClient, LLMClient
+from toyaikit.singleflight import AsyncSingleFlightClient, SingleFlightClient
+
+
+def blocking_client(release: threading.Event, error=None):
+    """Sync client mock whose requests wait for release."""
+
+    def send_request(chat_messages, **kwargs):
+        release.wait(5)
+        if error is not None:
+            raise error
+        return D(messages=list(chat_messages))
+
+    client = Mock(spec=LLMClient)
+    client.model = "gpt-4o-mini"
+    client.send_request.side_effect = send_request
+    return client
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("condition not reached")
+
+
+class TestSingleFlightClient:
+    """Tests for sharing identical in-flight requests between threads"""
+
+    def test_identical_requests_share_one_call(self):
+        release = threading.Event()
+        inner = blocking_client(release)
+        client = SingleFlightClient(inner)
+
+        messages = [{"role": "user", "content": "FAQ"}]
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(client.send_request, messages) for _ in range(5)]
+            wait_for(lambda: client.collapsed == 4)
+            release.set()
+            responses = [future.result() for future in futures]
+
+        assert inner.send_request.call_count == 1
+        assert all(response is responses[0] for response in responses)
+        assert (client.calls, client.collapsed) == (1, 4)
+        assert client.in_flight == 0
+
+    def test_different_requests_not_shared(self):
+        release = threading.Event()
+        release.set()
+        inner = blocking_client(release)
+        client = SingleFlightClient(inner)
+
+        client.send_request([{"role": "user", "content": "a"}])
+        client.send_request([{"role": "user", "content": "b"}])
+        client.send_request([{"role": "user", "content": "a"}])
+
+        assert inner.send_request.call_count == 3
+        assert client.collapsed == 0
+
+    def test_error_shared(self):
+        release = threading.Event()
+        inner = blocking_client(release, error=RuntimeError("boom"))
+        client = SingleFlightClient(inner)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(client.send_request, ["same"]) for _ in range(2)]
+            wait_for(lambda: client.collapsed == 1)
+            release.set()
+
+            for future in futures:
+                with pytest.raises(RuntimeError):
+                    future.result()
+
+        assert inner.send_request.call_count == 1
+        assert client.in_flight == 0
+
+    def test_streams_not_shared(self):
+        inner = Mock(spec=LLMClient)
+        client = SingleFlightClient(inner)
+
+        client.send_request(["same"], stream=True)
+        client.send_request(["same"], stream=True)
+
+        assert inner.send_request.call_count == 2
+
+
+class TestAsyncSingleFlightClient:
+    """Tests for sharing identical in-flight requests between tasks"""
+
+    def make_client(self):
+        release = asyncio.Event()
+
+        async def send_request(chat_messages, **kwargs):
+            await release.wait()
+            return D(messages=list(chat_messages))
+
+        inner = AsyncMock(spec=AsyncLLMClient)
+        inner.model = "gpt-4o-mini"
+        inner.send_request.side_effect = send_request
+        return inner, release
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_call(self):
+        inner, release = self.make_client()
+        client = AsyncSingleFlightClient(inner)
+
+        tasks = [asyncio.ensure_future(client.send_request(["FAQ"])) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        responses = await asyncio.gather(*tasks)
+
+        assert inner.send_request.call_count == 1
+        assert all(response is responses[0] for response in responses)
+        assert client.collapsed == 2
+        assert client.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_the_others(self):
+        inner, release = self.make_client()
+        client = AsyncSingleFlightClient(inner)
+
+        first = asyncio.ensure_future(client.send_request(["FAQ"]))
+        second = asyncio.ensure_future(client.send_request(["FAQ"]))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        response = await second
+        assert response.messages == ["FAQ"]
+        assert first.cancelled()
@@ -0,0 +1,144 @@
+from types import SimpleNamespace as D
+from unittest.mock import Mock
+
+from toyaikit.chat.context import ContextPolicy
+from toyaikit.chat.conversation import Conversation
+from toyaikit.chat.runners import OpenAIResponsesRunner, RunnerCallback
+from toyaikit.llm import LLMClient
+from toyaikit.tokens import TokenEstimator, load_encoding
+from toyaikit.tools import Tools
+
+
+class WordEncoding:
+    """Encoding used in tests: one token per word, counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return text.split()
+
+
+def search(query: str) -> str:
+    """Search the documentation."""
+    return query
+
+
+class TestTokenEstimator:
+    def test_heuristic(self):
+        """Test the characters-per-token heuristic without an encoding"""
+        estimator = TokenEstimator(chars_per_token=4)
+
+        assert estimator.count_text("x" * 400) == 100
+
+    def test_claude_models_use_heuristic(self):
+        """Test Claude models have their own ratio and no tiktoken encoding"""
+        estimator = TokenEstimator(model="claude-sonnet-4-5")
+
+        assert load_encoding("claude-sonnet-4-5") is None
+        assert estimator.encoding is None
+        assert estimator.count_text("x" * 350) == 100
+
+    def test_encoding(self):
+        """Test text is counted with the encoding when there is one"""
+        estimator = TokenEstimator(encoding=WordEncoding())
+
+        assert estimator.count_text("one two three") == 3
+
+    def test_messages_memoized(self):
+        """Test each message is counted once"""
+        encoding = WordEncoding()
+        estimator = TokenEstimator(encoding=encoding)
+        messages = [
+            {"role": "user", "content": "What is RAG?"},
+            {"role": "assistant", "content": "Retrieval augmented generation"},
+        ]
+
+        first = estimator(messages)
+        messages.append({"role": "user", "content": "Thanks"})
+        second = estimator(messages)
+
+        assert second > first
+        assert encoding.calls == 3
+
+    def test_conversation_total_kept_in_state(self):
+        """Test a Conversation only counts the messages appended since"""
+        estimator = TokenEstimator(encoding=WordEncoding())
+        conversation = Conversation([{"role": "user", "content": "Hi there"}])
+
+        first = estimator(conversation)
+        conversation.append({"role": "assistant", "content": "Hello"})
+        estimator.count_message = Mock(wraps=estimator.count_message)
+
+        total = estimator(conversation)
+
+        assert estimator.count_message.call_count == 1
+        assert total == first + TokenEstimator(encoding=WordEncoding())(
+            conversation[1:]
+        )
+        assert estimator(conversation) == total
+
+    def test_tools_counted_once_per_version(self):
+        """Test tool schemas are counted once until tools are added"""
+        encoding = WordEncoding()
+        estimator = TokenEstimator(encoding=encoding)
+        tools = Tools()
+        tools.add_tool(search)
+
+        tokens = estimator.count_tools(tools)
+        assert estimator.count_tools(tools) == tokens
+        assert encoding.calls == 1
+
+        messages = [{"role": "user", "content": "Hi"}]
+        assert estimator.estimate_request(messages, tools) == (
+            estimator(messages) + tokens
+        )
+        assert estimator.count_tools(None) == 0
+
+
+class TestPreflightCheck:
+    def test_tools_count_into_context_budget(self):
+        """Test a ContextPolicy with a TokenEstimator leaves room for the tools"""
+        estimator = TokenEstimator(chars_per_token=1)
+        tools = Tools()
+        tools.add_tool(search)
+        messages = [{"role": "system", "content": "Be brief"}]
+        for i in range(3):
+            messages.append({"role": "user", "content": f"question {i}"})
+            messages.append({"role": "assistant", "content": f"answer {i}"})
+        budget = estimator(messages) + estimator.count_tools(tools) - 1
+        policy = ContextPolicy(max_tokens=budget, token_counter=estimator)
+
+        result, report = policy.apply(messages)
+        assert result is messages
+        assert report is None
+
+        result, report = policy.apply(messages, tools=tools)
+        assert report.dropped_messages == 2
+        assert estimator.estimate_request(result, tools) <= budget
+
+    def test_callback_gets_estimate_before_request(self):
+        """Test on_request gets the estimated tokens before each request"""
+        llm_client = Mock(spec=LLMClient)
+        llm_client.model = "gpt-4o-mini"
+        llm_client.send_request.return_value = D(
+            output=[D(type="message", content=[D(text="Answer")])],
+            usage=D(input_tokens=1, output_tokens=1),
+        )
+        estimator = TokenEstimator(chars_per_token=4)
+        tools = Tools()
+        tools.add_tool(search)
+        runner = OpenAIResponsesRunner(
+            tools=tools, llm_client=llm_client, token_estimator=estimator
+        )
+        callback = Mock(spec=RunnerCallback)
+        callback.on_request.side_effect = lambda tokens: (
+            llm_client.send_request.assert_not_called()
+        )
+
+        result = runner.loop("Hi", callback=callback)
+
+        callback.on_request.assert_called_once_with(
+            estimator.estimate_request(result.all_messages[:2], tools)
+        )
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from toyaikit.tool_outputs import (
+    READ_TOOL_OUTPUT,
+    DiskBlobStore,
+    MemoryBlobStore,
+    ToolOutputPolicy,
+)
+
+
+class TestBlobStores:
+    """Tests for the memory and disk stores of tool outputs"""
+
+    @pytest.fixture(params=["memory", "disk"])
+    def store(self, request, tmp_path):
+        if request.param == "memory":
+            return MemoryBlobStore()
+        return DiskBlobStore(str(tmp_path / "outputs"))
+
+    def test_put_and_get(self, store):
+        handle = store.put("a" * 100)
+        assert store.get(handle) == "a" * 100
+
+    def test_same_data_same_handle(self, store):
+        assert store.put("data") == store.put("data")
+        assert store.put("data") != store.put("other")
+
+    def test_unknown_handle(self, store):
+        with pytest.raises(KeyError):
+            store.get("0123456789abcdef")
+
+    def test_memory_store_evicts_least_recently_used(self):
+        store = MemoryBlobStore(max_total_chars=250)
+        first = store.put("a" * 100)
+        second = store.put("b" * 100)
+        store.get(first)
+
+        third = store.put("c" * 100)
+
+        assert len(store) == 2
+        assert store.get(first) == "a" * 100
+        assert store.get(third) == "c" * 100
+        with pytest.raises(KeyError):
+            store.get(second)
+
+    def test_memory_store_keeps_output_over_the_limit(self):
+        store = MemoryBlobStore(max_total_chars=10)
+        store.put("small")
+
+        handle = store.put("x" * 100)
+
+        assert len(store) == 1
+        assert store.get(handle) == "x" * 100
+
+    def test_disk_store_rejects_paths(self, tmp_path):
+        store = DiskBlobStore(str(tmp_path))
+        with pytest.raises(KeyError):
+            store.get("../secret")
+
+    def test_disk_store_survives_restart(self, tmp_path):
+        handle = DiskBlobStore(str(tmp_path)).put("persisted")
+        assert DiskBlobStore(str(tmp_path)).get(handle) == "persisted"
+
+
+class TestToolOutputPolicy:
+    """Tests for offloading large tool outputs"""
+
+    def test_small_output_unchanged(self):
+        policy = ToolOutputPolicy(max_chars=100, preview_chars=10)
+        assert policy.apply("short") == "short"
+
+    def test_large_output_replaced_by_reference(self):
+        policy = ToolOutputPolicy(max_chars=100, preview_chars=10)
+        output = "x" * 50 + "y" * 200
+
+        reference = json.loads(policy.apply(output))
+
+        assert reference["preview"] == "x" * 10
+        assert reference["total_length"] == 250
+        assert READ_TOOL_OUTPUT in reference["note"]
+        assert policy.store.get(reference["handle"]) == output
+
+    def test_read_tool_output_pages(self):
+        policy = ToolOutputPolicy(max_chars=100, preview_chars=10)
+        output = "".join(str(i % 10) for i in range(250))
+        handle = json.loads(policy.apply(output))["handle"]
+
+        page = policy.read_tool_output(handle, offset=0, length=100)
+        assert page["content"] == output[:100]
+        assert page["next_offset"] == 100
+
+        page = policy.read_tool_output(handle, offset=200, length=100)
+        assert page["content"] == output[200:]
+        assert page["next_offset"] is None
+
+    def test_read_length_limited_to_max_chars(self):
+        policy = ToolOutputPolicy(max_chars=100, preview_chars=10)
+        handle = json.loads(policy.apply("z" * 500))["handle"]
+
+        page = policy.read_tool_output(handle, offset=0, length=1000)
+        assert len(page["content"]) == 100
+
+    def test_read_tool_output_not_offloaded_again(self):
+        policy = ToolOutputPolicy(max_chars=100, preview_chars=10)
+        output = "p" * 300
+        assert policy.apply(output, READ_TOOL_OUTPUT) == output
+
+    def test_preview_larger_than_max_chars(self):
+        with pytest.raises(ValueError):
+            ToolOutputPolicy(max_chars=10, preview_chars=20)
@@ -1,6 +1,10 @@
+import asyncio
 import json
 import uuid
 
+import pytest
+
+from toyaikit.tool_outputs import ToolOutputPolicy
 from toyaikit.tools import (
     Tools,
     generate_function_schema,
@@ -337,3 +341,109 @@ def test_wrap_instance_methods():
     method_names = [method.__name__ for method in result]
     assert "method1" in method_names
     assert "method2" in method_names
+
+
+def test_function_call_with_async_function():
+    async def double(x: int) -> int:
+        await asyncio.sleep(0)
+        return x * 2
+
+    tools = Tools()
+    tools.add_tool(double)
+
+    resp = ToolCallResponse("double", json.dumps({"x": 21}))
+    result = tools.function_call(resp)
+    assert result["call_id"] == resp.call_id
+    assert json.loads(result["output"]) == 42
+
+
+@pytest.mark.asyncio
+async def test_afunction_call():
+    async def double(x: int) -> int:
+        return x * 2
+
+    def triple(x: int) -> int:
+        return x * 3
+
+    tools = Tools()
+    tools.add_tool(double)
+    tools.add_tool(triple)
+
+    result = await tools.afunction_call(
+        ToolCallResponse("double", json.dumps({"x": 2}))
+    )
+    assert json.loads(result["output"]) == 4
+
+    result = await tools.afunction_call(
+        ToolCallResponse("triple", json.dumps({"x": 2}))
+    )
+    assert json.loads(result["output"]) == 6
+
+    result = await tools.afunction_call(ToolCallResponse("missing", "{}"))
+    assert "KeyError" in json.loads(result["output"])["error"]
+
+
+def test_output_policy_offloads_large_outputs():
+    def search(query: str) -> list:
+        return [{"id": i, "text": query * 20} for i in range(50)]
+
+    tools = Tools(output_policy=ToolOutputPolicy(max_chars=500, preview_chars=100))
+    tools.add_tool(search)
+
+    names = [tool["name"] for tool in tools.get_tools()]
+    assert names == ["read_tool_output", "search"]
+
+    result = tools.function_call(ToolCallResponse("search", json.dumps({"query": "q"})))
+    reference = json.loads(result["output"])
+    assert reference["total_length"] > 500
+
+    read = ToolCallResponse(
+        "read_tool_output",
+        json.dumps({"handle": reference["handle"], "offset": 100, "length": 200}),
+    )
+    page = json.loads(tools.function_call(read)["output"])
+
+    full_output = json.dumps(search("q"), indent=2)
+    assert page["content"] == full_output[100:300]
+    assert page["next_offset"] == 300
+
+
+def test_version_and_converted_tools_cache():
+    tools = Tools()
+    assert tools.version == 0
+
+    tools.add_tool(add)
+    assert tools.version == 1
+    assert tools.get_tools() is tools.get_tools()
+
+    calls = []
+
+    def convert(tools_list):
+        calls.append(len(tools_list))
+        return [tool["name"] for tool in tools_list]
+
+    assert tools.get_converted_tools("names", convert) == ["add"]
+    assert tools.get_converted_tools("names", convert) == ["add"]
+    assert calls == [1]
+
+    tools.add_tool(multiply)
+    assert tools.version == 2
+    assert tools.get_converted_tools("names", convert) == ["add", "multiply"]
+    assert calls == [1, 2]
+
+
+def test_add_tools_bumps_version():
+    class Calculator:
+        def add(self, a: float, b: float) -> float:
+            return a + b
+
+        def subtract(self, a: float, b: float) -> float:
+            return a - b
+
+    tools = Tools()
+    names = tools.get_tools()
+    tools.add_tools(Calculator())
+
+    assert tools.version == 2
+    assert names == []
+    assert len(tools.get_tools()) == 2
@@ -1,4 +1,8 @@
-from toyaikit.utils import strip_matching_outer_html_tags
+from types import SimpleNamespace as D
+
+from pydantic import BaseModel
+
+from toyaikit.utils import get_field, strip_matching_outer_html_tags, to_jsonable
 
 
 class TestStripMatchingOuterHtmlTags:
@@ -121,3 +125,22 @@ class TestStripMatchingOuterHtmlTags:
         )
         expected = "<section><div><p>Deep content</p></div></section>"
         assert strip_matching_outer_html_tags(input_text) == expected
+
+
+class TestMessageHelpers:
+    def test_get_field(self):
+        """Test fields are read from dicts and objects alike"""
+        assert get_field({"role": "user"}, "role") == "user"
+        assert get_field(D(role="user"), "role") == "user"
+        assert get_field({}, "role", "assistant") == "assistant"
+        assert get_field(D(), "role") is None
+
+    def test_to_jsonable(self):
+        """Test models become their JSON data, other objects strings"""
+
+        class Message(BaseModel):
+            role: str
+            content: str | None = None
+
+        assert to_jsonable(Message(role="user")) == {"role": "user"}
+        assert to_jsonable(3.5j) == "3.5j"
@@ -0,0 +1,253 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Sequence
+
+from toyaikit.failover import NoBackendAvailableError
+from toyaikit.llm import AsyncLLMClient, LLMClient, report_model
+from toyaikit.ratelimit import parse_reset
+from toyaikit.tools import Tools
+
+LEAST_OUTSTANDING = "least_outstanding"
+ROUND_ROBIN = "round_robin"
+
+RATE_LIMIT_STATUS_CODES = {429}
+AUTH_STATUS_CODES = {401, 403}
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    return parse_reset(headers.get("retry-after"))
+
+
+@dataclass
+class BackendStats:
+    """Counters of a backend of a BalancingClient."""
+
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    in_flight: int = 0
+    total_latency: float = 0.0
+    # Out of rotation until this time (rate limited) or for good (auth)
+    disabled_until: float = None
+    auth_failed: bool = False
+
+    @property
+    def average_latency(self) -> float | None:
+        succeeded = self.requests - self.errors - self.in_flight
+        if succeeded <= 0:
+            return None
+        return self.total_latency / succeeded
+
+
+@dataclass(eq=False)
+class BalancedBackend:
+    client: LLMClient
+    weight: float = 1.0
+    stats: BackendStats = field(default_factory=BackendStats)
+    # Smooth weighted round-robin state
+    current_weight: float = 0.0
+
+
+class BalancingClient(LLMClient):
+    """
+    Spreads requests over equivalent clients, e.g. the same model behind
+    several API keys or regional endpoints, to use their combined
+    throughput.
+
+    With the least_outstanding strategy a request goes to the client with
+    the fewest requests in flight relative to its weight, with round_robin
+    the clients take turns in proportion to their weights.
+
+    A client that gets a rate limit error (429) is taken out of rotation
+    until its retry-after, or rate_limit_cooldown seconds; one with an
+    authentication error (401, 403) until enable() is called. The request
+    is then sent to another client. Other errors are raised. If no client
+    is in rotation NoBackendAvailableError is raised.
+
+    Per-client counters are in stats.
+
+    Usage:
+        llm_client = BalancingClient(
+            [
+                OpenAIClient(client=OpenAI(api_key=key_1)),
+                OpenAIClient(client=OpenAI(api_key=key_2)),
+                OpenAIClient(client=OpenAI(api_key=key_3, base_url=eu_url)),
+            ],
+            weights=[1, 1, 2],
+        )
+
+    Args:
+        clients: Clients of the same API and model
+        weights: Relative capacity of the clients, 1 for all if not given
+        strategy: "least_outstanding" or "round_robin"
+        rate_limit_cooldown: Seconds a rate-limited client is out of
+            rotation when the error has no retry-after
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[LLMClient],
+        weights: Sequence[float] = None,
+        strategy: str = LEAST_OUTSTANDING,
+        rate_limit_cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not clients:
+            raise ValueError("BalancingClient needs at least one client")
+        if strategy not in (LEAST_OUTSTANDING, ROUND_ROBIN):
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+        if weights is None:
+            weights = [1.0] * len(clients)
+        if len(weights) != len(clients) or any(w <= 0 for w in weights):
+            raise ValueError("weights must be positive, one per client")
+
+        self.backends = [
+            BalancedBackend(client, weight) for client, weight in zip(clients, weights)
+        ]
+        self.strategy = strategy
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.clock = clock
+
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.backends[0].client.model
+
+    @property
+    def stats(self) -> List[BackendStats]:
+        return [backend.stats for backend in self.backends]
+
+    def enable(self, index: int):
+        """Put the client at index back into rotation."""
+        with self._lock:
+            stats = self.backends[index].stats
+            stats.disabled_until = None
+            stats.auth_failed = False
+
+    def _in_rotation(self, backend: BalancedBackend, now: float) -> bool:
+        stats = backend.stats
+        if stats.auth_failed:
+            return False
+        return stats.disabled_until is None or stats.disabled_until <= now
+
+    def _acquire(self, tried: list) -> BalancedBackend | None:
+        with self._lock:
+            now = self.clock()
+            available = [
+                backend
+                for backend in self.backends
+                if backend not in tried and self._in_rotation(backend, now)
+            ]
+            if not available:
+                return None
+
+            if self.strategy == ROUND_ROBIN:
+                total = sum(backend.weight for backend in available)
+                for backend in available:
+                    backend.current_weight += backend.weight
+                chosen = max(available, key=lambda b: b.current_weight)
+                chosen.current_weight -= total
+            else:
+                chosen = min(
+                    available,
+                    key=lambda b: (
+                        b.stats.in_flight / b.weight,
+                        b.stats.requests / b.weight,
+                    ),
+                )
+
+            chosen.stats.requests += 1
+            chosen.stats.in_flight += 1
+            return chosen
+
+    def _release(self, backend: BalancedBackend, started_at: float, error=None):
+        """Record the outcome of a request, True if it should be sent to
+        another client."""
+        with self._lock:
+            stats = backend.stats
+            stats.in_flight -= 1
+
+            if error is None:
+                stats.total_latency += time.monotonic() - started_at
+                return False
+
+            stats.errors += 1
+            status_code = getattr(error, "status_code", None)
+
+            if status_code in RATE_LIMIT_STATUS_CODES:
+                stats.rate_limited += 1
+                cooldown = _retry_after(error)
+                if cooldown is None:
+                    cooldown = self.rate_limit_cooldown
+                stats.disabled_until = self.clock() + cooldown
+                return True
+
+            if status_code in AUTH_STATUS_CODES:
+                stats.auth_failed = True
+                return True
+
+            return False
+
+    def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        tried = []
+        error = None
+
+        while (backend := self._acquire(tried)) is not None:
+            tried.append(backend)
+            started_at = time.monotonic()
+            try:
+                response = backend.client.send_request(
+                    chat_messages=chat_messages, tools=tools, **kwargs
+                )
+            except BaseException as e:
+                if not self._release(backend, started_at, e):
+                    raise
+                error = e
+                continue
+
+            self._release(backend, started_at)
+            report_model(getattr(backend.client, "model", None))
+            return response
+
+        if error is not None:
+            raise error
+        raise NoBackendAvailableError("No client of the BalancingClient is in rotation")
+
+
+class AsyncBalancingClient(BalancingClient, AsyncLLMClient):
+    """BalancingClient for AsyncLLMClients."""
+
+    async def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        tried = []
+        error = None
+
+        while (backend := self._acquire(tried)) is not None:
+            tried.append(backend)
+            started_at = time.monotonic()
+            try:
+                response = await backend.client.send_request(
+                    chat_messages=chat_messages, tools=tools, **kwargs
+                )
+            except BaseException as e:
+                if not self._release(backend, started_at, e):
+                    raise
+                error = e
+                continue
+
+            self._release(backend, started_at)
+            report_model(getattr(backend.client, "model", None))
+            return response
+
+        if error is not None:
+            raise error
+        raise NoBackendAvailableError("No client of the BalancingClient is in rotation")
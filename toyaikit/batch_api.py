@@ -0,0 +1,442 @@
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Iterable
+
+from toyaikit.chat.messages import ANTHROPIC, CHAT_COMPLETIONS, RESPONSES
+from toyaikit.chat.runners import BaseToolUsingRunner, BatchItem, BatchResult
+from toyaikit.deadlines import MAX_ITERATIONS
+from toyaikit.pricing import CostInfo, UsageByModel
+from toyaikit.raw import parse_raw_json
+from toyaikit.utils import to_jsonable
+
+# Endpoint of the requests of a runner, by its message format
+ENDPOINTS = {
+    RESPONSES: "/v1/responses",
+    CHAT_COMPLETIONS: "/v1/chat/completions",
+    ANTHROPIC: "/v1/messages",
+}
+
+# Batch APIs bill half of the regular price
+BATCH_PRICE_FACTOR = 0.5
+
+
+class BatchError(Exception):
+    """A whole batch failed, e.g. because its input was rejected."""
+
+
+class BatchRequestError(Exception):
+    """One request of a batch failed."""
+
+    def __init__(self, custom_id: str, message: str, status_code: int = None):
+        super().__init__(message)
+        self.custom_id = custom_id
+        self.status_code = status_code
+
+
+@dataclass
+class BatchRequest:
+    """One request of a batch: the arguments a client would send to url."""
+
+    custom_id: str
+    url: str
+    body: dict
+
+
+def _parse_output_line(line: str):
+    """(custom_id, response or BatchRequestError) from a line of an OpenAI
+    batch output or error file."""
+    entry = parse_raw_json(line)
+    custom_id = entry.custom_id
+    response = entry.get("response")
+    error = entry.get("error")
+
+    if error is not None:
+        return custom_id, BatchRequestError(custom_id, error.get("message", ""))
+
+    status_code = response.status_code
+    if status_code != 200:
+        body_error = response.body.get("error") or {}
+        message = body_error.get("message", f"status {status_code}")
+        return custom_id, BatchRequestError(custom_id, message, status_code)
+
+    return custom_id, response.body
+
+
+def _parse_output(text: str) -> dict:
+    return dict(_parse_output_line(line) for line in text.splitlines() if line)
+
+
+class BatchBackend:
+    """Where BatchExecutor submits its batches.
+
+    Results are RawObjects (see toyaikit.raw), or a BatchRequestError for
+    a request that failed.
+    """
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        """Submit the requests as one batch, return its id."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def is_done(self, batch_id: str) -> bool:
+        """True once the batch has finished, raises BatchError if it failed."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def results(self, batch_id: str) -> dict:
+        """Results of a finished batch by custom_id."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    The OpenAI Batch API: the requests are uploaded as a JSONL file and
+    processed within the completion window.
+
+    Args:
+        client: An OpenAI client
+        completion_window: Time the batch may take
+    """
+
+    def __init__(self, client=None, completion_window: str = "24h"):
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI()
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": request.custom_id,
+                    "method": "POST",
+                    "url": request.url,
+                    "body": request.body,
+                }
+            )
+            for request in requests
+        ]
+        input_file = self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=requests[0].url,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status == "failed":
+            raise BatchError(f"Batch {batch_id} failed: {batch.errors}")
+        # Expired and cancelled batches have the results completed until then
+        return batch.status in ("completed", "expired", "cancelled")
+
+    def results(self, batch_id: str) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is not None:
+                results.update(_parse_output(self.client.files.content(file_id).text))
+        return results
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """
+    Anthropic's Message Batches API.
+
+    Args:
+        client: An Anthropic client
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            try:
+                from anthropic import Anthropic
+            except ImportError:
+                raise ImportError(
+                    "Please run 'pip install anthropic' to use AnthropicBatchBackend"
+                )
+
+            client = Anthropic()
+        self.client = client
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[
+                {"custom_id": request.custom_id, "params": request.body}
+                for request in requests
+            ]
+        )
+        return batch.id
+
+    def is_done(self, batch_id: str) -> bool:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    def results(self, batch_id: str) -> dict:
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                results[entry.custom_id] = parse_raw_json(
+                    result.message.model_dump_json()
+                )
+            elif result.type == "errored":
+                results[entry.custom_id] = BatchRequestError(
+                    entry.custom_id, result.error.error.message
+                )
+            else:
+                results[entry.custom_id] = BatchRequestError(
+                    entry.custom_id, f"Request {result.type}"
+                )
+        return results
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    A local stand-in for a batch API, for tests and development.
+
+    Batches are JSONL files in directory, in the format of the OpenAI Batch
+    API. A batch is processed when it has been polled polls_until_done
+    times: respond(request) is called for each request and returns the
+    response body; an exception becomes an error of that request.
+
+    Args:
+        directory: Where the batch files are written
+        respond: Function from a BatchRequest to a response body (a dict)
+        polls_until_done: Number of is_done() calls before a batch finishes
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        respond: Callable[[BatchRequest], dict],
+        polls_until_done: int = 1,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.respond = respond
+        self.polls_until_done = polls_until_done
+
+    def _path(self, batch_id: str, kind: str) -> Path:
+        return self.directory / f"{batch_id}.{kind}"
+
+    def _read_status(self, batch_id: str) -> dict:
+        return json.loads(self._path(batch_id, "status.json").read_text())
+
+    def _write_status(self, batch_id: str, status: dict):
+        self._path(batch_id, "status.json").write_text(json.dumps(status))
+
+    def submit(self, requests: list[BatchRequest]) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": request.custom_id,
+                    "method": "POST",
+                    "url": request.url,
+                    "body": request.body,
+                }
+            )
+            for request in requests
+        ]
+        self._path(batch_id, "input.jsonl").write_text("\n".join(lines))
+        self._write_status(batch_id, {"status": "in_progress", "polls": 0})
+        return batch_id
+
+    def is_done(self, batch_id: str) -> bool:
+        status = self._read_status(batch_id)
+        if status["status"] == "completed":
+            return True
+
+        status["polls"] += 1
+        if status["polls"] >= self.polls_until_done:
+            self._process(batch_id)
+            status["status"] = "completed"
+        self._write_status(batch_id, status)
+        return status["status"] == "completed"
+
+    def _process(self, batch_id: str):
+        output = []
+        input_text = self._path(batch_id, "input.jsonl").read_text()
+
+        for line in input_text.splitlines():
+            entry = json.loads(line)
+            request = BatchRequest(entry["custom_id"], entry["url"], entry["body"])
+            result = {"custom_id": request.custom_id, "response": None, "error": None}
+            try:
+                body = self.respond(request)
+            except Exception as e:
+                result["error"] = {
+                    "code": type(e).__name__,
+                    "message": f"{type(e).__name__}: {e}",
+                }
+            else:
+                result["response"] = {"status_code": 200, "body": body}
+            output.append(json.dumps(result, default=to_jsonable))
+
+        self._path(batch_id, "output.jsonl").write_text("\n".join(output))
+
+    def results(self, batch_id: str) -> dict:
+        return _parse_output(self._path(batch_id, "output.jsonl").read_text())
+
+
+def _discounted(cost: CostInfo | None, factor: Decimal) -> CostInfo | None:
+    if cost is None:
+        return None
+    return CostInfo.create(cost.input_cost * factor, cost.output_cost * factor)
+
+
+class BatchExecutor:
+    """
+    Runs independent tool-call loops through a provider's batch API, for
+    large offline jobs that don't need the answers right away.
+
+    Each prompt starts a loop of the runner. The first request of every
+    loop is submitted as one batch; when it's done, the tool calls in the
+    responses are executed locally and the loops that continue are
+    submitted as the next batch, until all loops have their answer or
+    max_iterations batches were sent.
+
+    The request bodies are built by the runner's llm_client, so it must be
+    one of the clients of toyaikit.llm (not a wrapper). Structured output
+    and context policies that summarize aren't supported.
+
+    Usage:
+        executor = BatchExecutor(runner, OpenAIBatchBackend())
+        batch = executor.run(prompts)
+
+    Args:
+        runner: The runner whose loops are executed
+        backend: Where the batches are submitted
+        poll_interval: Seconds between checks whether a batch is done
+        max_iterations: Most batches per loop
+        price_factor: Share of the regular price batches are billed at
+        sleep: Function to wait between polls
+    """
+
+    def __init__(
+        self,
+        runner: BaseToolUsingRunner,
+        backend: BatchBackend,
+        poll_interval: float = 60,
+        max_iterations: int = 10,
+        price_factor: float = BATCH_PRICE_FACTOR,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if not hasattr(runner.llm_client, "build_request_args"):
+            raise ValueError("The runner's llm_client can't build batch requests")
+
+        self.runner = runner
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.max_iterations = max_iterations
+        self.price_factor = Decimal(str(price_factor))
+        self.sleep = sleep
+        self.url = ENDPOINTS[runner.message_format]
+        self.batch_ids = []
+
+    def _build_request(self, custom_id: str, chat_messages) -> BatchRequest:
+        request_messages, request_kwargs, _ = self.runner._prepare_request(
+            chat_messages
+        )
+        args = self.runner.llm_client.build_request_args(
+            request_messages, self.runner.tools, **request_kwargs
+        )
+        # Not part of the request body
+        args.pop("timeout", None)
+        body = json.loads(json.dumps(args, default=to_jsonable))
+        return BatchRequest(custom_id=custom_id, url=self.url, body=body)
+
+    def _wait(self, batch_id: str):
+        while not self.backend.is_done(batch_id):
+            self.sleep(self.poll_interval)
+
+    def _finish(self, item: BatchItem, loop: dict, response, stop_reason=None):
+        item.result = self.runner._build_loop_result(
+            response=response,
+            chat_messages=loop["chat_messages"],
+            prev_messages_len=loop["prev_messages_len"],
+            tokens=loop["tokens"],
+            stop_reason=stop_reason,
+        )
+        item.result.cost = _discounted(item.result.cost, self.price_factor)
+
+    def run(self, prompts: Iterable[str]) -> BatchResult:
+        """Run one loop per prompt. Failed requests are captured in the
+        item's error, like with loop_many()."""
+        items = []
+        loops = {}
+
+        for index, prompt in enumerate(prompts):
+            item = BatchItem(index=index, prompt=prompt)
+            items.append(item)
+            chat_messages, prev_messages_len = self.runner._start_loop(prompt)
+            loops[f"item-{index}"] = {
+                "item": item,
+                "chat_messages": chat_messages,
+                "prev_messages_len": prev_messages_len,
+                "tokens": UsageByModel(),
+                "response": None,
+            }
+
+        pending = dict(loops)
+
+        for _ in range(self.max_iterations):
+            if not pending:
+                break
+
+            batch_id = self.backend.submit(
+                [
+                    self._build_request(custom_id, loop["chat_messages"])
+                    for custom_id, loop in pending.items()
+                ]
+            )
+            self.batch_ids.append(batch_id)
+            self._wait(batch_id)
+            results = self.backend.results(batch_id)
+
+            for custom_id, loop in list(pending.items()):
+                item = loop["item"]
+                response = results.get(custom_id)
+
+                if response is None:
+                    response = BatchRequestError(custom_id, "No result in the batch")
+                if isinstance(response, BatchRequestError):
+                    item.error = response
+                    del pending[custom_id]
+                    continue
+
+                loop["response"] = response
+                loop["tokens"].add(self.runner._get_token_usage(response))
+                chat_messages = loop["chat_messages"]
+
+                try:
+                    function_calls = self.runner._process_response(
+                        response, chat_messages
+                    )
+                    if function_calls:
+                        self.runner._execute_function_calls(
+                            function_calls, chat_messages, None
+                        )
+                    else:
+                        self._finish(item, loop, response)
+                except Exception as e:
+                    item.error = e
+                    function_calls = None
+
+                if not function_calls:
+                    del pending[custom_id]
+
+        for loop in pending.values():
+            self._finish(loop["item"], loop, loop["response"], MAX_ITERATIONS)
+
+        batch = self.runner._build_batch_result(items, ordered=True)
+        batch.cost = _discounted(batch.cost, self.price_factor)
+        return batch
@@ -0,0 +1,282 @@
+import hashlib
+import importlib
+import json
+import sqlite3
+import threading
+import time
+from typing import List
+
+from pydantic import BaseModel
+
+from toyaikit.llm import AsyncLLMClient, LLMClient
+from toyaikit.raw import RawObject
+from toyaikit.tools import Tools, convert_tools
+from toyaikit.utils import to_jsonable
+
+
+def canonical_json(value) -> str:
+    """JSON with sorted keys and no whitespace, the same for equal requests."""
+    return json.dumps(
+        value,
+        default=to_jsonable,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def request_key(
+    client: LLMClient,
+    chat_messages: List,
+    tools: Tools = None,
+    output_format: type[BaseModel] = None,
+    **request_kwargs,
+) -> str:
+    """
+    Hash of everything that determines the response of a request: the
+    client type, model, messages, tool schemas, output format, the
+    client's extra_kwargs and other send_request arguments (e.g.
+    previous_response_id).
+    """
+    request = {
+        "client": type(client).__name__,
+        "model": getattr(client, "model", None),
+        "messages": list(chat_messages),
+        # serialized once per version of the tools
+        "tools": (
+            convert_tools(tools, "canonical_json", canonical_json)
+            if tools is not None
+            else None
+        ),
+        "output_format": (
+            output_format.model_json_schema() if output_format is not None else None
+        ),
+        "extra_kwargs": getattr(client, "extra_kwargs", None),
+    }
+    if request_kwargs:
+        request["request_kwargs"] = request_kwargs
+    return hashlib.sha256(canonical_json(request).encode("utf-8")).hexdigest()
+
+
+def _type_path(cls: type) -> str:
+    # ParsedResponse[Answer] is stored as ParsedResponse and parametrized
+    # again with the output format when it's loaded
+    metadata = getattr(cls, "__pydantic_generic_metadata__", None)
+    if metadata and metadata.get("origin") is not None:
+        cls = metadata["origin"]
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _load_type(path: str, output_format: type[BaseModel] = None) -> type[BaseModel]:
+    module_name, qualname = path.split(":")
+    cls = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        cls = getattr(cls, name)
+
+    parameters = getattr(cls, "__pydantic_generic_metadata__", {}).get("parameters")
+    if parameters and output_format is not None:
+        cls = cls[output_format]
+    return cls
+
+
+class ResponseCache:
+    """
+    Responses stored in a local SQLite file.
+
+    Entries older than ttl seconds are not returned. When the stored
+    responses take more than max_size_bytes, the least recently used
+    entries are evicted. hits and misses count the lookups.
+
+    Args:
+        path: SQLite file, ":memory:" for an in-memory cache
+        ttl: Seconds an entry stays valid, None for no expiration
+        max_size_bytes: Size limit of the stored responses, None for no limit
+    """
+
+    def __init__(
+        self,
+        path: str = ".toyaikit_cache.sqlite",
+        ttl: float = None,
+        max_size_bytes: int = None,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get(self, key: str, output_format: type[BaseModel] = None):
+        """Return the cached response for key, or None."""
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT type, data, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is not None and self.ttl is not None and row[2] + self.ttl < now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            self.hits += 1
+
+        type_path, data, _ = row
+        cls = _load_type(type_path, output_format)
+        return cls.model_validate_json(data)
+
+    def put(self, key: str, response: BaseModel):
+        """Store a response under key."""
+        data = response.model_dump_json()
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, _type_path(type(response)), data, len(data), now, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        if self.max_size_bytes is None:
+            return
+
+        (total,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+        if total <= self.max_size_bytes:
+            return
+
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+
+        for key, size in rows:
+            if total <= self.max_size_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM responses"
+            ).fetchone()
+        return count
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedClient(LLMClient):
+    """
+    Wraps an LLMClient and returns cached responses for repeated requests.
+
+    Responses are cached by request_key(): the same model, messages,
+    tools, output format and extra_kwargs give the cached response, of
+    the same type the client returns (Response, ChatCompletion, Message,
+    a RawObject with raw_responses=True, ...), so the runners consume it
+    unchanged. Streamed requests are not
+    cached.
+
+    Usage:
+        cache = ResponseCache("evals.sqlite", ttl=7 * 24 * 3600)
+        llm_client = CachedClient(OpenAIClient(), cache)
+    """
+
+    def __init__(self, client: LLMClient, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    def _lookup(self, chat_messages, tools, output_format, kwargs):
+        if kwargs.get("stream"):
+            return None, None
+
+        key = request_key(self.client, chat_messages, tools, output_format, **kwargs)
+        return key, self.cache.get(key, output_format)
+
+    def _store(self, key, response):
+        if key is not None and isinstance(response, (BaseModel, RawObject)):
+            self.cache.put(key, response)
+
+    def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        **kwargs,
+    ):
+        key, cached = self._lookup(chat_messages, tools, output_format, kwargs)
+        if cached is not None:
+            return cached
+
+        response = self.client.send_request(
+            chat_messages=chat_messages,
+            tools=tools,
+            output_format=output_format,
+            **kwargs,
+        )
+        self._store(key, response)
+        return response
+
+
+class AsyncCachedClient(CachedClient, AsyncLLMClient):
+    """CachedClient for an AsyncLLMClient."""
+
+    async def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        **kwargs,
+    ):
+        key, cached = self._lookup(chat_messages, tools, output_format, kwargs)
+        if cached is not None:
+            return cached
+
+        response = await self.client.send_request(
+            chat_messages=chat_messages,
+            tools=tools,
+            output_format=output_format,
+            **kwargs,
+        )
+        self._store(key, response)
+        return response
@@ -1,6 +1,6 @@
 from toyaikit.chat.chat import ChatAssistant
 from toyaikit.chat.interface import IPythonChatInterface
-from toyaikit.chat.runners import LoopResult
+from toyaikit.chat.runners import BatchResult, LoopResult
 from toyaikit.llm import OpenAIClient
 from toyaikit.pricing import CostInfo, TokenUsage
 
@@ -9,6 +9,7 @@ __all__ = [
     "OpenAIClient",
     "IPythonChatInterface",
     "LoopResult",
+    "BatchResult",
     "TokenUsage",
     "CostInfo",
 ]
@@ -0,0 +1,361 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from pydantic import BaseModel
+
+from toyaikit.utils import get_field, to_jsonable
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+# Key of the rolling summaries in the state of a Conversation
+CONTEXT_SUMMARIES_STATE = "context_summaries"
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below so it can replace it in the context of "
+    "an assistant. Keep facts, decisions, open questions and results of tool "
+    "calls that may be needed later. Be concise."
+)
+
+
+@dataclass
+class TrimReport:
+    """What a ContextPolicy removed from the messages of a request."""
+
+    tokens_before: int
+    tokens_after: int
+    dropped_messages: int = 0
+    collapsed_tool_outputs: int = 0
+    summarized_messages: int = 0
+
+
+def estimate_tokens(messages: Sequence) -> int:
+    """Rough token count of messages: about four characters per token."""
+    text = json.dumps(list(messages), default=to_jsonable)
+    return len(text) // 4
+
+
+def get_role(message) -> str:
+    """
+    Role of a message in any of the runners' formats: "system", "user",
+    "assistant" or "tool" (function call outputs).
+    """
+    role = get_field(message, "role")
+    message_type = get_field(message, "type")
+
+    if message_type == "function_call_output" or role == "tool":
+        return "tool"
+
+    if role in ("system", "developer"):
+        return "system"
+
+    if role == "user":
+        content = get_field(message, "content")
+        # Anthropic-style tool results sent as a user message
+        if isinstance(content, list) and any(
+            get_field(block, "type") == "tool_result" for block in content
+        ):
+            return "tool"
+        return "user"
+
+    # Responses API output items (message, function_call, reasoning)
+    return "assistant"
+
+
+def get_text(message) -> str:
+    """Text of a message, used to render transcripts for summaries."""
+    if get_field(message, "type") == "function_call_output":
+        return str(get_field(message, "output", ""))
+
+    if get_field(message, "type") == "function_call":
+        name = get_field(message, "name")
+        return f"{name}({get_field(message, 'arguments')})"
+
+    content = get_field(message, "content")
+    if content is None:
+        content = get_field(message, "summary")
+
+    if isinstance(content, str):
+        text = content
+    elif content is None:
+        text = ""
+    else:
+        parts = []
+        for block in content:
+            if isinstance(block, str):
+                parts.append(block)
+                continue
+            block_text = get_field(block, "text")
+            if block_text is None and get_field(block, "type") == "tool_use":
+                block_text = f"{get_field(block, 'name')}({get_field(block, 'input')})"
+            if block_text is None:
+                block_text = get_field(block, "content")
+            if block_text is not None:
+                parts.append(str(block_text))
+        text = "\n".join(parts)
+
+    tool_calls = get_field(message, "tool_calls")
+    for call in tool_calls or []:
+        function = get_field(call, "function")
+        name = get_field(function, "name")
+        text += f"\n{name}({get_field(function, 'arguments')})"
+
+    return text.strip()
+
+
+def render_transcript(messages: Sequence) -> str:
+    """Render messages as a plain-text transcript, one "role: text" per message."""
+    lines = []
+    for message in messages:
+        text = get_text(message)
+        if text:
+            lines.append(f"{get_role(message)}: {text}")
+    return "\n\n".join(lines)
+
+
+def collapse_tool_output(message, placeholder: str):
+    """Return a copy of a function call output message with its output replaced."""
+    field = (
+        "output" if get_field(message, "type") == "function_call_output" else "content"
+    )
+
+    if isinstance(message, BaseModel):
+        return message.model_copy(update={field: placeholder})
+
+    collapsed = dict(message)
+
+    if isinstance(collapsed.get(field), list):
+        # Anthropic-style tool_result blocks
+        collapsed[field] = [
+            dict(block, content=placeholder)
+            if get_field(block, "type") == "tool_result"
+            else block
+            for block in collapsed[field]
+        ]
+    else:
+        collapsed[field] = placeholder
+
+    return collapsed
+
+
+def split_turns(messages: Sequence) -> tuple[list, list[list]]:
+    """
+    Split messages into the leading system messages and turns. A turn
+    starts with a user message and holds everything up to the next one:
+    the answers, function calls and their outputs, so dropping whole turns
+    never separates a function call from its output.
+    """
+    system = []
+    turns = []
+
+    for message in messages:
+        role = get_role(message)
+
+        if role == "system" and not turns:
+            system.append(message)
+        elif role == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+
+    return system, turns
+
+
+class LLMSummarizer:
+    """
+    Summarizes dropped messages with a runner, typically one with a cheap
+    model and no tools.
+
+    Usage:
+        summarizer = LLMSummarizer(
+            OpenAIResponsesRunner(
+                llm_client=OpenAIClient(model="gpt-4o-mini"),
+                developer_prompt=SUMMARY_INSTRUCTIONS,
+            )
+        )
+    """
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    def __call__(self, messages: Sequence, previous_summary: str = None) -> str:
+        prompt = render_transcript(messages)
+        if previous_summary:
+            prompt = f"{SUMMARY_PREFIX}\n{previous_summary}\n\n{prompt}"
+
+        result = self.runner.loop(prompt=prompt)
+        return result.last_message
+
+
+class ContextPolicy:
+    """
+    Decides which messages of the history are sent with a request.
+
+    The runners apply the policy before every request. The history itself
+    is never changed: the policy returns a trimmed copy for the request,
+    and the LoopResult reports what was removed in `trimmed`.
+
+    The system messages and the current turn are always kept. Of the
+    older turns:
+
+    - only the last keep_turns are kept (if set);
+    - while the request is over the token budget, the outputs of old
+      function calls are replaced by a short placeholder, oldest first;
+    - if it's still over the budget, the oldest turns are dropped.
+
+    Dropped turns are replaced by a summary if a summarizer is given, a
+    callable taking the dropped messages and the previous summary (see
+    LLMSummarizer). Summaries are rolled forward: when more turns are
+    dropped later, only the new ones are summarized, together with the
+    previous summary. The summary is kept in the state of the Conversation,
+    so one policy can be shared by any number of conversations; plain
+    lists of messages are summarized from scratch every time.
+
+    Args:
+        max_tokens: Token budget of a request, None for no budget
+        model_budgets: Budgets of specific models, overriding max_tokens
+        keep_turns: Number of turns to keep at most, None for all
+        collapse_tool_outputs: Replace old function call outputs before
+            dropping turns
+        summarizer: Callable summarizing the dropped messages
+        token_counter: Callable estimating the tokens of a list of messages.
+            If it has count_tools (see toyaikit.tokens.TokenEstimator),
+            the tools of the request are counted into the budget too
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = None,
+        model_budgets: dict[str, int] = None,
+        keep_turns: int = None,
+        collapse_tool_outputs: bool = True,
+        summarizer: Callable[[Sequence, str], str] = None,
+        token_counter: Callable[[Sequence], int] = estimate_tokens,
+    ):
+        self.max_tokens = max_tokens
+        self.model_budgets = model_budgets or {}
+        self.keep_turns = keep_turns
+        self.collapse_tool_outputs = collapse_tool_outputs
+        self.summarizer = summarizer
+        self.token_counter = token_counter
+
+    def get_budget(self, model: str = None) -> int | None:
+        """Token budget for a model."""
+        return self.model_budgets.get(model, self.max_tokens)
+
+    def apply(
+        self,
+        messages: Sequence,
+        model: str = None,
+        user_message: Callable[[str], Any] = None,
+        tools=None,
+    ) -> tuple[Sequence, TrimReport | None]:
+        """
+        Return the messages to send and a TrimReport, or the messages as
+        they are and None if nothing had to be removed.
+
+        user_message wraps the summary into a message of the runner's
+        format, it's required when a summarizer is set.
+        """
+        budget = self.get_budget(model)
+        if budget is None and self.keep_turns is None:
+            return messages, None
+
+        count_tools = getattr(self.token_counter, "count_tools", None)
+        if budget is not None and count_tools is not None:
+            budget -= count_tools(tools)
+
+        system, turns = split_turns(messages)
+        old_turns = [list(turn) for turn in turns[:-1]]
+        current_turn = turns[-1:]
+
+        dropped = []
+        collapsed = 0
+
+        if self.keep_turns is not None:
+            cut = min(max(len(turns) - self.keep_turns, 0), len(old_turns))
+            for turn in old_turns[:cut]:
+                dropped.extend(turn)
+            old_turns = old_turns[cut:]
+
+        tokens_before = self.token_counter(messages)
+
+        if budget is not None:
+            fixed_tokens = self.token_counter(system) + sum(
+                self.token_counter(turn) for turn in current_turn
+            )
+            turn_tokens = [self.token_counter(turn) for turn in old_turns]
+            # Dropped turns are summarized as they were, not collapsed
+            originals = [list(turn) for turn in old_turns]
+            turn_collapsed = [0] * len(old_turns)
+
+            if self.collapse_tool_outputs:
+                for i, turn in enumerate(old_turns):
+                    if fixed_tokens + sum(turn_tokens) <= budget:
+                        break
+                    for j, message in enumerate(turn):
+                        if get_role(message) == "tool":
+                            turn[j] = collapse_tool_output(
+                                message, _collapsed_placeholder(message)
+                            )
+                            turn_collapsed[i] += 1
+                    turn_tokens[i] = self.token_counter(turn)
+
+            while old_turns and fixed_tokens + sum(turn_tokens) > budget:
+                old_turns.pop(0)
+                dropped.extend(originals.pop(0))
+                turn_tokens.pop(0)
+                turn_collapsed.pop(0)
+
+            collapsed = sum(turn_collapsed)
+
+        if not dropped and not collapsed:
+            return messages, None
+
+        trimmed_messages = list(system)
+
+        summarized = 0
+        if dropped and self.summarizer is not None:
+            summary = self._summarize(dropped, getattr(messages, "state", None))
+            trimmed_messages.append(user_message(f"{SUMMARY_PREFIX}\n{summary}"))
+            summarized = len(dropped)
+
+        for turn in old_turns + current_turn:
+            trimmed_messages.extend(turn)
+
+        report = TrimReport(
+            tokens_before=tokens_before,
+            tokens_after=self.token_counter(trimmed_messages),
+            dropped_messages=len(dropped) - summarized,
+            collapsed_tool_outputs=collapsed,
+            summarized_messages=summarized,
+        )
+        return trimmed_messages, report
+
+    def _summarize(self, dropped: list, state: dict = None) -> str:
+        summaries = {}
+        if isinstance(state, dict):
+            summaries = state.setdefault(CONTEXT_SUMMARIES_STATE, {})
+        summarized, previous = summaries.get(self, ((), None))
+
+        # The history is append-only, so if the dropped messages start with
+        # the ones summarized last time, only the rest has to be summarized
+        known = len(summarized)
+        if (
+            previous is not None
+            and known <= len(dropped)
+            and all(a is b for a, b in zip(summarized, dropped))
+        ):
+            if known == len(dropped):
+                return previous
+            summary = self.summarizer(dropped[known:], previous)
+        else:
+            summary = self.summarizer(dropped, None)
+
+        summaries[self] = (list(dropped), summary)
+        return summary
+
+
+def _collapsed_placeholder(message) -> str:
+    size = len(get_text(message))
+    return f"[Output removed to save context ({size} characters)]"
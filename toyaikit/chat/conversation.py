@@ -0,0 +1,113 @@
+from collections.abc import Sequence
+
+
+class ConversationView(Sequence):
+    """
+    Read-only window [start, stop) over the messages of a Conversation.
+
+    Creating a view doesn't copy the messages. The bounds are fixed when the
+    view is created, so messages appended to the conversation later are not
+    visible through it.
+    """
+
+    __slots__ = ("conversation", "start", "stop")
+
+    def __init__(self, conversation: "Conversation", start: int, stop: int):
+        self.conversation = conversation
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        positions = range(self.start, self.stop)[index]
+
+        if isinstance(index, slice):
+            if positions.step == 1:
+                return ConversationView(
+                    self.conversation, positions.start, positions.stop
+                )
+            return [list.__getitem__(self.conversation, i) for i in positions]
+
+        return list.__getitem__(self.conversation, positions)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield list.__getitem__(self.conversation, i)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ConversationView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def is_tail(self) -> bool:
+        """True if the view ends where the conversation currently ends."""
+        return self.stop == len(self.conversation)
+
+
+class Conversation(list):
+    """
+    Append-only message history shared by consecutive tool-call loops.
+
+    The runners append to it in place instead of copying the history on every
+    loop, and hand out ConversationViews (offset ranges, no copies) as the
+    new_messages and all_messages of a LoopResult. It is a list, so it can be
+    sent to the LLM clients as is; only the operations that change existing
+    messages are disabled.
+
+    state holds what the runners keep about the conversation between loops,
+    e.g. the id of the last response stored by the provider.
+    """
+
+    def __init__(self, messages=()):
+        super().__init__(messages)
+        self.state = {}
+
+    def view(self, start: int = 0, stop: int = None) -> ConversationView:
+        """Return a view of the messages in [start, stop)."""
+        if stop is None:
+            stop = len(self)
+        return ConversationView(self, start, stop)
+
+    @classmethod
+    def from_messages(cls, messages=None) -> "Conversation":
+        """
+        Return a conversation to continue from messages.
+
+        A Conversation is returned as is, so new messages are appended to it
+        in place. So is the conversation behind a view that covers it up to
+        its end, e.g. the all_messages of the previous loop. Any other list
+        of messages is copied once into a new Conversation.
+        """
+        if isinstance(messages, Conversation):
+            return messages
+
+        if (
+            isinstance(messages, ConversationView)
+            and messages.start == 0
+            and messages.is_tail()
+        ):
+            return messages.conversation
+
+        return cls(messages or [])
+
+    def _append_only(self, *args, **kwargs):
+        raise TypeError("Conversation is append-only")
+
+    __setitem__ = _append_only
+    __delitem__ = _append_only
+    __imul__ = _append_only
+    insert = _append_only
+    pop = _append_only
+    remove = _append_only
+    clear = _append_only
+    sort = _append_only
+    reverse = _append_only
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
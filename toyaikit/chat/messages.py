@@ -0,0 +1,363 @@
+import json
+from typing import Iterable, Sequence
+
+from toyaikit.chat.conversation import Conversation
+from toyaikit.utils import get_field
+
+RESPONSES = "responses"
+CHAT_COMPLETIONS = "chat_completions"
+ANTHROPIC = "anthropic"
+
+MESSAGE_FORMATS = (RESPONSES, CHAT_COMPLETIONS, ANTHROPIC)
+
+
+def _content_text(content) -> str | None:
+    if content is None or isinstance(content, str):
+        return content
+
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif get_field(part, "text") is not None:
+            parts.append(get_field(part, "text"))
+    return "".join(parts)
+
+
+class ToolCall:
+    """A function call requested by the model."""
+
+    __slots__ = ("id", "name", "arguments")
+
+    def __init__(self, id: str, name: str, arguments: str):
+        self.id = id
+        self.name = name
+        self.arguments = arguments
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ToolCall):
+            return NotImplemented
+        return (self.id, self.name, self.arguments) == (
+            other.id,
+            other.name,
+            other.arguments,
+        )
+
+    def __repr__(self) -> str:
+        return f"ToolCall(id={self.id!r}, name={self.name!r})"
+
+
+class ChatMessage:
+    """
+    A message in a provider-neutral form: the role ("system", "user",
+    "assistant" or "tool"), its text, the function calls of an assistant
+    message and the call a tool message answers.
+
+    encode() returns the message in the format of a runner. The encoded
+    messages are built on first use and kept, so a message that is sent
+    again is not converted again. Treat them as read-only.
+
+    The runners don't keep their histories as ChatMessages, they keep the
+    messages and output items of their API. ChatMessage is the form a
+    history takes when it's translated from one format to another (see
+    toyaikit.formats).
+    """
+
+    __slots__ = ("role", "text", "tool_calls", "tool_call_id", "_encoded")
+
+    def __init__(
+        self,
+        role: str,
+        text: str = None,
+        tool_calls: Sequence[ToolCall] = (),
+        tool_call_id: str = None,
+    ):
+        self.role = role
+        self.text = text
+        self.tool_calls = tuple(tool_calls)
+        self.tool_call_id = tool_call_id
+        self._encoded = None
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ChatMessage):
+            return NotImplemented
+        return (self.role, self.text, self.tool_calls, self.tool_call_id) == (
+            other.role,
+            other.text,
+            other.tool_calls,
+            other.tool_call_id,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"ChatMessage(role={self.role!r}, text={self.text!r}, "
+            f"tool_calls={list(self.tool_calls)!r})"
+        )
+
+    def encode(self, message_format: str) -> list:
+        """The message in message_format: one or more messages (a Responses
+        assistant message becomes a message and function call items)."""
+        if self._encoded is None:
+            self._encoded = {}
+
+        encoded = self._encoded.get(message_format)
+        if encoded is None:
+            encoded = _ENCODERS[message_format](self)
+            self._encoded[message_format] = encoded
+        return encoded
+
+
+def _encode_responses(message: ChatMessage) -> list:
+    if message.role == "tool":
+        return [
+            {
+                "type": "function_call_output",
+                "call_id": message.tool_call_id,
+                "output": message.text,
+            }
+        ]
+
+    role = "developer" if message.role == "system" else message.role
+    encoded = []
+    if message.text or not message.tool_calls:
+        encoded.append({"role": role, "content": message.text})
+    for call in message.tool_calls:
+        encoded.append(
+            {
+                "type": "function_call",
+                "call_id": call.id,
+                "name": call.name,
+                "arguments": call.arguments,
+            }
+        )
+    return encoded
+
+
+def _encode_chat_completions(message: ChatMessage) -> list:
+    encoded = {"role": message.role, "content": message.text}
+    if message.role == "tool":
+        encoded["tool_call_id"] = message.tool_call_id
+    if message.tool_calls:
+        encoded["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.name, "arguments": call.arguments},
+            }
+            for call in message.tool_calls
+        ]
+    return [encoded]
+
+
+def _encode_anthropic(message: ChatMessage) -> list:
+    # The format of AnthropicMessagesRunner, AnthropicClient converts the
+    # tool messages into tool_result blocks
+    if message.role == "tool":
+        return [
+            {
+                "role": "tool",
+                "tool_call_id": message.tool_call_id,
+                "content": message.text,
+            }
+        ]
+
+    if not message.tool_calls:
+        return [{"role": message.role, "content": message.text}]
+
+    content = []
+    if message.text:
+        content.append({"type": "text", "text": message.text})
+    for call in message.tool_calls:
+        content.append(
+            {
+                "type": "tool_use",
+                "id": call.id,
+                "name": call.name,
+                "input": json.loads(call.arguments or "{}"),
+            }
+        )
+    return [{"role": "assistant", "content": content}]
+
+
+_ENCODERS = {
+    RESPONSES: _encode_responses,
+    CHAT_COMPLETIONS: _encode_chat_completions,
+    ANTHROPIC: _encode_anthropic,
+}
+
+
+def _decode_responses(item) -> list[ChatMessage]:
+    item_type = get_field(item, "type")
+    role = get_field(item, "role")
+
+    if item_type == "function_call":
+        call = ToolCall(
+            get_field(item, "call_id"),
+            get_field(item, "name"),
+            get_field(item, "arguments"),
+        )
+        return [ChatMessage("assistant", tool_calls=[call])]
+
+    if item_type == "function_call_output":
+        return [
+            ChatMessage(
+                "tool",
+                get_field(item, "output"),
+                tool_call_id=get_field(item, "call_id"),
+            )
+        ]
+
+    if role in ("developer", "system"):
+        return [ChatMessage("system", _content_text(get_field(item, "content")))]
+
+    if role in ("user", "assistant"):
+        return [ChatMessage(role, _content_text(get_field(item, "content")))]
+
+    # reasoning items and anything without an equivalent
+    return []
+
+
+def _decode_chat_completions(message) -> list[ChatMessage]:
+    role = get_field(message, "role")
+    tool_calls = [
+        ToolCall(
+            get_field(call, "id"),
+            get_field(get_field(call, "function"), "name"),
+            get_field(get_field(call, "function"), "arguments"),
+        )
+        for call in get_field(message, "tool_calls") or []
+    ]
+    return [
+        ChatMessage(
+            role,
+            _content_text(get_field(message, "content")),
+            tool_calls=tool_calls,
+            tool_call_id=get_field(message, "tool_call_id"),
+        )
+    ]
+
+
+def _decode_anthropic(message) -> list[ChatMessage]:
+    role = get_field(message, "role")
+    content = get_field(message, "content")
+
+    if role == "tool":
+        return [
+            ChatMessage(
+                "tool",
+                _content_text(content),
+                tool_call_id=get_field(message, "tool_call_id"),
+            )
+        ]
+
+    if role == "system" or isinstance(content, str):
+        return [ChatMessage(role, _content_text(content))]
+
+    if role == "assistant":
+        text_blocks = [block for block in content if get_field(block, "type") == "text"]
+        tool_calls = [
+            ToolCall(
+                get_field(block, "id"),
+                get_field(block, "name"),
+                json.dumps(get_field(block, "input")),
+            )
+            for block in content
+            if get_field(block, "type") == "tool_use"
+        ]
+        return [
+            ChatMessage(
+                "assistant", _content_text(text_blocks) or None, tool_calls=tool_calls
+            )
+        ]
+
+    # a user message, possibly with tool_result blocks
+    decoded = []
+    text_blocks = []
+    for block in content:
+        if get_field(block, "type") == "tool_result":
+            decoded.append(
+                ChatMessage(
+                    "tool",
+                    _content_text(get_field(block, "content")),
+                    tool_call_id=get_field(block, "tool_use_id"),
+                )
+            )
+        else:
+            text_blocks.append(block)
+    if text_blocks:
+        decoded.append(ChatMessage("user", _content_text(text_blocks)))
+    return decoded
+
+
+_DECODERS = {
+    RESPONSES: _decode_responses,
+    CHAT_COMPLETIONS: _decode_chat_completions,
+    ANTHROPIC: _decode_anthropic,
+}
+
+
+def _add_decoded(chat_messages: list, message: ChatMessage):
+    # Function calls of one model turn belong to one assistant message
+    last = chat_messages[-1] if chat_messages else None
+    if (
+        last is not None
+        and last.role == "assistant"
+        and message.role == "assistant"
+        and message.tool_calls
+        and not message.text
+    ):
+        chat_messages[-1] = ChatMessage(
+            "assistant", last.text, tool_calls=last.tool_calls + message.tool_calls
+        )
+    else:
+        chat_messages.append(message)
+
+
+def decode_messages(
+    messages: Iterable, message_format: str, chat_messages: list = None
+) -> list[ChatMessage]:
+    """
+    Convert messages in the format of a runner into ChatMessages, appended
+    to chat_messages if given.
+
+    Only text, function calls and their outputs are kept: reasoning items
+    and thinking blocks are dropped, other content parts (e.g. images) are
+    reduced to their text.
+    """
+    if chat_messages is None:
+        chat_messages = []
+
+    decode = _DECODERS[message_format]
+    for message in messages:
+        for chat_message in decode(message):
+            _add_decoded(chat_messages, chat_message)
+
+    return chat_messages
+
+
+def get_chat_messages(messages: Sequence, message_format: str) -> list[ChatMessage]:
+    """
+    ChatMessages of a history. For a Conversation they are kept in its
+    state and only the messages appended since the last call are decoded,
+    so the history is converted once however often it's sent.
+    """
+    if not isinstance(messages, Conversation):
+        return decode_messages(messages, message_format)
+
+    key = ("chat_messages", message_format)
+    decoded, chat_messages = messages.state.get(key, (0, []))
+
+    if decoded < len(messages):
+        decode_messages(messages[decoded:], message_format, chat_messages)
+        messages.state[key] = (len(messages), chat_messages)
+
+    return chat_messages
+
+
+def encode_messages(chat_messages: Iterable[ChatMessage], message_format: str) -> list:
+    """ChatMessages in message_format."""
+    return [
+        encoded
+        for chat_message in chat_messages
+        for encoded in chat_message.encode(message_format)
+    ]
@@ -1,8 +1,21 @@
+import asyncio
+import functools
+import inspect
 import json
 import uuid
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Callable, Generic, TypeVar
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field
+from typing import (
+    AsyncIterator,
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    Sequence,
+    TypeVar,
+)
 
 from openai.types.chat.chat_completion_function_message_param import (
     ChatCompletionFunctionMessageParam,
@@ -15,11 +28,36 @@ from openai.types.chat.chat_completion_user_message_param import (
 )
 from openai.types.responses.easy_input_message import EasyInputMessage
 from openai.types.responses.response_function_tool_call import ResponseFunctionToolCall
+from openai.types.responses.response_input_param import FunctionCallOutput
 from pydantic import BaseModel
 
+from toyaikit.chat.context import ContextPolicy, TrimReport
+from toyaikit.chat.conversation import Conversation
 from toyaikit.chat.interface import ChatInterface
-from toyaikit.llm import LLMClient
-from toyaikit.pricing import CostInfo, PricingConfig, TokenUsage
+from toyaikit.chat.messages import ANTHROPIC, CHAT_COMPLETIONS, RESPONSES
+from toyaikit.chat.streaming import (
+    AnthropicStreamAccumulator,
+    ChatCompletionsStreamAccumulator,
+    LoopCompletedEvent,
+    ResponsesStreamAccumulator,
+    StreamAccumulator,
+    StreamEvent,
+    ToolCallFinishedEvent,
+    UsageEvent,
+)
+from toyaikit.deadlines import (
+    CANCELLED,
+    DEADLINE,
+    MAX_ITERATIONS,
+    CancellationToken,
+    Deadline,
+    DeadlineExceeded,
+    deadline_scope,
+)
+from toyaikit.hedging import HedgeOutcome, HedgeReport, collect_hedges
+from toyaikit.llm import LLMClient, collect_discarded, collect_models
+from toyaikit.pricing import CostInfo, PricingConfig, TokenUsage, UsageByModel
+from toyaikit.tokens import TokenEstimator
 from toyaikit.tools import Tools
 
 # T must be either a str or a (subclass)
@@ -27,6 +65,29 @@ from toyaikit.tools import Tools
 T = TypeVar("T", str, BaseModel)
 
 
+def _count(value) -> int:
+    """Token count from an optional usage field."""
+    return value if isinstance(value, int) else 0
+
+
+def _missed_deadline(error: Exception, deadline: Deadline | None) -> bool:
+    """Whether a request failed because of the deadline of its loop."""
+    if deadline is None:
+        return False
+    return isinstance(error, DeadlineExceeded) or deadline.expired
+
+
+def _timeout_output(function_call) -> FunctionCallOutput:
+    """Output of a function call that didn't finish before the deadline,
+    in the format of Tools errors."""
+    error = {"error": "TimeoutError: the tool call didn't finish before the deadline"}
+    return FunctionCallOutput(
+        type="function_call_output",
+        call_id=function_call.call_id,
+        output=json.dumps(error, indent=2),
+    )
+
+
 def _get_tool_call_output(call_result) -> str:
     """Extract output from tool call result, handling both dict and object types."""
     if isinstance(call_result, dict):
@@ -36,11 +97,46 @@ def _get_tool_call_output(call_result) -> str:
 
 @dataclass
 class LoopResult(Generic[T]):
-    new_messages: list
-    all_messages: list
+    new_messages: Sequence
+    all_messages: Sequence
     tokens: TokenUsage
     cost: CostInfo | None
     last_message: T
+    trimmed: TrimReport | None = None
+    hedges: HedgeReport | None = None
+    # Set when the loop stopped before the final answer: "deadline",
+    # "cancelled" or "max_iterations"
+    stop_reason: str | None = None
+    # The tokens by the model that answered, cost prices each with its own
+    tokens_by_model: UsageByModel = field(default_factory=UsageByModel)
+
+    @property
+    def truncated(self) -> bool:
+        return self.stop_reason is not None
+
+
+@dataclass
+class BatchItem:
+    """Outcome of one prompt of loop_many(): a result or the error it raised."""
+
+    index: int
+    prompt: str
+    result: LoopResult | None = None
+    error: Exception | None = None
+
+
+@dataclass
+class BatchResult:
+    items: list[BatchItem]
+    tokens: TokenUsage
+    cost: CostInfo | None
+    failed: list[BatchItem] = field(default_factory=list)
+    tokens_by_model: UsageByModel = field(default_factory=UsageByModel)
+
+    @property
+    def results(self) -> list[LoopResult | None]:
+        """LoopResults in the order of the items, None for failed prompts."""
+        return [item.result for item in self.items]
 
 
 class RunnerCallback(ABC):
@@ -71,6 +167,13 @@ class RunnerCallback(ABC):
     def on_response(self, response):
         pass
 
+    def on_request(self, estimated_tokens: int):
+        """
+        Called before a request is sent, with an estimate of its input
+        tokens (see toyaikit.tokens.TokenEstimator).
+        """
+        pass
+
 
 class ChatRunner(ABC):
     """Abstract base class for different chat runners."""
@@ -119,10 +222,31 @@ class DisplayingRunnerCallback(RunnerCallback):
 class BaseToolUsingRunner(ChatRunner):
     """Base class for runners that use tools and LLM clients.
 
-    Provides common initialization and run() method implementation.
-    Subclasses only need to implement the loop() method.
+    Provides the tool-call loop (sync loop() and async aloop()) and run().
+    Subclasses describe their message format by implementing the hooks
+    below: the initial and user messages, how a response is added to the
+    history and how tool results are recorded. message_format names it,
+    so histories can be translated between runners (see
+    toyaikit.formats.convert_messages).
+
+    By default the function calls of one model turn are executed one after
+    another. Pass a tool_executor (e.g. a ThreadPoolExecutor) to run them
+    concurrently; results are still added to the history and reported to
+    the callback in the order the model requested them.
+
+    Pass a context_policy (see ContextPolicy) to limit the messages sent
+    with each request to a token budget. The history is kept as is, what
+    was left out of the last request is reported in LoopResult.trimmed.
+    The callback's on_request gets the estimated input tokens of each
+    request, counted with token_estimator (by default the context policy's
+    TokenEstimator, or one for the model).
     """
 
+    # TODO: keep the history as ChatMessage (toyaikit.chat.messages) and
+    # encode it per API when sending, so the runners share one history
+    # format and convert_messages is only needed at the boundaries.
+    message_format: str = None
+
     def __init__(
         self,
         tools: Tools = None,
@@ -130,6 +254,9 @@ class BaseToolUsingRunner(ChatRunner):
         chat_interface: ChatInterface = None,
         llm_client: LLMClient = None,
         pricing_config: PricingConfig = None,
+        tool_executor: Executor = None,
+        context_policy: ContextPolicy = None,
+        token_estimator: TokenEstimator = None,
     ):
         self.tools = tools
         self.developer_prompt = developer_prompt
@@ -137,18 +264,807 @@ class BaseToolUsingRunner(ChatRunner):
         self.llm_client = llm_client
         self.displaying_callback = DisplayingRunnerCallback(chat_interface)
         self.pricing_config = pricing_config or PricingConfig()
+        self.tool_executor = tool_executor
+        self.context_policy = context_policy
+        self.token_estimator = token_estimator
 
-    @abstractmethod
     def loop(
         self,
         prompt: str,
         previous_messages: list = None,
         callback: RunnerCallback = None,
         output_format: BaseModel = None,
+        deadline: Deadline | float = None,
+        cancellation: CancellationToken = None,
+        max_iterations: int = None,
+    ) -> LoopResult:
+        """Execute one tool-call loop.
+
+        The loop can be bounded: by a deadline (a Deadline or seconds),
+        which also limits the requests and the waiting for tool calls; by
+        a CancellationToken; by max_iterations, the number of requests.
+        When a bound stops it, the loop returns what it has so far with
+        the reason in LoopResult.stop_reason. Tool calls that didn't
+        finish in time get an error output, so the history can be
+        continued.
+        """
+        chat_messages, prev_messages_len = self._start_loop(prompt, previous_messages)
+        deadline = Deadline.coerce(deadline)
+
+        tokens = UsageByModel()
+        trimmed = None
+        hedges = None
+        response = None
+        stop_reason = None
+        iterations = 0
+
+        while True:
+            stop_reason = self._check_bounds(
+                deadline, cancellation, max_iterations, iterations
+            )
+            if stop_reason is not None:
+                break
+
+            try:
+                with (
+                    collect_hedges() as hedge_outcomes,
+                    collect_discarded() as discarded,
+                    deadline_scope(deadline),
+                ):
+                    response, trimmed, model = self._send_request(
+                        chat_messages, callback=callback, output_format=output_format
+                    )
+            except Exception as e:
+                if not _missed_deadline(e, deadline):
+                    raise
+                stop_reason = DEADLINE
+                break
+            finally:
+                self._add_discarded(tokens, discarded)
+            iterations += 1
+
+            if callback:
+                callback.on_response(response)
+
+            usage = self._get_token_usage(response, model)
+            tokens.add(usage)
+            hedges = self._track_hedges(hedge_outcomes, usage, hedges)
+
+            function_calls = self._process_response(response, chat_messages, callback)
+            if not function_calls:
+                break
+
+            self._execute_function_calls(
+                function_calls, chat_messages, callback, deadline
+            )
+
+        return self._build_loop_result(
+            response=response,
+            chat_messages=chat_messages,
+            prev_messages_len=prev_messages_len,
+            tokens=tokens,
+            output_format=output_format,
+            trimmed=trimmed,
+            hedges=hedges,
+            stop_reason=stop_reason,
+        )
+
+    async def aloop(
+        self,
+        prompt: str,
+        previous_messages: list = None,
+        callback: RunnerCallback = None,
+        output_format: BaseModel = None,
+        deadline: Deadline | float = None,
+        cancellation: CancellationToken = None,
+        max_iterations: int = None,
     ) -> LoopResult:
-        """Execute one tool-call loop. Must be implemented by subclasses."""
+        """Execute one tool-call loop without blocking the event loop.
+
+        Works best with an AsyncLLMClient. Synchronous clients and tools
+        are run in a worker thread. deadline, cancellation and
+        max_iterations bound the loop as in loop(); async tools that don't
+        finish in time are cancelled.
+        """
+        chat_messages, prev_messages_len = self._start_loop(prompt, previous_messages)
+        deadline = Deadline.coerce(deadline)
+
+        tokens = UsageByModel()
+        trimmed = None
+        hedges = None
+        response = None
+        stop_reason = None
+        iterations = 0
+
+        while True:
+            stop_reason = self._check_bounds(
+                deadline, cancellation, max_iterations, iterations
+            )
+            if stop_reason is not None:
+                break
+
+            try:
+                with (
+                    collect_hedges() as hedge_outcomes,
+                    collect_discarded() as discarded,
+                    deadline_scope(deadline),
+                ):
+                    response, trimmed, model = await self._asend_request(
+                        chat_messages, callback=callback, output_format=output_format
+                    )
+            except Exception as e:
+                if not _missed_deadline(e, deadline):
+                    raise
+                stop_reason = DEADLINE
+                break
+            finally:
+                self._add_discarded(tokens, discarded)
+            iterations += 1
+
+            if callback:
+                callback.on_response(response)
+
+            usage = self._get_token_usage(response, model)
+            tokens.add(usage)
+            hedges = self._track_hedges(hedge_outcomes, usage, hedges)
+
+            function_calls = self._process_response(response, chat_messages, callback)
+            if not function_calls:
+                break
+
+            await self._aexecute_function_calls(
+                function_calls, chat_messages, callback, deadline
+            )
+
+        return self._build_loop_result(
+            response=response,
+            chat_messages=chat_messages,
+            prev_messages_len=prev_messages_len,
+            tokens=tokens,
+            output_format=output_format,
+            trimmed=trimmed,
+            hedges=hedges,
+            stop_reason=stop_reason,
+        )
+
+    def loop_many(
+        self,
+        prompts: Iterable[str],
+        concurrency: int = 4,
+        output_format: BaseModel = None,
+        ordered: bool = True,
+        on_progress: Callable[[BatchItem, int, int], None] = None,
+    ) -> BatchResult:
+        """Run independent tool-call loops, one per prompt, in parallel.
+
+        At most `concurrency` loops run at the same time. An exception in
+        one loop doesn't stop the others, it's captured in the item's
+        error. Items are returned in the order of the prompts, or in the
+        order they completed with ordered=False.
+
+        on_progress(item, completed, total) is called from the calling
+        thread as every item completes.
+        """
+        prompts = list(prompts)
+        items = []
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(
+                    self.loop, prompt=prompt, output_format=output_format
+                ): BatchItem(index=index, prompt=prompt)
+                for index, prompt in enumerate(prompts)
+            }
+
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    item.result = future.result()
+                except Exception as e:
+                    item.error = e
+
+                items.append(item)
+                if on_progress:
+                    on_progress(item, len(items), len(prompts))
+
+        return self._build_batch_result(items, ordered)
+
+    async def aloop_many(
+        self,
+        prompts: Iterable[str],
+        concurrency: int = 4,
+        output_format: BaseModel = None,
+        ordered: bool = True,
+        on_progress: Callable[[BatchItem, int, int], None] = None,
+    ) -> BatchResult:
+        """Async version of loop_many(), running the loops with aloop()."""
+        prompts = list(prompts)
+        items = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_item(item: BatchItem) -> BatchItem:
+            async with semaphore:
+                try:
+                    item.result = await self.aloop(
+                        prompt=item.prompt, output_format=output_format
+                    )
+                except Exception as e:
+                    item.error = e
+            return item
+
+        tasks = [
+            run_item(BatchItem(index=index, prompt=prompt))
+            for index, prompt in enumerate(prompts)
+        ]
+
+        for next_item in asyncio.as_completed(tasks):
+            item = await next_item
+            items.append(item)
+            if on_progress:
+                on_progress(item, len(items), len(prompts))
+
+        return self._build_batch_result(items, ordered)
+
+    def _build_batch_result(self, items: list[BatchItem], ordered: bool) -> BatchResult:
+        if ordered:
+            items = sorted(items, key=lambda item: item.index)
+
+        tokens = UsageByModel()
+
+        for item in items:
+            if item.result is not None:
+                tokens.merge(item.result.tokens_by_model)
+
+        return BatchResult(
+            items=items,
+            tokens=tokens.total(self.llm_client.model),
+            cost=self.pricing_config.calculate_total_cost(tokens.values()),
+            failed=[item for item in items if item.error is not None],
+            tokens_by_model=tokens,
+        )
+
+    def stream_loop(
+        self,
+        prompt: str,
+        previous_messages: list = None,
+        callback: RunnerCallback = None,
+    ) -> Iterator[StreamEvent]:
+        """Execute one tool-call loop, streaming the responses.
+
+        Yields TextDeltaEvent and ReasoningDeltaEvent as tokens arrive,
+        ToolCallStartedEvent / ToolCallFinishedEvent around tool calls,
+        a UsageEvent per request, and finally a LoopCompletedEvent with
+        the same LoopResult loop() returns.
+
+        A function call is sent to the tools as soon as its arguments are
+        complete, while the rest of the response is still streaming.
+        """
+        chat_messages, prev_messages_len = self._start_loop(prompt, previous_messages)
+
+        tokens = UsageByModel()
+
+        # Without a tool_executor the calls still run one at a time and in
+        # order, but in the background so they overlap with the stream
+        executor = self.tool_executor or ThreadPoolExecutor(max_workers=1)
+        trimmed = None
+
+        try:
+            while True:
+                stream, trimmed, model = self._send_request(
+                    chat_messages, callback=callback, stream=True
+                )
+
+                accumulator = self._create_stream_accumulator()
+                dispatched = {}
+
+                for raw_event in stream:
+                    yield from accumulator.add(raw_event)
+
+                    for function_call in accumulator.pop_completed_calls():
+                        dispatched[function_call.call_id] = executor.submit(
+                            self.tools.function_call, function_call
+                        )
+
+                response = accumulator.get_response()
+
+                if callback:
+                    callback.on_response(response)
+
+                usage = self._get_token_usage(response, model)
+                tokens.add(usage)
+                yield UsageEvent(
+                    input_tokens=usage.input_tokens, output_tokens=usage.output_tokens
+                )
+
+                function_calls = self._process_response(
+                    response, chat_messages, callback
+                )
+                if not function_calls:
+                    break
+
+                futures = []
+                for function_call in function_calls:
+                    future = dispatched.pop(function_call.call_id, None)
+                    if future is None:
+                        future = executor.submit(
+                            self.tools.function_call, function_call
+                        )
+                    futures.append(future)
+
+                for function_call, future in zip(function_calls, futures):
+                    output = self._add_function_call_output(
+                        function_call, future.result(), chat_messages, callback
+                    )
+                    yield ToolCallFinishedEvent(
+                        function_call=function_call, result=output
+                    )
+        finally:
+            if executor is not self.tool_executor:
+                executor.shutdown(wait=False)
+
+        result = self._build_loop_result(
+            response=response,
+            chat_messages=chat_messages,
+            prev_messages_len=prev_messages_len,
+            tokens=tokens,
+            trimmed=trimmed,
+        )
+        yield LoopCompletedEvent(result=result)
+
+    async def astream_loop(
+        self,
+        prompt: str,
+        previous_messages: list = None,
+        callback: RunnerCallback = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """Async version of stream_loop()."""
+        chat_messages, prev_messages_len = self._start_loop(prompt, previous_messages)
+
+        tokens = UsageByModel()
+        trimmed = None
+
+        while True:
+            accumulator = self._create_stream_accumulator()
+            dispatched = {}
+            last_task = None
+
+            stream, trimmed, model = await self._asend_request(
+                chat_messages, callback=callback, stream=True
+            )
+
+            async for raw_event in self._aiterate_stream(stream):
+                for event in accumulator.add(raw_event):
+                    yield event
+
+                for function_call in accumulator.pop_completed_calls():
+                    last_task = self._adispatch_function_call(function_call, last_task)
+                    dispatched[function_call.call_id] = last_task
+
+            response = accumulator.get_response()
+
+            if callback:
+                callback.on_response(response)
+
+            usage = self._get_token_usage(response, model)
+            tokens.add(usage)
+            yield UsageEvent(
+                input_tokens=usage.input_tokens, output_tokens=usage.output_tokens
+            )
+
+            function_calls = self._process_response(response, chat_messages, callback)
+            if not function_calls:
+                break
+
+            tasks = []
+            for function_call in function_calls:
+                task = dispatched.pop(function_call.call_id, None)
+                if task is None:
+                    last_task = self._adispatch_function_call(function_call, last_task)
+                    task = last_task
+                tasks.append(task)
+
+            for function_call, task in zip(function_calls, tasks):
+                output = self._add_function_call_output(
+                    function_call, await task, chat_messages, callback
+                )
+                yield ToolCallFinishedEvent(function_call=function_call, result=output)
+
+        result = self._build_loop_result(
+            response=response,
+            chat_messages=chat_messages,
+            prev_messages_len=prev_messages_len,
+            tokens=tokens,
+            trimmed=trimmed,
+        )
+        yield LoopCompletedEvent(result=result)
+
+    def _adispatch_function_call(self, function_call, previous_task=None):
+        async def call():
+            # Without a tool_executor the calls run one at a time, in order
+            if self.tool_executor is None and previous_task is not None:
+                await asyncio.wait([previous_task])
+            return await self._acall_function(function_call)
+
+        return asyncio.ensure_future(call())
+
+    async def _aiterate_stream(self, stream):
+        if hasattr(stream, "__aiter__"):
+            async for raw_event in stream:
+                yield raw_event
+            return
+
+        # The stream of a synchronous client: read it from a worker thread
+        iterator = iter(stream)
+        done = object()
+        while True:
+            raw_event = await asyncio.to_thread(next, iterator, done)
+            if raw_event is done:
+                return
+            yield raw_event
+
+    def _execute_function_calls(
+        self,
+        function_calls: list,
+        chat_messages: list,
+        callback: RunnerCallback,
+        deadline: Deadline = None,
+    ) -> list[str]:
+        if deadline is not None:
+            call_results = self._call_functions_until(function_calls, deadline)
+            return [
+                self._add_function_call_output(
+                    function_call, call_result, chat_messages, callback
+                )
+                for function_call, call_result in zip(function_calls, call_results)
+            ]
+
+        outputs = []
+
+        if self.tool_executor is None or len(function_calls) == 1:
+            for function_call in function_calls:
+                call_result = self.tools.function_call(function_call)
+                output = self._add_function_call_output(
+                    function_call, call_result, chat_messages, callback
+                )
+                outputs.append(output)
+            return outputs
+
+        # Executor.map yields the results in the order of the calls
+        call_results = self.tool_executor.map(self.tools.function_call, function_calls)
+        for function_call, call_result in zip(function_calls, call_results):
+            output = self._add_function_call_output(
+                function_call, call_result, chat_messages, callback
+            )
+            outputs.append(output)
+        return outputs
+
+    def _call_functions_until(self, function_calls: list, deadline: Deadline) -> list:
+        """Run the function calls in worker threads and wait for them until
+        the deadline. Calls that don't finish in time get a timeout error;
+        their threads can't be stopped, they finish in the background."""
+        # Without a tool_executor the calls still run one at a time, in order
+        executor = self.tool_executor or ThreadPoolExecutor(max_workers=1)
+        futures = [
+            executor.submit(self.tools.function_call, function_call)
+            for function_call in function_calls
+        ]
+
+        call_results = []
+        try:
+            for function_call, future in zip(function_calls, futures):
+                try:
+                    call_results.append(future.result(timeout=deadline.remaining()))
+                except FuturesTimeoutError:
+                    future.cancel()
+                    call_results.append(_timeout_output(function_call))
+        finally:
+            if executor is not self.tool_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return call_results
+
+    async def _aexecute_function_calls(
+        self,
+        function_calls: list,
+        chat_messages: list,
+        callback: RunnerCallback,
+        deadline: Deadline = None,
+    ) -> list[str]:
+        if deadline is not None:
+            call_results = await self._acall_functions_until(function_calls, deadline)
+            return [
+                self._add_function_call_output(
+                    function_call, call_result, chat_messages, callback
+                )
+                for function_call, call_result in zip(function_calls, call_results)
+            ]
+
+        outputs = []
+
+        if self.tool_executor is None:
+            for function_call in function_calls:
+                call_result = await self._acall_function(function_call)
+                output = self._add_function_call_output(
+                    function_call, call_result, chat_messages, callback
+                )
+                outputs.append(output)
+            return outputs
+
+        call_results = await asyncio.gather(
+            *(self._acall_function(function_call) for function_call in function_calls)
+        )
+        for function_call, call_result in zip(function_calls, call_results):
+            output = self._add_function_call_output(
+                function_call, call_result, chat_messages, callback
+            )
+            outputs.append(output)
+        return outputs
+
+    async def _acall_functions_until(
+        self, function_calls: list, deadline: Deadline
+    ) -> list:
+        """Async version of _call_functions_until(). Async tools that
+        don't finish in time are cancelled."""
+        call_results = []
+
+        if self.tool_executor is None:
+            for function_call in function_calls:
+                try:
+                    call_results.append(
+                        await asyncio.wait_for(
+                            self._acall_function(function_call),
+                            timeout=deadline.remaining(),
+                        )
+                    )
+                except asyncio.TimeoutError:
+                    call_results.append(_timeout_output(function_call))
+            return call_results
+
+        tasks = [
+            asyncio.ensure_future(self._acall_function(function_call))
+            for function_call in function_calls
+        ]
+        await asyncio.wait(tasks, timeout=deadline.remaining())
+
+        for function_call, task in zip(function_calls, tasks):
+            if task.done():
+                call_results.append(task.result())
+            else:
+                task.cancel()
+                call_results.append(_timeout_output(function_call))
+        return call_results
+
+    async def _acall_function(self, function_call):
+        afunction_call = getattr(self.tools, "afunction_call", None)
+        if afunction_call is not None:
+            return await afunction_call(function_call, executor=self.tool_executor)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.tool_executor, self.tools.function_call, function_call
+        )
+
+    def _send_request(
+        self, chat_messages: Conversation, callback: RunnerCallback = None, **kwargs
+    ):
+        """Send the history as prepared by _prepare_request.
+
+        kwargs are output_format, or stream=True. Returns the response (or
+        the stream), the TrimReport of the request and the model that
+        answered.
+        """
+        request_messages, request_kwargs, trimmed = self._prepare_request(chat_messages)
+        if callback:
+            callback.on_request(self._estimate_request(request_messages))
+
+        try:
+            with collect_models() as models:
+                response = self.llm_client.send_request(
+                    chat_messages=request_messages,
+                    tools=self.tools,
+                    **kwargs,
+                    **request_kwargs,
+                )
+        except Exception as e:
+            if not request_kwargs or not self._is_expired_state_error(e):
+                raise
+            # The state kept by the provider is gone, send the full history
+            self._forget_request_state(chat_messages)
+            return self._send_request(chat_messages, callback, **kwargs)
+
+        return response, trimmed, self._answering_model(models)
+
+    async def _asend_request(
+        self, chat_messages: Conversation, callback: RunnerCallback = None, **kwargs
+    ):
+        """Async version of _send_request(). Synchronous clients are
+        called in a worker thread."""
+        # Summarizing calls a model, keep it off the event loop
+        if self.context_policy is not None and self.context_policy.summarizer:
+            prepared = await asyncio.to_thread(self._prepare_request, chat_messages)
+        else:
+            prepared = self._prepare_request(chat_messages)
+        request_messages, request_kwargs, trimmed = prepared
+        if callback:
+            callback.on_request(self._estimate_request(request_messages))
+
+        send_request = self.llm_client.send_request
+        if not inspect.iscoroutinefunction(send_request):
+            send_request = functools.partial(asyncio.to_thread, send_request)
+
+        try:
+            with collect_models() as models:
+                response = await send_request(
+                    chat_messages=request_messages,
+                    tools=self.tools,
+                    **kwargs,
+                    **request_kwargs,
+                )
+        except Exception as e:
+            if not request_kwargs or not self._is_expired_state_error(e):
+                raise
+            self._forget_request_state(chat_messages)
+            return await self._asend_request(chat_messages, callback, **kwargs)
+
+        return response, trimmed, self._answering_model(models)
+
+    def _add_discarded(self, tokens: UsageByModel, discarded: list[tuple]):
+        """Add the tokens of responses the client didn't return (e.g.
+        rejected by a RoutingClient) under the models that sent them."""
+        for response, model in discarded:
+            if getattr(response, "usage", None) is not None:
+                tokens.add(self._get_token_usage(response, model))
+
+    def _answering_model(self, models: list[str]) -> str:
+        """The model that answered a request: the one reported by the
+        innermost wrapper client, or the client's model."""
+        if models:
+            return models[0]
+        return self.llm_client.model
+
+    def _prepare_request(self, chat_messages: Conversation):
+        """Return the messages to send, additional send_request kwargs
+        and the TrimReport of the context policy."""
+        if self.context_policy is None:
+            return chat_messages, {}, None
+
+        request_messages, trimmed = self.context_policy.apply(
+            chat_messages,
+            model=self.llm_client.model,
+            user_message=self._user_message,
+            tools=self.tools,
+        )
+        return request_messages, {}, trimmed
+
+    def _estimate_request(self, request_messages) -> int:
+        """Estimated input tokens of the messages and tools of a request."""
+        if self.token_estimator is None:
+            counter = getattr(self.context_policy, "token_counter", None)
+            if isinstance(counter, TokenEstimator):
+                self.token_estimator = counter
+            else:
+                self.token_estimator = TokenEstimator(model=self.llm_client.model)
+        return self.token_estimator.estimate_request(request_messages, self.tools)
+
+    def _is_expired_state_error(self, error: Exception) -> bool:
+        """True if error means the state the request referred to is gone."""
+        return False
+
+    def _forget_request_state(self, chat_messages: Conversation):
+        """Drop the provider-side state of the conversation."""
         pass
 
+    def _get_token_usage(self, response, model: str = None) -> TokenUsage:
+        input_tokens, output_tokens = self._get_usage(response)
+        cache_creation_tokens, cache_read_tokens = self._get_cache_usage(response)
+
+        return TokenUsage(
+            model=model or self.llm_client.model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_creation_input_tokens=cache_creation_tokens,
+            cache_read_input_tokens=cache_read_tokens,
+        )
+
+    def _get_cache_usage(self, response) -> tuple[int, int]:
+        """Return (cache_creation_input_tokens, cache_read_input_tokens)
+        of a response, both included in the input tokens of _get_usage."""
+        return 0, 0
+
+    def _track_hedges(
+        self,
+        outcomes: list[HedgeOutcome],
+        usage: TokenUsage,
+        report: HedgeReport = None,
+    ) -> HedgeReport | None:
+        """Add the hedges fired for a response to the report of the loop.
+        A hedge duplicates the request, so it's estimated to cost the
+        same tokens as the response."""
+        if not outcomes:
+            return report
+
+        if report is None:
+            report = HedgeReport()
+
+        for outcome in outcomes:
+            report.fired += 1
+            report.won += int(outcome.won)
+            report.extra_tokens_by_model.add(usage)
+
+        return report
+
+    def _start_loop(self, prompt: str, previous_messages: list = None):
+        chat_messages = Conversation.from_messages(previous_messages)
+        prev_messages_len = len(chat_messages)
+
+        if prev_messages_len == 0:
+            chat_messages.extend(self._initial_messages())
+
+        chat_messages.append(self._user_message(prompt))
+
+        return chat_messages, prev_messages_len
+
+    @staticmethod
+    def _check_bounds(
+        deadline: Deadline | None,
+        cancellation: CancellationToken | None,
+        max_iterations: int | None,
+        iterations: int,
+    ) -> str | None:
+        """Why the loop has to stop before the next request, None if it
+        doesn't."""
+        if cancellation is not None and cancellation.cancelled:
+            return CANCELLED
+        if deadline is not None and deadline.expired:
+            return DEADLINE
+        if max_iterations is not None and iterations >= max_iterations:
+            return MAX_ITERATIONS
+        return None
+
+    def _build_loop_result(
+        self,
+        response,
+        chat_messages: Conversation,
+        prev_messages_len: int,
+        tokens: UsageByModel,
+        output_format: BaseModel = None,
+        trimmed: TrimReport = None,
+        hedges: HedgeReport = None,
+        stop_reason: str = None,
+    ) -> LoopResult:
+        cost_info = self.pricing_config.calculate_total_cost(tokens.values())
+
+        if hedges is not None:
+            extra_tokens = hedges.extra_tokens_by_model
+            hedges.extra_tokens = extra_tokens.total(self.llm_client.model)
+            hedges.extra_cost = self.pricing_config.calculate_total_cost(
+                extra_tokens.values()
+            )
+
+        new_messages = chat_messages.view(prev_messages_len)
+
+        last_message = None
+        last_message_text = None
+        if response is not None:
+            last_message_text = self._get_last_message_text(response)
+        if last_message_text is not None:
+            if output_format:
+                last_message = output_format.model_validate_json(last_message_text)
+            else:
+                last_message = last_message_text
+
+        return LoopResult(
+            new_messages=new_messages,
+            all_messages=chat_messages.view(),
+            tokens=tokens.total(self.llm_client.model),
+            cost=cost_info,
+            last_message=last_message,
+            trimmed=trimmed,
+            hedges=hedges,
+            stop_reason=stop_reason,
+            tokens_by_model=tokens,
+        )
+
     def run(
         self,
         previous_messages: list = None,
@@ -157,8 +1073,7 @@ class BaseToolUsingRunner(ChatRunner):
         """Repeat tool-call loops until user asks to stop."""
         chat_messages = self._initialize_messages(previous_messages)
 
-        total_input_tokens = 0
-        total_output_tokens = 0
+        tokens = UsageByModel()
         last_message_text = ""
 
         while True:
@@ -167,149 +1082,188 @@ class BaseToolUsingRunner(ChatRunner):
                 self.chat_interface.display("Chat ended.")
                 break
 
+            # loop() appends the new messages to chat_messages in place
             loop_result = self.loop(
                 prompt=user_input,
                 previous_messages=chat_messages,
                 callback=self.displaying_callback,
             )
 
-            chat_messages.extend(loop_result.new_messages)
-            total_input_tokens += loop_result.tokens.input_tokens
-            total_output_tokens += loop_result.tokens.output_tokens
+            tokens.merge(loop_result.tokens_by_model)
             last_message_text = loop_result.last_message
 
             if stop_criteria and stop_criteria(loop_result.new_messages):
                 break
 
-        combined_cost = self.pricing_config.calculate_cost(
-            self.llm_client.model, total_input_tokens, total_output_tokens
-        )
-        combined_tokens = TokenUsage(
-            model=self.llm_client.model,
-            input_tokens=total_input_tokens,
-            output_tokens=total_output_tokens,
-        )
-
         return LoopResult(
-            new_messages=chat_messages,
-            all_messages=chat_messages,
-            tokens=combined_tokens,
-            cost=combined_cost,
+            new_messages=chat_messages.view(),
+            all_messages=chat_messages.view(),
+            tokens=tokens.total(self.llm_client.model),
+            cost=self.pricing_config.calculate_total_cost(tokens.values()),
             last_message=last_message_text,
+            tokens_by_model=tokens,
         )
 
+    def _initialize_messages(self, previous_messages: list = None) -> Conversation:
+        chat_messages = Conversation.from_messages(previous_messages)
+        if len(chat_messages) == 0:
+            chat_messages.extend(self._initial_messages())
+        return chat_messages
+
     @abstractmethod
-    def _initialize_messages(self, previous_messages: list = None) -> list:
-        """Initialize chat messages. Must be implemented by subclasses."""
+    def _initial_messages(self) -> list:
+        """Messages a new conversation starts with (the developer prompt)."""
         pass
 
+    @abstractmethod
+    def _user_message(self, prompt: str):
+        """Wrap the user prompt into a message of the runner's format."""
+        pass
 
-class OpenAIResponsesRunner(BaseToolUsingRunner):
-    """Runner for OpenAI responses API."""
+    @abstractmethod
+    def _get_usage(self, response) -> tuple[int, int]:
+        """Return (input_tokens, output_tokens) of a response."""
+        pass
 
-    def _initialize_messages(self, previous_messages: list = None) -> list:
-        if previous_messages is None or len(previous_messages) == 0:
-            return [
-                EasyInputMessage(
-                    role="developer",
-                    content=self.developer_prompt,
-                )
-            ]
-        return list(previous_messages)  # Return a copy
+    @abstractmethod
+    def _process_response(
+        self, response, chat_messages: list, callback: RunnerCallback = None
+    ) -> list:
+        """Add the response to the history, report text to the callback
+        and return the function calls the model asked for."""
+        pass
 
-    def loop(
+    @abstractmethod
+    def _add_function_call_output(
         self,
-        prompt: str,
-        previous_messages: list[dict] = None,
+        function_call,
+        call_result,
+        chat_messages: list,
         callback: RunnerCallback = None,
-        output_format: BaseModel = None,
-    ) -> LoopResult:
-        chat_messages = []
-        prev_messages_len = 0
-
-        if previous_messages is None or len(previous_messages) == 0:
-            chat_messages.append(
-                EasyInputMessage(
-                    role="developer",
-                    content=self.developer_prompt,
-                )
-            )
-        else:
-            chat_messages.extend(previous_messages)
-            prev_messages_len = len(previous_messages)
+    ):
+        """Add the result of a function call to the history and return
+        the output as it was recorded."""
+        pass
 
-        chat_messages.append(
-            EasyInputMessage(
-                role="user",
-                content=prompt,
-            )
-        )
+    @abstractmethod
+    def _get_last_message_text(self, response) -> str | None:
+        """Return the text of the final answer, or None if there is none."""
+        pass
 
-        total_input_tokens = 0
-        total_output_tokens = 0
+    @abstractmethod
+    def _create_stream_accumulator(self) -> StreamAccumulator:
+        """Create the accumulator for a streamed response."""
+        pass
 
-        while True:
-            response = self.llm_client.send_request(
-                chat_messages=chat_messages,
-                tools=self.tools,
-                output_format=output_format,
-            )
-            if callback:
-                callback.on_response(response)
 
-            if hasattr(response, "usage") and response.usage:
-                total_input_tokens += response.usage.input_tokens
-                total_output_tokens += response.usage.output_tokens
+class OpenAIResponsesRunner(BaseToolUsingRunner):
+    """Runner for OpenAI responses API.
+
+    With stateful=True the conversation is kept on OpenAI's side: each
+    request refers to the previous response with previous_response_id and
+    sends only the messages added since (the new prompt or the function
+    call outputs) instead of the whole history. If the stored response has
+    expired, the full history is sent again. The context policy only
+    applies to these full requests. The responses have to be stored, so
+    don't pass store=False in the client's extra_kwargs.
+    """
 
-            has_function_calls = False
+    message_format = RESPONSES
 
-            chat_messages.extend(response.output)
+    def __init__(self, *args, stateful: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stateful = stateful
 
-            for entry in response.output:
-                if entry.type == "function_call":
-                    result = self.tools.function_call(entry)
-                    chat_messages.append(result)
-                    if callback:
-                        callback.on_function_call(entry, result['output'])
-                    has_function_calls = True
+    def _initial_messages(self) -> list:
+        return [
+            EasyInputMessage(
+                role="developer",
+                content=self.developer_prompt,
+            )
+        ]
 
-                elif entry.type == "message":
-                    if callback:
-                        callback.on_message(entry.content[0].text)
+    def _user_message(self, prompt: str):
+        return EasyInputMessage(
+            role="user",
+            content=prompt,
+        )
 
-            if not has_function_calls:
-                break
+    def _get_usage(self, response) -> tuple[int, int]:
+        if hasattr(response, "usage") and response.usage:
+            return response.usage.input_tokens, response.usage.output_tokens
+        return 0, 0
+
+    def _get_cache_usage(self, response) -> tuple[int, int]:
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "input_tokens_details", None)
+        return 0, _count(getattr(details, "cached_tokens", None))
+
+    def _prepare_request(self, chat_messages: Conversation):
+        previous_response = None
+        if self.stateful:
+            previous_response = chat_messages.state.get("previous_response")
+
+        if previous_response is None:
+            return super()._prepare_request(chat_messages)
+
+        response_id, covered_messages = previous_response
+        request_messages = chat_messages[covered_messages:]
+        return request_messages, {"previous_response_id": response_id}, None
+
+    def _is_expired_state_error(self, error: Exception) -> bool:
+        if getattr(error, "status_code", None) not in (400, 404):
+            return False
+        if getattr(error, "code", None) == "previous_response_not_found":
+            return True
+        return "previous response" in str(error).lower()
+
+    def _forget_request_state(self, chat_messages: Conversation):
+        chat_messages.state.pop("previous_response", None)
+
+    def _process_response(
+        self, response, chat_messages: list, callback: RunnerCallback = None
+    ) -> list:
+        chat_messages.extend(response.output)
+
+        if self.stateful and isinstance(chat_messages, Conversation):
+            # The stored response covers the history up to its output
+            chat_messages.state["previous_response"] = (
+                response.id,
+                len(chat_messages),
+            )
 
-        cost_info = self.pricing_config.calculate_cost(
-            self.llm_client.model, total_input_tokens, total_output_tokens
-        )
+        function_calls = []
 
-        token_usage = TokenUsage(
-            model=self.llm_client.model,
-            input_tokens=total_input_tokens,
-            output_tokens=total_output_tokens,
-        )
+        for entry in response.output:
+            if entry.type == "function_call":
+                function_calls.append(entry)
+
+            elif entry.type == "message":
+                if callback:
+                    callback.on_message(entry.content[0].text)
 
-        new_messages = chat_messages[prev_messages_len:]
+        return function_calls
 
-        last_message_text = ""
-        last_message = None
+    def _add_function_call_output(
+        self,
+        function_call,
+        call_result,
+        chat_messages: list,
+        callback: RunnerCallback = None,
+    ):
+        chat_messages.append(call_result)
+        if callback:
+            callback.on_function_call(function_call, call_result["output"])
+        return call_result["output"]
+
+    def _get_last_message_text(self, response) -> str | None:
         for entry in reversed(response.output):
             if entry.type == "message":
-                last_message_text = entry.content[0].text
-                if output_format:
-                    last_message = output_format.model_validate_json(last_message_text)
-                else:
-                    last_message = last_message_text
-                break
+                return entry.content[0].text
+        return None
 
-        return LoopResult(
-            new_messages=new_messages,
-            all_messages=chat_messages,
-            tokens=token_usage,
-            cost=cost_info,
-            last_message=last_message,
-        )
+    def _create_stream_accumulator(self) -> StreamAccumulator:
+        return ResponsesStreamAccumulator()
 
 
 class OpenAIAgentsSDKRunner(ChatRunner):
@@ -436,15 +1390,21 @@ class PydanticAIRunner(ChatRunner):
 class OpenAIChatCompletionsRunner(BaseToolUsingRunner):
     """Runner for OpenAI chat completions API."""
 
-    def _initialize_messages(self, previous_messages: list = None) -> list:
-        if previous_messages is None or len(previous_messages) == 0:
-            return [
-                ChatCompletionSystemMessageParam(
-                    role="system",
-                    content=self.developer_prompt
-                )
-            ]
-        return list(previous_messages)  # Return a copy
+    message_format = CHAT_COMPLETIONS
+
+    def _initial_messages(self) -> list:
+        return [
+            ChatCompletionSystemMessageParam(
+                role="system",
+                content=self.developer_prompt
+            )
+        ]
+
+    def _user_message(self, prompt: str):
+        return ChatCompletionUserMessageParam(
+            role="user",
+            content=prompt
+        )
 
     @staticmethod
     def convert_function_output_to_tool_message(data):
@@ -454,239 +1414,173 @@ class OpenAIChatCompletionsRunner(BaseToolUsingRunner):
             content=data["output"],
         )
 
-    def loop(
-        self,
-        prompt: str,
-        previous_messages: list = None,
-        callback: RunnerCallback = None,
-        output_format: BaseModel = None,
-    ) -> LoopResult:
-        chat_messages = []
-        prev_messages_len = 0
-
-        if previous_messages is None or len(previous_messages) == 0:
-            chat_messages.append(
-                ChatCompletionSystemMessageParam(
-                    role="system",
-                    content=self.developer_prompt
-                )
-            )
-        else:
-            chat_messages.extend(previous_messages)
-            prev_messages_len = len(previous_messages)
-
-        user_message = ChatCompletionUserMessageParam(
-            role="user",
-            content=prompt
-        )
-        chat_messages.append(user_message)
-
-        total_input_tokens = 0
-        total_output_tokens = 0
-
-        while True:
-            reponse = self.llm_client.send_request(
-                chat_messages, self.tools, output_format
+    def _get_usage(self, response) -> tuple[int, int]:
+        if response.usage:
+            return response.usage.prompt_tokens, response.usage.completion_tokens
+        return 0, 0
+
+    def _get_cache_usage(self, response) -> tuple[int, int]:
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        return 0, _count(getattr(details, "cached_tokens", None))
+
+    def _process_response(
+        self, response, chat_messages: list, callback: RunnerCallback = None
+    ) -> list:
+        first_choice = response.choices[0]
+        message_response = first_choice.message
+        chat_messages.append(message_response)
+
+        if hasattr(message_response, "reasoning_content"):
+            reasoning = (message_response.reasoning_content or "").strip()
+            if reasoning != "" and callback:
+                callback.on_reasoning(reasoning)
+
+        content = (message_response.content or "").strip()
+        if content != "" and callback:
+            callback.on_message(content)
+
+        calls = []
+
+        if hasattr(message_response, "tool_calls"):
+            calls = message_response.tool_calls
+
+        if calls is None:
+            return []
+
+        function_calls = []
+
+        for call in calls:
+            # model_construct: the fields come from the API, no need to
+            # validate them again
+            function_call = ResponseFunctionToolCall.model_construct(
+                type="function_call",
+                name=call.function.name,
+                arguments=call.function.arguments,
+                call_id=call.id,
             )
+            function_calls.append(function_call)
 
-            if callback:
-                callback.on_response(reponse)
-
-            if reponse.usage:
-                total_input_tokens += reponse.usage.prompt_tokens
-                total_output_tokens += reponse.usage.completion_tokens
+        return function_calls
 
-            first_choice = reponse.choices[0]
-            message_response = first_choice.message
-            chat_messages.append(message_response)
-
-            if hasattr(message_response, "reasoning_content"):
-                reasoning = (message_response.reasoning_content or "").strip()
-                if reasoning != "" and callback:
-                    callback.on_reasoning(reasoning)
-
-            content = (message_response.content or "").strip()
-            if content != "" and callback:
-                callback.on_message(content)
-
-            calls = []
-
-            if hasattr(message_response, "tool_calls"):
-                calls = message_response.tool_calls
-
-            if calls is None:
-                break
-
-            if len(calls) == 0:
-                break
-
-            for call in calls:
-                function_call = ResponseFunctionToolCall(
-                    type="function_call",
-                    name=call.function.name,
-                    arguments=call.function.arguments,
-                    call_id=call.id,
-                )
+    def _add_function_call_output(
+        self,
+        function_call,
+        call_result,
+        chat_messages: list,
+        callback: RunnerCallback = None,
+    ):
+        call_result = self.convert_function_output_to_tool_message(call_result)
 
-                call_result = self.tools.function_call(function_call)
-                call_result = self.convert_function_output_to_tool_message(call_result)
+        chat_messages.append(call_result)
 
-                chat_messages.append(call_result)
+        content_val = getattr(call_result, "content", None)
+        if content_val is None and isinstance(call_result, dict):
+            content_val = call_result.get("content")
 
-                if callback:
-                    content_val = getattr(call_result, "content", None)
-                    if content_val is None and isinstance(call_result, dict):
-                        content_val = call_result.get("content")
-                    callback.on_function_call(function_call, content_val)
+        if callback:
+            callback.on_function_call(function_call, content_val)
 
-        cost = self.pricing_config.calculate_cost(
-            self.llm_client.model, total_input_tokens, total_output_tokens
-        )
+        return content_val
 
-        token_usage = TokenUsage(
-            model=self.llm_client.model,
-            input_tokens=total_input_tokens,
-            output_tokens=total_output_tokens,
-        )
+    def _get_last_message_text(self, response) -> str | None:
+        message_response = response.choices[0].message
+        return (message_response.content or "").strip()
 
-        new_messages = chat_messages[prev_messages_len:]
-
-        last_message_text = (message_response.content or "").strip()
-        if output_format:
-            last_message = output_format.model_validate_json(last_message_text)
-        else:
-            last_message = last_message_text
-
-        return LoopResult(
-            new_messages=new_messages,
-            all_messages=chat_messages,
-            tokens=token_usage,
-            cost=cost,
-            last_message=last_message,
-        )
+    def _create_stream_accumulator(self) -> StreamAccumulator:
+        return ChatCompletionsStreamAccumulator()
 
 
 class AnthropicMessagesRunner(BaseToolUsingRunner):
     """Runner for Anthropic Messages API."""
 
-    def _initialize_messages(self, previous_messages: list = None) -> list:
-        if previous_messages is None or len(previous_messages) == 0:
-            return [{
-                "role": "system",
-                "content": self.developer_prompt
-            }]
-        return list(previous_messages)  # Return a copy
+    message_format = ANTHROPIC
 
-    def loop(
-        self,
-        prompt: str,
-        previous_messages: list = None,
-        callback: RunnerCallback = None,
-        output_format: BaseModel = None,
-    ) -> LoopResult:
-        chat_messages = []
-        prev_messages_len = 0
-
-        if previous_messages is None or len(previous_messages) == 0:
-            chat_messages.append({
-                "role": "system",
-                "content": self.developer_prompt
-            })
-        else:
-            chat_messages.extend(previous_messages)
-            prev_messages_len = len(previous_messages)
+    def _initial_messages(self) -> list:
+        return [{
+            "role": "system",
+            "content": self.developer_prompt
+        }]
 
-        chat_messages.append({
+    def _user_message(self, prompt: str):
+        return {
             "role": "user",
             "content": prompt
-        })
-
-        total_input_tokens = 0
-        total_output_tokens = 0
-
-        while True:
-            response = self.llm_client.send_request(
-                chat_messages=chat_messages,
-                tools=self.tools,
-                output_format=output_format,
+        }
+
+    def _get_usage(self, response) -> tuple[int, int]:
+        if hasattr(response, "usage") and response.usage:
+            # Anthropic reports the cached input tokens separately
+            cache_creation_tokens, cache_read_tokens = self._get_cache_usage(response)
+            input_tokens = (
+                response.usage.input_tokens + cache_creation_tokens + cache_read_tokens
             )
+            return input_tokens, response.usage.output_tokens
+        return 0, 0
+
+    def _get_cache_usage(self, response) -> tuple[int, int]:
+        usage = getattr(response, "usage", None)
+        return (
+            _count(getattr(usage, "cache_creation_input_tokens", None)),
+            _count(getattr(usage, "cache_read_input_tokens", None)),
+        )
 
-            if callback:
-                callback.on_response(response)
-
-            # Track token usage
-            if hasattr(response, "usage") and response.usage:
-                total_input_tokens += response.usage.input_tokens
-                total_output_tokens += response.usage.output_tokens
-
-            # Process the response
-            assistant_message = {
-                "role": "assistant",
-                "content": response.content
-            }
-            chat_messages.append(assistant_message)
-
-            has_tool_calls = False
-            text_content = []
-
-            for block in response.content:
-                if block.type == "text":
-                    text_content.append(block.text)
-                    if callback:
-                        callback.on_message(block.text)
-
-                elif block.type == "tool_use":
-                    has_tool_calls = True
-                    function_call = ResponseFunctionToolCall(
-                        type="function_call",
-                        name=block.name,
-                        arguments=json.dumps(block.input),
-                        call_id=block.id,
-                    )
-
-                    call_result = self.tools.function_call(function_call)
-                    result_output = _get_tool_call_output(call_result)
-
-                    # Anthropic expects tool results in a user message with tool_result blocks
-                    tool_result_message = {
-                        "role": "tool",
-                        "tool_call_id": block.id,
-                        "content": result_output
-                    }
-                    chat_messages.append(tool_result_message)
-
-                    if callback:
-                        callback.on_function_call(function_call, result_output)
+    def _process_response(
+        self, response, chat_messages: list, callback: RunnerCallback = None
+    ) -> list:
+        assistant_message = {
+            "role": "assistant",
+            "content": response.content
+        }
+        chat_messages.append(assistant_message)
 
-            if not has_tool_calls:
-                break
+        function_calls = []
 
-        cost_info = self.pricing_config.calculate_cost(
-            self.llm_client.model, total_input_tokens, total_output_tokens
-        )
+        for block in response.content:
+            if block.type == "text":
+                if callback:
+                    callback.on_message(block.text)
 
-        token_usage = TokenUsage(
-            model=self.llm_client.model,
-            input_tokens=total_input_tokens,
-            output_tokens=total_output_tokens,
-        )
+            elif block.type == "tool_use":
+                function_call = ResponseFunctionToolCall.model_construct(
+                    type="function_call",
+                    name=block.name,
+                    arguments=json.dumps(block.input),
+                    call_id=block.id,
+                )
+                function_calls.append(function_call)
 
-        new_messages = chat_messages[prev_messages_len:]
+        return function_calls
 
-        # Extract last message text
-        last_message_text = ""
-        last_message = None
-        if text_content:
-            last_message_text = "".join(text_content)
-            if output_format:
-                last_message = output_format.model_validate_json(last_message_text)
-            else:
-                last_message = last_message_text
-
-        return LoopResult(
-            new_messages=new_messages,
-            all_messages=chat_messages,
-            tokens=token_usage,
-            cost=cost_info,
-            last_message=last_message,
-        )
+    def _add_function_call_output(
+        self,
+        function_call,
+        call_result,
+        chat_messages: list,
+        callback: RunnerCallback = None,
+    ):
+        result_output = _get_tool_call_output(call_result)
+
+        # Anthropic expects tool results in a user message with tool_result blocks,
+        # AnthropicClient converts this message when sending the request
+        tool_result_message = {
+            "role": "tool",
+            "tool_call_id": function_call.call_id,
+            "content": result_output
+        }
+        chat_messages.append(tool_result_message)
+
+        if callback:
+            callback.on_function_call(function_call, result_output)
+
+        return result_output
+
+    def _get_last_message_text(self, response) -> str | None:
+        text_content = [
+            block.text for block in response.content if block.type == "text"
+        ]
+        if not text_content:
+            return None
+        return "".join(text_content)
+
+    def _create_stream_accumulator(self) -> StreamAccumulator:
+        return AnthropicStreamAccumulator()
@@ -0,0 +1,347 @@
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+from openai.types.responses.response_function_tool_call import ResponseFunctionToolCall
+
+
+class StreamEvent:
+    """Base class for the events yielded by the runners' stream_loop()."""
+
+
+@dataclass
+class TextDeltaEvent(StreamEvent):
+    text: str
+
+
+@dataclass
+class ReasoningDeltaEvent(StreamEvent):
+    text: str
+
+
+@dataclass
+class ToolCallStartedEvent(StreamEvent):
+    call_id: str
+    name: str
+
+
+@dataclass
+class ToolCallFinishedEvent(StreamEvent):
+    function_call: Any
+    result: str
+
+
+@dataclass
+class UsageEvent(StreamEvent):
+    """Token usage of one request of the tool-call loop."""
+
+    input_tokens: int
+    output_tokens: int
+
+
+@dataclass
+class LoopCompletedEvent(StreamEvent):
+    """Last event of a stream, carries the same LoopResult as loop()."""
+
+    result: Any
+
+
+class StreamAccumulator:
+    """
+    Turns the raw events of a provider stream into StreamEvents and
+    rebuilds the complete response, so the runners can process a
+    streamed response exactly like a regular one.
+
+    Function calls whose arguments are fully received are collected in
+    completed_calls while the stream is still going, so the runner can
+    start executing them before the model finishes the turn.
+    """
+
+    def __init__(self):
+        self.completed_calls = []
+
+    def pop_completed_calls(self) -> list:
+        """Return the function calls completed since the last call."""
+        completed_calls = self.completed_calls
+        self.completed_calls = []
+        return completed_calls
+
+    def add(self, raw_event) -> list[StreamEvent]:
+        """Consume one raw event and return the events to yield for it."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def get_response(self):
+        """Return the full response once the stream is over."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+
+class ResponsesStreamAccumulator(StreamAccumulator):
+    """Accumulates a streamed OpenAI Responses API call."""
+
+    def __init__(self):
+        super().__init__()
+        self.response = None
+
+    def add(self, raw_event) -> list[StreamEvent]:
+        event_type = raw_event.type
+
+        if event_type == "response.output_text.delta":
+            return [TextDeltaEvent(text=raw_event.delta)]
+
+        if event_type in (
+            "response.reasoning_summary_text.delta",
+            "response.reasoning_text.delta",
+        ):
+            return [ReasoningDeltaEvent(text=raw_event.delta)]
+
+        if event_type == "response.output_item.added":
+            item = raw_event.item
+            if item.type == "function_call":
+                return [ToolCallStartedEvent(call_id=item.call_id, name=item.name)]
+
+        elif event_type == "response.output_item.done":
+            if raw_event.item.type == "function_call":
+                self.completed_calls.append(raw_event.item)
+
+        elif event_type in ("response.completed", "response.incomplete"):
+            self.response = raw_event.response
+
+        elif event_type == "response.failed":
+            error = raw_event.response.error
+            raise RuntimeError(f"Response failed: {error}")
+
+        elif event_type == "error":
+            raise RuntimeError(f"Stream error: {raw_event.message}")
+
+        return []
+
+    def get_response(self):
+        if self.response is None:
+            raise RuntimeError("Stream ended before the response was completed")
+        return self.response
+
+
+class ChatCompletionsStreamAccumulator(StreamAccumulator):
+    """Accumulates streamed Chat Completions chunks into a ChatCompletion."""
+
+    def __init__(self):
+        super().__init__()
+        self.id = None
+        self.created = None
+        self.model = None
+        self.content = []
+        self.tool_calls = {}
+        self.finish_reason = None
+        self.usage = None
+
+    def add(self, raw_event) -> list[StreamEvent]:
+        events = []
+
+        if self.id is None:
+            self.id = raw_event.id
+            self.created = raw_event.created
+            self.model = raw_event.model
+
+        # With stream_options={"include_usage": True} the last chunk
+        # has the usage and no choices
+        if raw_event.usage is not None:
+            self.usage = raw_event.usage
+
+        if not raw_event.choices:
+            return events
+
+        choice = raw_event.choices[0]
+        delta = choice.delta
+
+        if choice.finish_reason is not None:
+            self.finish_reason = choice.finish_reason
+
+        reasoning = getattr(delta, "reasoning_content", None)
+        if reasoning:
+            events.append(ReasoningDeltaEvent(text=reasoning))
+
+        if delta.content:
+            self.content.append(delta.content)
+            events.append(TextDeltaEvent(text=delta.content))
+
+        for tool_call in delta.tool_calls or []:
+            call = self.tool_calls.get(tool_call.index)
+            if call is None:
+                # The calls are streamed one after another, so a new
+                # index means the arguments of the earlier ones are complete
+                self._complete_calls()
+                call = {"id": tool_call.id, "name": "", "arguments": []}
+                self.tool_calls[tool_call.index] = call
+
+            function = tool_call.function
+            if function is not None:
+                if function.name:
+                    call["name"] = function.name
+                    events.append(
+                        ToolCallStartedEvent(call_id=call["id"], name=function.name)
+                    )
+                if function.arguments:
+                    call["arguments"].append(function.arguments)
+
+        if choice.finish_reason is not None:
+            self._complete_calls()
+
+        return events
+
+    def _complete_calls(self):
+        for call in self.tool_calls.values():
+            if call.get("completed"):
+                continue
+            call["completed"] = True
+            self.completed_calls.append(
+                ResponseFunctionToolCall(
+                    type="function_call",
+                    name=call["name"],
+                    arguments="".join(call["arguments"]),
+                    call_id=call["id"],
+                )
+            )
+
+    def get_response(self) -> ChatCompletion:
+        tool_calls = None
+        if self.tool_calls:
+            tool_calls = [
+                ChatCompletionMessageToolCall(
+                    id=call["id"],
+                    type="function",
+                    function=Function(
+                        name=call["name"],
+                        arguments="".join(call["arguments"]),
+                    ),
+                )
+                for _, call in sorted(self.tool_calls.items())
+            ]
+
+        content = "".join(self.content) if self.content else None
+
+        message = ChatCompletionMessage(
+            role="assistant",
+            content=content,
+            tool_calls=tool_calls,
+        )
+
+        return ChatCompletion(
+            id=self.id or "",
+            object="chat.completion",
+            created=self.created or 0,
+            model=self.model or "",
+            choices=[
+                Choice(
+                    index=0,
+                    message=message,
+                    finish_reason=self.finish_reason or "stop",
+                )
+            ],
+            usage=self.usage,
+        )
+
+
+class AnthropicStreamAccumulator(StreamAccumulator):
+    """Accumulates the raw events of a streamed Anthropic Messages call."""
+
+    def __init__(self):
+        super().__init__()
+        self.message = None
+        self.blocks = {}
+        self.usage_update = {}
+        self.stop_reason = None
+        self.stop_sequence = None
+
+    def add(self, raw_event) -> list[StreamEvent]:
+        event_type = raw_event.type
+
+        if event_type == "message_start":
+            self.message = raw_event.message
+
+        elif event_type == "content_block_start":
+            block = raw_event.content_block
+            self.blocks[raw_event.index] = {"block": block, "parts": []}
+            if block.type == "tool_use":
+                return [ToolCallStartedEvent(call_id=block.id, name=block.name)]
+
+        elif event_type == "content_block_delta":
+            delta = raw_event.delta
+            state = self.blocks[raw_event.index]
+
+            if delta.type == "text_delta":
+                state["parts"].append(delta.text)
+                return [TextDeltaEvent(text=delta.text)]
+
+            if delta.type == "input_json_delta":
+                state["parts"].append(delta.partial_json)
+
+            elif delta.type == "thinking_delta":
+                state["parts"].append(delta.thinking)
+                return [ReasoningDeltaEvent(text=delta.thinking)]
+
+            elif delta.type == "signature_delta":
+                state["signature"] = delta.signature
+
+        elif event_type == "content_block_stop":
+            state = self.blocks[raw_event.index]
+            block = self._finish_block(state)
+            state["block"] = block
+
+            if block.type == "tool_use":
+                self.completed_calls.append(
+                    ResponseFunctionToolCall(
+                        type="function_call",
+                        name=block.name,
+                        arguments=json.dumps(block.input),
+                        call_id=block.id,
+                    )
+                )
+
+        elif event_type == "message_delta":
+            self.stop_reason = raw_event.delta.stop_reason
+            self.stop_sequence = raw_event.delta.stop_sequence
+            usage = raw_event.usage.model_dump(exclude_none=True)
+            self.usage_update.update(usage)
+
+        return []
+
+    def _finish_block(self, state):
+        block = state["block"]
+        text = "".join(state["parts"])
+
+        if block.type == "text":
+            return block.model_copy(update={"text": block.text + text})
+
+        if block.type == "tool_use":
+            tool_input = json.loads(text) if text else block.input
+            return block.model_copy(update={"input": tool_input})
+
+        if block.type == "thinking":
+            update = {"thinking": block.thinking + text}
+            if "signature" in state:
+                update["signature"] = state["signature"]
+            return block.model_copy(update=update)
+
+        return block
+
+    def get_response(self):
+        if self.message is None:
+            raise RuntimeError("Stream ended before the message was started")
+
+        content = [self.blocks[index]["block"] for index in sorted(self.blocks)]
+        usage = self.message.usage.model_copy(update=self.usage_update)
+
+        return self.message.model_copy(
+            update={
+                "content": content,
+                "usage": usage,
+                "stop_reason": self.stop_reason,
+                "stop_sequence": self.stop_sequence,
+            }
+        )
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass
+
+import httpx
+
+OPENAI = "openai"
+ANTHROPIC = "anthropic"
+
+
+@dataclass(frozen=True)
+class ConnectionSettings:
+    """
+    Connection pool and timeouts of the shared HTTP clients.
+
+    Args:
+        max_connections: Open connections per client
+        max_keepalive_connections: Idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Use HTTP/2 (needs 'pip install httpx[http2]')
+        timeout: Seconds a request may take
+        connect_timeout: Seconds to establish a connection
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    http2: bool = False
+    timeout: float = 600.0
+    connect_timeout: float = 5.0
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def httpx_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+def _sdk(provider: str):
+    if provider == OPENAI:
+        import openai
+
+        return openai
+
+    try:
+        import anthropic
+    except ImportError:
+        raise ImportError("Please run 'pip install anthropic' to use AnthropicClient")
+    return anthropic
+
+
+class ClientRegistry:
+    """
+    SDK clients (OpenAI, Anthropic) shared by the LLM clients, one per
+    provider, base_url and api_key, so they reuse the open connections of
+    one pool instead of each doing their own TCP and TLS handshakes.
+
+    Async clients are bound to the event loop that uses them: they are
+    shared within the running event loop, and not shared when created
+    outside of one.
+
+    Usage:
+        registry = ClientRegistry(ConnectionSettings(max_connections=50))
+        llm_client = OpenAIClient(client=registry.openai())
+    """
+
+    def __init__(self, settings: ConnectionSettings = None):
+        self.settings = settings or ConnectionSettings()
+
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def openai(self, api_key: str = None, base_url: str = None):
+        """Shared OpenAI client."""
+        return self._get(OPENAI, False, api_key, base_url)
+
+    def anthropic(self, api_key: str = None, base_url: str = None):
+        """Shared Anthropic client."""
+        return self._get(ANTHROPIC, False, api_key, base_url)
+
+    def async_openai(self, api_key: str = None, base_url: str = None):
+        """Shared AsyncOpenAI client of the running event loop."""
+        return self._get(OPENAI, True, api_key, base_url)
+
+    def async_anthropic(self, api_key: str = None, base_url: str = None):
+        """Shared AsyncAnthropic client of the running event loop."""
+        return self._get(ANTHROPIC, True, api_key, base_url)
+
+    def _get(self, provider: str, is_async: bool, api_key: str, base_url: str):
+        key = (provider, base_url, api_key)
+
+        if not is_async:
+            clients = self._clients
+        else:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return self._create(provider, True, api_key, base_url)
+            with self._lock:
+                clients = self._async_clients.setdefault(loop, {})
+
+        with self._lock:
+            client = clients.get(key)
+            if client is None:
+                client = self._create(provider, is_async, api_key, base_url)
+                clients[key] = client
+            return client
+
+    def _create(self, provider: str, is_async: bool, api_key: str, base_url: str):
+        sdk = _sdk(provider)
+        settings = self.settings
+
+        if provider == OPENAI:
+            client_class = sdk.AsyncOpenAI if is_async else sdk.OpenAI
+        else:
+            client_class = sdk.AsyncAnthropic if is_async else sdk.Anthropic
+        http_client_class = (
+            sdk.DefaultAsyncHttpxClient if is_async else sdk.DefaultHttpxClient
+        )
+
+        client_kwargs = {}
+        if api_key is not None:
+            client_kwargs["api_key"] = api_key
+        if base_url is not None:
+            client_kwargs["base_url"] = base_url
+
+        return client_class(
+            timeout=settings.httpx_timeout,
+            http_client=http_client_class(
+                limits=settings.limits,
+                http2=settings.http2,
+                timeout=settings.httpx_timeout,
+            ),
+            **client_kwargs,
+        )
+
+    def close(self):
+        """Close the connections of the synchronous clients and forget all
+        clients."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = {}
+            self._async_clients = weakref.WeakKeyDictionary()
+
+        for client in clients:
+            client.close()
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def share_connections(settings: ConnectionSettings = None, **kwargs) -> ClientRegistry:
+    """
+    Make the LLM clients (and toyaikit.main.init) created without an
+    explicit client use SDK clients from one process-wide ClientRegistry.
+
+    Settings are given as a ConnectionSettings or as its fields. Calling
+    it again replaces the registry, LLM clients created before keep their
+    SDK clients.
+
+    Usage:
+        share_connections(max_connections=200, http2=True)
+    """
+    global _shared_registry
+
+    if settings is None:
+        settings = ConnectionSettings(**kwargs)
+    elif kwargs:
+        raise ValueError("Pass either settings or its fields, not both")
+
+    registry = ClientRegistry(settings)
+    with _shared_lock:
+        _shared_registry = registry
+    return registry
+
+
+def stop_sharing_connections():
+    """
+    New LLM clients create their own SDK clients again. The registry isn't
+    closed, since clients created before may still use it: call its
+    close() when they are done.
+    """
+    global _shared_registry
+
+    with _shared_lock:
+        _shared_registry = None
+
+
+def get_shared_registry() -> ClientRegistry | None:
+    """The process-wide ClientRegistry, None unless share_connections was
+    called."""
+    return _shared_registry
@@ -0,0 +1,91 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+# Why a loop stopped before the model gave its final answer
+DEADLINE = "deadline"
+CANCELLED = "cancelled"
+MAX_ITERATIONS = "max_iterations"
+
+# Deadline of the loop sending the current request, read by the clients
+_current_deadline: ContextVar["Deadline | None"] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request can't be sent before the deadline of its loop."""
+
+
+class Deadline:
+    """
+    The time by which a tool-call loop has to finish.
+
+    Pass it (or the number of seconds) as the deadline of loop() or
+    aloop(). One Deadline can be shared by several loops, e.g. all loops
+    serving one request.
+    """
+
+    def __init__(self, timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + timeout
+
+    @classmethod
+    def coerce(cls, deadline: "Deadline | float | None") -> "Deadline | None":
+        """A Deadline from a Deadline, a number of seconds or None."""
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self) -> float:
+        """Seconds left, 0 once expired."""
+        return max(self.expires_at - self.clock(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation of tool-call loops: after cancel(), a loop
+    using the token stops before its next request. Thread-safe.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None):
+    """Make deadline the deadline of the requests sent inside the block."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def request_timeout() -> float | None:
+    """Seconds left for a request of the current loop, None without a
+    deadline."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline.remaining()
+
+
+def is_deadline_error(error: BaseException) -> bool:
+    """True if error is due to the deadline of the current loop: it's a
+    DeadlineExceeded, or the deadline has passed when it was raised."""
+    if isinstance(error, DeadlineExceeded):
+        return True
+    deadline = _current_deadline.get()
+    return deadline is not None and deadline.expired
@@ -0,0 +1,294 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Sequence
+
+from toyaikit.deadlines import is_deadline_error
+from toyaikit.formats import convert_messages, convert_response, get_message_format
+from toyaikit.llm import AsyncLLMClient, LLMClient, report_model
+from toyaikit.tools import Tools
+
+# Errors about the request itself, another backend would reject it as well
+NON_FAILOVER_STATUS_CODES = {400, 413, 422}
+
+
+class NoBackendAvailableError(RuntimeError):
+    """All circuits of a FailoverClient are open."""
+
+
+def is_failover_error(error: Exception) -> bool:
+    """True if the request may succeed on another backend after error."""
+    return getattr(error, "status_code", None) not in NON_FAILOVER_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Health of a backend: an exponentially weighted error rate and latency.
+
+    The circuit opens after failure_threshold consecutive failures, or
+    when the error rate reaches max_error_rate after min_requests. An open
+    circuit rejects requests for cooldown seconds, then lets one trial
+    request through (half-open): a success closes it, a failure opens it
+    again.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        max_error_rate: Error rate that opens the circuit
+        min_requests: Requests before the error rate is taken into account
+        cooldown: Seconds an open circuit rejects requests
+        slow_latency: Latency above which the backend counts as degraded,
+            None to ignore latency
+        alpha: Weight of the newest request in the averages
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        max_error_rate: float = 0.5,
+        min_requests: int = 10,
+        cooldown: float = 30.0,
+        slow_latency: float = None,
+        alpha: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.slow_latency = slow_latency
+        self.alpha = alpha
+        self.clock = clock
+
+        self.state = self.CLOSED
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.error_rate = 0.0
+        self.latency = None
+
+        self._opened_at = None
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_slow(self) -> bool:
+        return (
+            self.slow_latency is not None
+            and self.latency is not None
+            and self.latency > self.slow_latency
+        )
+
+    def allow_request(self) -> bool:
+        """True if a request may be sent to the backend now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            now = self.clock()
+            # A trial that never reported back doesn't block the circuit
+            started_at = (
+                self._opened_at if self.state == self.OPEN else self._trial_started_at
+            )
+            if now - started_at < self.cooldown:
+                return False
+
+            self.state = self.HALF_OPEN
+            self._trial_started_at = now
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.error_rate *= 1 - self.alpha
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures += 1
+            self.error_rate += self.alpha * (1 - self.error_rate)
+
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or (
+                    self.requests >= self.min_requests
+                    and self.error_rate >= self.max_error_rate
+                )
+            ):
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+
+@dataclass
+class Backend:
+    client: LLMClient
+    message_format: str
+    circuit: CircuitBreaker
+
+
+class FailoverClient(LLMClient):
+    """
+    Sends each request to the first healthy client of an ordered list.
+
+    The clients may use different APIs: the history is kept in the format
+    of the first client (the one the runner is made for), translated for
+    the client that gets the request, and its response is translated back
+    (see toyaikit.formats). Streamed requests and requests with extra
+    arguments (e.g. previous_response_id) only go to clients of the same
+    format.
+
+    Each client has a CircuitBreaker. Clients with an open circuit are
+    skipped, degraded (slow) ones are tried after the others. When a
+    request fails with an error another client may not have (timeouts,
+    connection errors, rate limits, server errors), the next client is
+    tried. If all fail the last error is raised, if all circuits are open
+    NoBackendAvailableError.
+
+    model is the model of the client that answered the last request.
+
+    Usage:
+        llm_client = FailoverClient(
+            [
+                OpenAIClient(model="gpt-4o-mini"),
+                AnthropicClient(model="claude-haiku-4-5"),
+            ],
+            cooldown=60,
+        )
+        runner = OpenAIResponsesRunner(tools=tools, llm_client=llm_client)
+
+    Args:
+        clients: Clients in order of preference
+        formats: Message formats of the clients, detected if not given
+        circuit_factory: Creates the CircuitBreaker of a client, the
+            remaining keyword arguments are passed to it
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[LLMClient],
+        formats: Sequence[str] = None,
+        circuit_factory: Callable[..., CircuitBreaker] = CircuitBreaker,
+        **circuit_kwargs,
+    ):
+        if not clients:
+            raise ValueError("FailoverClient needs at least one client")
+
+        if formats is None:
+            formats = [get_message_format(client) for client in clients]
+
+        self.backends = [
+            Backend(client, message_format, circuit_factory(**circuit_kwargs))
+            for client, message_format in zip(clients, formats)
+        ]
+        self.message_format = self.backends[0].message_format
+        self.last_backend = self.backends[0]
+
+    @property
+    def model(self) -> str:
+        return self.last_backend.client.model
+
+    def _candidates(self, kwargs: dict):
+        same_format_only = bool(set(kwargs) - {"output_format"})
+        eligible = [
+            backend
+            for backend in self.backends
+            if not same_format_only or backend.message_format == self.message_format
+        ]
+
+        ordered = [b for b in eligible if not b.circuit.is_slow]
+        ordered += [b for b in eligible if b.circuit.is_slow]
+
+        for backend in ordered:
+            if backend.circuit.allow_request():
+                yield backend
+
+    def _translate_request(self, backend: Backend, chat_messages: List) -> List:
+        return convert_messages(
+            chat_messages, self.message_format, backend.message_format
+        )
+
+    def _translate_response(self, backend: Backend, response):
+        self.last_backend = backend
+        report_model(getattr(backend.client, "model", None))
+        return convert_response(response, backend.message_format, self.message_format)
+
+    def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        kwargs = {k: v for k, v in kwargs.items() if v is not None and v is not False}
+        error = None
+
+        for backend in self._candidates(kwargs):
+            started_at = time.monotonic()
+            try:
+                response = backend.client.send_request(
+                    chat_messages=self._translate_request(backend, chat_messages),
+                    tools=tools,
+                    **kwargs,
+                )
+            except Exception as e:
+                # Out of time: not the backend's fault, and no time to fail over
+                if is_deadline_error(e):
+                    raise
+                if not is_failover_error(e):
+                    backend.circuit.record_success(time.monotonic() - started_at)
+                    raise
+                backend.circuit.record_failure()
+                error = e
+                continue
+
+            backend.circuit.record_success(time.monotonic() - started_at)
+            return self._translate_response(backend, response)
+
+        if error is not None:
+            raise error
+        raise NoBackendAvailableError("All backends of the FailoverClient are down")
+
+
+class AsyncFailoverClient(FailoverClient, AsyncLLMClient):
+    """FailoverClient for AsyncLLMClients. Synchronous clients in the list
+    are called in a worker thread."""
+
+    async def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        kwargs = {k: v for k, v in kwargs.items() if v is not None and v is not False}
+        error = None
+
+        for backend in self._candidates(kwargs):
+            send_request = backend.client.send_request
+            if not inspect.iscoroutinefunction(send_request):
+                send_request = functools.partial(asyncio.to_thread, send_request)
+
+            started_at = time.monotonic()
+            try:
+                response = await send_request(
+                    chat_messages=self._translate_request(backend, chat_messages),
+                    tools=tools,
+                    **kwargs,
+                )
+            except Exception as e:
+                # Out of time: not the backend's fault, and no time to fail over
+                if is_deadline_error(e):
+                    raise
+                if not is_failover_error(e):
+                    backend.circuit.record_success(time.monotonic() - started_at)
+                    raise
+                backend.circuit.record_failure()
+                error = e
+                continue
+
+            backend.circuit.record_success(time.monotonic() - started_at)
+            return self._translate_response(backend, response)
+
+        if error is not None:
+            raise error
+        raise NoBackendAvailableError("All backends of the FailoverClient are down")
@@ -0,0 +1,227 @@
+import json
+import time
+import uuid
+from typing import List
+
+from anthropic.types import Message
+from openai.types.chat import ChatCompletion
+from openai.types.responses import Response
+from pydantic import BaseModel
+
+from toyaikit.chat.messages import (
+    ANTHROPIC,
+    CHAT_COMPLETIONS,
+    MESSAGE_FORMATS,
+    RESPONSES,
+    ChatMessage,
+    decode_messages,
+    encode_messages,
+    get_chat_messages,
+)
+from toyaikit.llm import (
+    AnthropicClient,
+    LLMClient,
+    OpenAIChatCompletionsClient,
+    OpenAIClient,
+)
+
+_CLIENT_FORMATS = [
+    (OpenAIClient, RESPONSES),
+    (OpenAIChatCompletionsClient, CHAT_COMPLETIONS),
+    (AnthropicClient, ANTHROPIC),
+]
+
+
+def get_message_format(client: LLMClient) -> str:
+    """
+    Message format of a client. Wrappers (CachedClient, RateLimitedClient,
+    ...) have the format of the client they wrap.
+    """
+    while True:
+        for client_class, message_format in _CLIENT_FORMATS:
+            if isinstance(client, client_class):
+                return message_format
+
+        inner = getattr(client, "client", None)
+        if not isinstance(inner, LLMClient):
+            raise ValueError(
+                f"Unknown message format of {type(client).__name__}, "
+                f"pass it explicitly (one of {', '.join(MESSAGE_FORMATS)})"
+            )
+        client = inner
+
+
+def convert_messages(messages: List, source: str, target: str) -> List:
+    """
+    Translate a history from the source to the target message format, so
+    a runner's history can be sent to a client of another API.
+
+    The history goes through ChatMessages (see toyaikit.chat.messages):
+    only text, function calls and their outputs are kept. For a
+    Conversation, the converted messages are kept and only new messages
+    are converted on the next call.
+    """
+    if source == target:
+        return messages
+    return encode_messages(get_chat_messages(messages, source), target)
+
+
+def _response_message(response, source: str) -> ChatMessage:
+    if source == RESPONSES:
+        chat_messages = decode_messages(response.output, RESPONSES)
+    elif source == CHAT_COMPLETIONS:
+        chat_messages = decode_messages([response.choices[0].message], source)
+    else:
+        chat_messages = decode_messages(
+            [{"role": "assistant", "content": response.content}], ANTHROPIC
+        )
+
+    texts = [m.text for m in chat_messages if m.text]
+    tool_calls = [call for m in chat_messages for call in m.tool_calls]
+    return ChatMessage(
+        "assistant", "".join(texts) if texts else None, tool_calls=tool_calls
+    )
+
+
+def get_response_usage(response, source: str) -> tuple[int, int]:
+    """Input and output tokens of a response in the source format. Input
+    tokens include the tokens written to and read from the prompt cache."""
+    usage = response.usage
+    if usage is None:
+        return 0, 0
+
+    if source == RESPONSES:
+        return usage.input_tokens, usage.output_tokens
+    if source == CHAT_COMPLETIONS:
+        return usage.prompt_tokens, usage.completion_tokens
+
+    input_tokens = (
+        usage.input_tokens
+        + (usage.cache_creation_input_tokens or 0)
+        + (usage.cache_read_input_tokens or 0)
+    )
+    return input_tokens, usage.output_tokens
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}{uuid.uuid4().hex}"
+
+
+def _build_response(model, message: ChatMessage, input_tokens, output_tokens):
+    output = []
+    if message.text is not None:
+        output.append(
+            {
+                "id": _new_id("msg_"),
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [
+                    {"type": "output_text", "text": message.text, "annotations": []}
+                ],
+            }
+        )
+    for call in message.tool_calls:
+        output.append(
+            {
+                "type": "function_call",
+                "call_id": call.id,
+                "name": call.name,
+                "arguments": call.arguments,
+                "status": "completed",
+            }
+        )
+
+    return Response.model_validate(
+        {
+            "id": _new_id("resp_"),
+            "object": "response",
+            "created_at": time.time(),
+            "model": model,
+            "output": output,
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+    )
+
+
+def _build_chat_completion(model, message: ChatMessage, input_tokens, output_tokens):
+    (encoded,) = message.encode(CHAT_COMPLETIONS)
+    return ChatCompletion.model_validate(
+        {
+            "id": _new_id("chatcmpl-"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if message.tool_calls else "stop",
+                    "message": encoded,
+                }
+            ],
+            "usage": {
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+    )
+
+
+def _build_message(model, message: ChatMessage, input_tokens, output_tokens):
+    content = []
+    if message.text is not None:
+        content.append({"type": "text", "text": message.text})
+    for call in message.tool_calls:
+        content.append(
+            {
+                "type": "tool_use",
+                "id": call.id,
+                "name": call.name,
+                "input": json.loads(call.arguments or "{}"),
+            }
+        )
+
+    return Message.model_validate(
+        {
+            "id": _new_id("msg_"),
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": content,
+            "stop_reason": "tool_use" if message.tool_calls else "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+    )
+
+
+_BUILDERS = {
+    RESPONSES: _build_response,
+    CHAT_COMPLETIONS: _build_chat_completion,
+    ANTHROPIC: _build_message,
+}
+
+
+def convert_response(response: BaseModel, source: str, target: str) -> BaseModel:
+    """
+    Translate a response of the source API into a response of the target
+    API: the text, the function calls and the token usage.
+    """
+    if source == target:
+        return response
+
+    return _BUILDERS[target](
+        response.model,
+        _response_message(response, source),
+        *get_response_usage(response, source),
+    )
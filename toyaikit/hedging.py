@@ -0,0 +1,276 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List
+
+from toyaikit.llm import AsyncLLMClient, LLMClient, report_model
+from toyaikit.pricing import CostInfo, TokenUsage, UsageByModel
+from toyaikit.tools import Tools
+
+# Outcomes of the hedges fired in the current context, see collect_hedges()
+_hedge_outcomes: contextvars.ContextVar[list | None] = contextvars.ContextVar(
+    "hedge_outcomes", default=None
+)
+
+
+@dataclass
+class HedgeOutcome:
+    """A hedged request: won is True if the backup request answered first."""
+
+    won: bool
+
+
+@dataclass
+class HedgeReport:
+    """
+    Hedged requests of a loop. Each hedge sends the request a second
+    time; extra_tokens estimates what the duplicates cost as the usage of
+    the responses that were hedged, extra_tokens_by_model by the model
+    that answered.
+    """
+
+    fired: int = 0
+    won: int = 0
+    extra_tokens: TokenUsage = None
+    extra_cost: CostInfo | None = None
+    extra_tokens_by_model: UsageByModel = field(default_factory=UsageByModel)
+
+
+@contextmanager
+def collect_hedges() -> Iterator[list[HedgeOutcome]]:
+    """Collect the HedgeOutcomes of the requests sent inside the block."""
+    outcomes = []
+    token = _hedge_outcomes.set(outcomes)
+    try:
+        yield outcomes
+    finally:
+        _hedge_outcomes.reset(token)
+
+
+def _record_outcome(won: bool):
+    outcomes = _hedge_outcomes.get()
+    if outcomes is not None:
+        outcomes.append(HedgeOutcome(won=won))
+
+
+class HedgingClient(LLMClient):
+    """
+    Wraps an LLMClient and sends a backup request when the first one is
+    slow, using whichever answers first.
+
+    The backup is sent when the request hasn't answered after delay
+    seconds. Without a fixed delay, it's the given percentile of the
+    latencies of the last `window` requests (initial_delay until
+    min_samples are known), so only the slowest requests are hedged. The
+    backup goes to hedge_client if given (e.g. another region or
+    provider), otherwise to the same client.
+
+    The request that loses is cancelled. A synchronous request can't be
+    interrupted, so it finishes in the background and its response is
+    dropped. Streamed requests are not hedged.
+
+    Each synchronous request runs in a thread of its own, so the client
+    doesn't limit how many requests are in flight; the backups run in
+    executor. The delay and the latencies are measured from the moment
+    the request starts, and only the requests to client are counted in
+    the latencies, whether they won or not.
+
+    hedges_fired and hedges_won count the hedges of the client, and the
+    runners report the hedges of a loop in LoopResult.hedges.
+
+    Usage:
+        llm_client = HedgingClient(OpenAIClient(), percentile=0.95)
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        hedge_client: LLMClient = None,
+        delay: float = None,
+        percentile: float = 0.95,
+        initial_delay: float = 10.0,
+        min_samples: int = 20,
+        window: int = 200,
+        executor: Executor = None,
+    ):
+        self.client = client
+        self.hedge_client = hedge_client or client
+        self.delay = delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.executor = executor
+
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    def get_delay(self) -> float:
+        """Seconds to wait for a request before sending the backup."""
+        if self.delay is not None:
+            return self.delay
+
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = sorted(self._latencies)
+
+        index = max(math.ceil(self.percentile * len(latencies)) - 1, 0)
+        return latencies[index]
+
+    def _record_latency(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _record_hedge(self, won: bool):
+        with self._lock:
+            self.hedges_fired += 1
+            if won:
+                self.hedges_won += 1
+        _record_outcome(won)
+
+    @staticmethod
+    def _answered(client: LLMClient, response):
+        report_model(getattr(client, "model", None))
+        return response
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            with self._lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(
+                        thread_name_prefix="toyaikit-hedge"
+                    )
+        return self.executor
+
+    def _submit(self, client: LLMClient, kwargs: dict):
+        # Run in a copy of the context, so context variables (e.g. the rate
+        # limit key) are seen by the request
+        context = contextvars.copy_context()
+        return self._get_executor().submit(context.run, client.send_request, **kwargs)
+
+    def _start_primary(self, kwargs: dict) -> Future:
+        """Send the request to client in a new thread; returns once it's
+        started."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        context = contextvars.copy_context()
+
+        def run():
+            started_at = time.monotonic()
+            try:
+                response = context.run(self.client.send_request, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            self._record_latency(time.monotonic() - started_at)
+            future.set_result(response)
+
+        threading.Thread(target=run, name="toyaikit-hedge", daemon=True).start()
+        return future
+
+    def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        kwargs = dict(kwargs, chat_messages=chat_messages, tools=tools)
+        if kwargs.get("stream"):
+            return self.client.send_request(**kwargs)
+
+        primary = self._start_primary(kwargs)
+
+        done, _ = wait([primary], timeout=self.get_delay())
+        if done:
+            return self._answered(self.client, primary.result())
+
+        backup = self._submit(self.hedge_client, kwargs)
+        pending = {primary, backup}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (primary, backup):
+                if future not in done:
+                    continue
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+
+                for other in pending:
+                    other.cancel()
+                self._record_hedge(won=future is backup)
+                client = self.hedge_client if future is backup else self.client
+                return self._answered(client, future.result())
+
+        self._record_hedge(won=False)
+        raise error
+
+
+class AsyncHedgingClient(HedgingClient, AsyncLLMClient):
+    """HedgingClient for AsyncLLMClients, the losing request is cancelled."""
+
+    async def _timed_primary(self, kwargs: dict):
+        started_at = time.monotonic()
+        try:
+            response = await self.client.send_request(**kwargs)
+        except asyncio.CancelledError:
+            # It lost to the backup: it would have taken at least this long
+            self._record_latency(time.monotonic() - started_at)
+            raise
+        self._record_latency(time.monotonic() - started_at)
+        return response
+
+    async def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        kwargs = dict(kwargs, chat_messages=chat_messages, tools=tools)
+        if kwargs.get("stream"):
+            return await self.client.send_request(**kwargs)
+
+        primary = asyncio.ensure_future(self._timed_primary(kwargs))
+        tasks = [primary]
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.get_delay())
+            if done:
+                return self._answered(self.client, primary.result())
+
+            backup = asyncio.ensure_future(self.hedge_client.send_request(**kwargs))
+            tasks.append(backup)
+            pending = set(tasks)
+            error = None
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in tasks:
+                    if task not in done:
+                        continue
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+
+                    self._record_hedge(won=task is backup)
+                    client = self.hedge_client if task is backup else self.client
+                    return self._answered(client, task.result())
+
+            self._record_hedge(won=False)
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
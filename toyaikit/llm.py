@@ -1,6 +1,8 @@
-from typing import List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 
 from openai.types.chat.chat_completion import ChatCompletion
@@ -10,7 +12,110 @@ from openai.types.responses.parsed_response import ParsedResponse
 
 from anthropic.types import Message, RawMessageStopEvent
 
-from toyaikit.tools import Tools
+from toyaikit.connections import get_shared_registry
+from toyaikit.deadlines import request_timeout
+from toyaikit.raw import parse_raw_response
+from toyaikit.tools import Tools, convert_tools
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Models that answered the requests sent in the current context, see
+# collect_models()
+_answering_models: ContextVar[list | None] = ContextVar(
+    "answering_models", default=None
+)
+
+# Responses that were paid for but not returned, see collect_discarded()
+_discarded_responses: ContextVar[list | None] = ContextVar(
+    "discarded_responses", default=None
+)
+
+# Key of the converted messages in the state of a Conversation
+ANTHROPIC_MESSAGES_STATE = "anthropic_messages"
+
+
+def _check_stream_args(output_format: BaseModel = None):
+    if output_format is not None:
+        raise ValueError("Structured output (output_format) cannot be streamed")
+
+
+def _add_request_timeout(args: dict) -> dict:
+    # Within a loop with a deadline, the request may take the time left
+    timeout = request_timeout()
+    if timeout is not None:
+        configured = args.get("timeout")
+        if isinstance(configured, (int, float)):
+            timeout = min(timeout, configured)
+        args["timeout"] = timeout
+    return args
+
+
+def _client_for_request(client):
+    # The SDKs retry failed requests, each attempt with the whole timeout:
+    # within a loop with a deadline, leave it to the loop instead
+    if request_timeout() is None:
+        return client
+    return client.with_options(max_retries=0)
+
+
+@contextmanager
+def collect_models() -> Iterator[list[str]]:
+    """
+    Collect the models that answered the requests sent inside the block.
+
+    Clients that choose between models (RoutingClient, FailoverClient, ...)
+    report the model of the client that answered, the innermost client
+    first. Empty for plain clients, whose model is their model attribute.
+    """
+    models = []
+    token = _answering_models.set(models)
+    try:
+        yield models
+    finally:
+        _answering_models.reset(token)
+
+
+def report_model(model: str):
+    """Report the model that answered a request, see collect_models()."""
+    models = _answering_models.get()
+    if models is not None and model is not None:
+        models.append(model)
+
+
+@contextmanager
+def collect_discarded() -> Iterator[list[tuple]]:
+    """
+    Collect the (response, model) pairs of responses that clients received
+    inside the block but didn't return, e.g. a small-model answer that a
+    RoutingClient rejected. Their tokens are paid for all the same.
+    """
+    discarded = []
+    token = _discarded_responses.set(discarded)
+    try:
+        yield discarded
+    finally:
+        _discarded_responses.reset(token)
+
+
+def report_discarded(response, model: str):
+    """Report a response that won't be returned, see collect_discarded()."""
+    discarded = _discarded_responses.get()
+    if discarded is not None:
+        discarded.append((response, model))
+
+
+def _is_tool_result_message(message: dict) -> bool:
+    content = message["content"]
+    return (
+        message["role"] == "user"
+        and isinstance(content, list)
+        and bool(content)
+        and all(
+            isinstance(block, dict) and block.get("type") == "tool_result"
+            for block in content
+        )
+    )
 
 
 class LLMClient:
@@ -18,28 +123,41 @@ class LLMClient:
         raise NotImplementedError("Subclasses must implement this method")
 
 
+class AsyncLLMClient(LLMClient):
+    """Base class for clients whose send_request is a coroutine."""
+
+    async def send_request(self, chat_messages: List, tools: Tools = None):
+        raise NotImplementedError("Subclasses must implement this method")
+
+
 class OpenAIClient(LLMClient):
     def __init__(
         self,
         model: str = "gpt-4o-mini",
         client: OpenAI = None,
         extra_kwargs: dict = None,
+        raw_responses: bool = False,
     ):
         self.model = model
 
         if client is None:
-            self.client = OpenAI()
-        else:
-            self.client = client
+            registry = get_shared_registry()
+            client = registry.openai() if registry is not None else OpenAI()
+        self.client = client
 
         self.extra_kwargs = extra_kwargs or {}
+        # Return responses as RawObjects, skipping the SDK's models
+        self.raw_responses = raw_responses
 
-    def send_request(
+    def build_request_args(
         self,
         chat_messages: List,
         tools: Tools = None,
-        output_format: BaseModel = None,
-    ) -> Response | ParsedResponse:
+        previous_response_id: str = None,
+    ) -> dict:
+        """
+        Build the keyword arguments for responses.create / responses.parse.
+        """
         tools_list = []
 
         if tools is not None:
@@ -52,13 +170,44 @@ class OpenAIClient(LLMClient):
             **self.extra_kwargs,
         )
 
+        if previous_response_id is not None:
+            args["previous_response_id"] = previous_response_id
+
+        return _add_request_timeout(args)
+
+    def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+        previous_response_id: str = None,
+    ) -> Response | ParsedResponse:
+        """
+        Send a request to the Responses API.
+
+        With stream=True the raw stream of response events is returned
+        instead of the final response. With previous_response_id, the
+        request continues the conversation of a stored response and
+        chat_messages only needs the messages added since.
+        """
+        args = self.build_request_args(chat_messages, tools, previous_response_id)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            return client.responses.create(stream=True, **args)
+
         if output_format is not None:
-            return self.client.responses.parse(
+            return client.responses.parse(
                 text_format=output_format,
                 **args,
             )
 
-        return self.client.responses.create(**args)
+        if self.raw_responses:
+            return parse_raw_response(client.responses.with_raw_response.create(**args))
+
+        return client.responses.create(**args)
 
 
 class OpenAIChatCompletionsClient(LLMClient):
@@ -67,15 +216,18 @@ class OpenAIChatCompletionsClient(LLMClient):
         model: str = "gpt-4o-mini",
         client: OpenAI = None,
         extra_kwargs: dict = None,
+        raw_responses: bool = False,
     ):
         self.model = model
 
         if client is None:
-            self.client = OpenAI()
-        else:
-            self.client = client
+            registry = get_shared_registry()
+            client = registry.openai() if registry is not None else OpenAI()
+        self.client = client
 
         self.extra_kwargs = extra_kwargs or {}
+        # Return responses as RawObjects, skipping the SDK's models
+        self.raw_responses = raw_responses
 
     def convert_single_tool(self, tool, strict: bool = False):
         """
@@ -105,21 +257,25 @@ class OpenAIChatCompletionsClient(LLMClient):
 
         return chat_functions
 
-    def send_request(
+    def build_request_args(
         self,
         chat_messages: List,
         tools: Tools = None,
         output_format: BaseModel = None,
-    ) -> ChatCompletion | ParsedChatCompletion:
+    ) -> dict:
+        """
+        Build the keyword arguments for chat.completions.create / parse.
+        """
         tools_list = []
 
         if tools is not None:
-            tools_requests_format = tools.get_tools()
-
             strict = output_format is not None
-            tools_list = self.convert_api_tools_to_chat_functions(
-                tools_requests_format,
-                strict=strict,
+            tools_list = convert_tools(
+                tools,
+                (type(self), strict),
+                lambda api_tools: self.convert_api_tools_to_chat_functions(
+                    api_tools, strict=strict
+                ),
             )
 
         args = dict(
@@ -128,14 +284,41 @@ class OpenAIChatCompletionsClient(LLMClient):
             tools=tools_list,
             **self.extra_kwargs,
         )
+        return _add_request_timeout(args)
+
+    def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+    ) -> ChatCompletion | ParsedChatCompletion:
+        """
+        Send a request to the Chat Completions API.
+
+        With stream=True the raw stream of chunks is returned, the last
+        chunk carries the token usage.
+        """
+        args = self.build_request_args(chat_messages, tools, output_format)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            args.setdefault("stream_options", {"include_usage": True})
+            return client.chat.completions.create(stream=True, **args)
 
         if output_format is not None:
-            return self.client.chat.completions.parse(
+            return client.chat.completions.parse(
                 response_format=output_format,
                 **args,
             )
 
-        return self.client.chat.completions.create(**args)
+        if self.raw_responses:
+            return parse_raw_response(
+                client.chat.completions.with_raw_response.create(**args)
+            )
+
+        return client.chat.completions.create(**args)
 
 
 class AnthropicClient(LLMClient):
@@ -147,6 +330,8 @@ class AnthropicClient(LLMClient):
         api_key: str = None,
         base_url: str = None,
         extra_kwargs: dict = None,
+        prompt_caching: bool = False,
+        raw_responses: bool = False,
     ):
         """
         Initialize Anthropic client.
@@ -156,16 +341,15 @@ class AnthropicClient(LLMClient):
             api_key: Anthropic API key (uses ANTHROPIC_API_KEY env var if not provided)
             base_url: Optional base URL for compatible APIs (e.g., z.ai)
             extra_kwargs: Additional kwargs to pass to messages.create
+            prompt_caching: Mark the system prompt, the tools and the history
+                as cacheable (see add_cache_breakpoints)
+            raw_responses: Return responses as RawObjects parsed from the
+                JSON, without building the SDK's Message models
         """
-        try:
-            from anthropic import Anthropic
-        except ImportError:
-            raise ImportError(
-                "Please run 'pip install anthropic' to use AnthropicClient"
-            )
-
         self.model = model
         self.extra_kwargs = extra_kwargs or {}
+        self.prompt_caching = prompt_caching
+        self.raw_responses = raw_responses
 
         client_kwargs = {}
         if api_key is not None:
@@ -173,7 +357,21 @@ class AnthropicClient(LLMClient):
         if base_url is not None:
             client_kwargs["base_url"] = base_url
 
-        self.client = Anthropic(**client_kwargs)
+        self.client = self._create_client(**client_kwargs)
+
+    def _create_client(self, **client_kwargs):
+        registry = get_shared_registry()
+        if registry is not None:
+            return registry.anthropic(**client_kwargs)
+
+        try:
+            from anthropic import Anthropic
+        except ImportError:
+            raise ImportError(
+                "Please run 'pip install anthropic' to use AnthropicClient"
+            )
+
+        return Anthropic(**client_kwargs)
 
     def convert_openai_tool_to_anthropic(self, tool: dict) -> dict:
         """Convert OpenAI tool format to Anthropic tool format."""
@@ -183,14 +381,14 @@ class AnthropicClient(LLMClient):
             "input_schema": tool["parameters"],
         }
 
-    def send_request(
+    def build_request_args(
         self,
         chat_messages: List,
         tools: Tools = None,
         output_format: BaseModel = None,
-    ) -> Message:
+    ) -> dict:
         """
-        Send a request to Anthropic's Messages API.
+        Build the keyword arguments for messages.create.
 
         Args:
             chat_messages: List of message dictionaries with 'role' and 'content'
@@ -198,58 +396,28 @@ class AnthropicClient(LLMClient):
             output_format: Optional Pydantic BaseModel for structured output
 
         Returns:
-            Message response from Anthropic
+            dict with the arguments for the Messages API
         """
-        # Convert messages to Anthropic format
-        anthropic_messages = []
-        system_message = None
-
-        for msg in chat_messages:
-            role = msg.get("role")
-            content = msg.get("content")
-
-            if role == "system":
-                # Anthropic expects system message as a separate parameter
-                if isinstance(content, str):
-                    system_message = content
-                elif isinstance(content, list):
-                    # Handle list content (e.g., with cache_control)
-                    system_message = content
-            elif role in ("user", "assistant"):
-                anthropic_messages.append({
-                    "role": role,
-                    "content": content if isinstance(content, (str, list)) else str(content)
-                })
-            elif role == "tool":
-                # Convert tool response to user message format
-                # Anthropic expects tool results inside a user message with tool_use content
-                tool_id = msg.get("tool_call_id", "")
-                tool_output = content if isinstance(content, str) else str(content)
-                anthropic_messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_id,
-                            "content": tool_output
-                        }
-                    ]
-                })
+        system_message, anthropic_messages = self.convert_messages(chat_messages)
 
         # Prepare tools
         tools_list = None
         if tools is not None:
-            openai_tools = tools.get_tools()
-            tools_list = [
-                self.convert_openai_tool_to_anthropic(tool)
-                for tool in openai_tools
-            ]
+            tools_list = convert_tools(
+                tools,
+                type(self),
+                lambda openai_tools: [
+                    self.convert_openai_tool_to_anthropic(tool)
+                    for tool in openai_tools
+                ],
+            )
 
         # Build args - max_tokens is required by Anthropic API
         # Use extra_kwargs max_tokens if provided, otherwise default to 4096
         args = dict(
             model=self.model,
-            messages=anthropic_messages,
+            # a copy: the converted messages are kept for the next request
+            messages=list(anthropic_messages),
             max_tokens=self.extra_kwargs.get("max_tokens", 4096),
         )
 
@@ -264,6 +432,9 @@ class AnthropicClient(LLMClient):
         if tools_list is not None:
             args["tools"] = tools_list
 
+        if self.prompt_caching:
+            self.add_cache_breakpoints(args)
+
         # Handle structured output
         if output_format is not None:
             # Use Anthropic's structured output feature
@@ -277,4 +448,301 @@ class AnthropicClient(LLMClient):
                 },
             }
 
-        return self.client.messages.create(**args)
+        return _add_request_timeout(args)
+
+    def convert_messages(self, chat_messages: List) -> tuple:
+        """
+        Convert the messages of AnthropicMessagesRunner into the system
+        prompt and the messages of the Messages API.
+
+        Tool results become tool_result blocks, and consecutive tool results
+        are merged into one user message. For a Conversation the result is
+        kept in its state, so the next request of the tool-call loop only
+        converts the messages appended since.
+
+        Returns:
+            (system, messages); don't change the returned messages
+        """
+        state = getattr(chat_messages, "state", None)
+        if not isinstance(state, dict):
+            state = None
+
+        converted, system_message, anthropic_messages = (
+            state.get(ANTHROPIC_MESSAGES_STATE) if state is not None else None
+        ) or (0, None, [])
+
+        for msg in chat_messages[converted:]:
+            system_message = self._add_message(anthropic_messages, msg, system_message)
+
+        if state is not None:
+            state[ANTHROPIC_MESSAGES_STATE] = (
+                len(chat_messages),
+                system_message,
+                anthropic_messages,
+            )
+
+        return system_message, anthropic_messages
+
+    @staticmethod
+    def _add_message(anthropic_messages: list, msg, system_message):
+        """Add msg to anthropic_messages, return the system prompt."""
+        role = msg.get("role")
+        content = msg.get("content")
+
+        if role == "system":
+            # Anthropic expects system message as a separate parameter,
+            # a list when it has blocks (e.g. with cache_control)
+            if isinstance(content, (str, list)):
+                return content
+        elif role in ("user", "assistant"):
+            anthropic_messages.append({
+                "role": role,
+                "content": content if isinstance(content, (str, list)) else str(content)
+            })
+        elif role == "tool":
+            # Anthropic expects tool results inside a user message with
+            # tool_result blocks, one message for all results of a turn
+            tool_result = {
+                "type": "tool_result",
+                "tool_use_id": msg.get("tool_call_id", ""),
+                "content": content if isinstance(content, str) else str(content),
+            }
+            last = anthropic_messages[-1] if anthropic_messages else None
+            if last is not None and _is_tool_result_message(last):
+                anthropic_messages[-1] = {
+                    "role": "user",
+                    "content": last["content"] + [tool_result],
+                }
+            else:
+                anthropic_messages.append({"role": "user", "content": [tool_result]})
+
+        return system_message
+
+    def add_cache_breakpoints(self, args: dict):
+        """
+        Put cache_control breakpoints on the system prompt, the last tool and
+        the last block of the last message.
+
+        The prefix up to the last message is the same in the next request of
+        the tool-call loop, so every request reads the previous one from the
+        cache and only the new messages are processed at the full price.
+        Uses three of the four breakpoints a request may have.
+        """
+        system = args.get("system")
+        if isinstance(system, str) and system:
+            args["system"] = [
+                {"type": "text", "text": system, "cache_control": CACHE_CONTROL}
+            ]
+        elif isinstance(system, list) and system:
+            args["system"] = self._with_cache_control(system)
+
+        tools = args.get("tools")
+        if tools:
+            args["tools"] = tools[:-1] + [dict(tools[-1], cache_control=CACHE_CONTROL)]
+
+        messages = args["messages"]
+        if messages:
+            last_message = messages[-1]
+            content = last_message["content"]
+
+            if isinstance(content, str) and content:
+                content = [
+                    {"type": "text", "text": content, "cache_control": CACHE_CONTROL}
+                ]
+            elif isinstance(content, list):
+                content = self._with_cache_control(content)
+
+            messages[-1] = dict(last_message, content=content)
+
+    @staticmethod
+    def _with_cache_control(blocks: list) -> list:
+        """Copy of blocks with a breakpoint on the last block that can have one."""
+        blocks = list(blocks)
+
+        for i in range(len(blocks) - 1, -1, -1):
+            block = blocks[i]
+            if isinstance(block, BaseModel):
+                block = block.model_dump(exclude_none=True)
+
+            # Thinking blocks can't be marked directly, they are cached
+            # together with the blocks around them
+            if block.get("type") in ("thinking", "redacted_thinking"):
+                continue
+
+            blocks[i] = dict(block, cache_control=CACHE_CONTROL)
+            break
+
+        return blocks
+
+    def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+    ) -> Message:
+        """
+        Send a request to Anthropic's Messages API.
+
+        Args:
+            chat_messages: List of message dictionaries with 'role' and 'content'
+            tools: Optional Tools object with function definitions
+            output_format: Optional Pydantic BaseModel for structured output
+            stream: Return the stream of raw message events instead of the Message
+
+        Returns:
+            Message response from Anthropic
+        """
+        args = self.build_request_args(chat_messages, tools, output_format)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            return client.messages.create(stream=True, **args)
+
+        if self.raw_responses:
+            return parse_raw_response(client.messages.with_raw_response.create(**args))
+
+        return client.messages.create(**args)
+
+
+class AsyncOpenAIClient(OpenAIClient, AsyncLLMClient):
+    """Async counterpart of OpenAIClient built on AsyncOpenAI."""
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        client: AsyncOpenAI = None,
+        extra_kwargs: dict = None,
+        raw_responses: bool = False,
+    ):
+        if client is None:
+            registry = get_shared_registry()
+            client = registry.async_openai() if registry is not None else AsyncOpenAI()
+
+        super().__init__(
+            model=model,
+            client=client,
+            extra_kwargs=extra_kwargs,
+            raw_responses=raw_responses,
+        )
+
+    async def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+        previous_response_id: str = None,
+    ) -> Response | ParsedResponse:
+        args = self.build_request_args(chat_messages, tools, previous_response_id)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            return await client.responses.create(stream=True, **args)
+
+        if output_format is not None:
+            return await client.responses.parse(
+                text_format=output_format,
+                **args,
+            )
+
+        if self.raw_responses:
+            return parse_raw_response(
+                await client.responses.with_raw_response.create(**args)
+            )
+
+        return await client.responses.create(**args)
+
+
+class AsyncOpenAIChatCompletionsClient(OpenAIChatCompletionsClient, AsyncLLMClient):
+    """Async counterpart of OpenAIChatCompletionsClient built on AsyncOpenAI."""
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        client: AsyncOpenAI = None,
+        extra_kwargs: dict = None,
+        raw_responses: bool = False,
+    ):
+        if client is None:
+            registry = get_shared_registry()
+            client = registry.async_openai() if registry is not None else AsyncOpenAI()
+
+        super().__init__(
+            model=model,
+            client=client,
+            extra_kwargs=extra_kwargs,
+            raw_responses=raw_responses,
+        )
+
+    async def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+    ) -> ChatCompletion | ParsedChatCompletion:
+        args = self.build_request_args(chat_messages, tools, output_format)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            args.setdefault("stream_options", {"include_usage": True})
+            return await client.chat.completions.create(stream=True, **args)
+
+        if output_format is not None:
+            return await client.chat.completions.parse(
+                response_format=output_format,
+                **args,
+            )
+
+        if self.raw_responses:
+            return parse_raw_response(
+                await client.chat.completions.with_raw_response.create(**args)
+            )
+
+        return await client.chat.completions.create(**args)
+
+
+class AsyncAnthropicClient(AnthropicClient, AsyncLLMClient):
+    """Async counterpart of AnthropicClient built on AsyncAnthropic."""
+
+    def _create_client(self, **client_kwargs):
+        registry = get_shared_registry()
+        if registry is not None:
+            return registry.async_anthropic(**client_kwargs)
+
+        try:
+            from anthropic import AsyncAnthropic
+        except ImportError:
+            raise ImportError(
+                "Please run 'pip install anthropic' to use AsyncAnthropicClient"
+            )
+
+        return AsyncAnthropic(**client_kwargs)
+
+    async def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        stream: bool = False,
+    ) -> Message:
+        """
+        Send a request to Anthropic's Messages API without blocking the event loop.
+        """
+        args = self.build_request_args(chat_messages, tools, output_format)
+        client = _client_for_request(self.client)
+
+        if stream:
+            _check_stream_args(output_format)
+            return await client.messages.create(stream=True, **args)
+
+        if self.raw_responses:
+            return parse_raw_response(
+                await client.messages.with_raw_response.create(**args)
+            )
+
+        return await client.messages.create(**args)
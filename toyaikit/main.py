@@ -2,6 +2,7 @@ from openai import OpenAI
 
 from toyaikit.chat.chat import ChatAssistant
 from toyaikit.chat.interface import IPythonChatInterface
+from toyaikit.connections import get_shared_registry
 from toyaikit.llm import OpenAIClient
 from toyaikit.tools import Tools
 
@@ -12,7 +13,8 @@ def init(
     tools = Tools()
 
     if client is None:
-        client = OpenAI()
+        registry = get_shared_registry()
+        client = registry.openai() if registry is not None else OpenAI()
     llm_client = OpenAIClient(model, client)
 
     chat_interface = IPythonChatInterface()
@@ -1,7 +1,7 @@
 import warnings
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Union
+from typing import Iterable, Union
 
 from genai_prices import Usage, calc_price
 from genai_prices import data as genai_data
@@ -16,9 +16,72 @@ class UnknownModelWarning(UserWarning):
 
 @dataclass
 class TokenUsage:
+    """Token usage of one or more requests.
+
+    input_tokens counts all input tokens, including those written to and
+    read from the prompt cache.
+    """
+
     model: str
     input_tokens: int
     output_tokens: int
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+    def __add__(self, other: "TokenUsage") -> "TokenUsage":
+        if other.model != self.model:
+            raise ValueError(
+                f"Can't add the tokens of {other.model} to those of {self.model}, "
+                "they have different prices (see UsageByModel)"
+            )
+        return TokenUsage(
+            model=self.model,
+            input_tokens=self.input_tokens + other.input_tokens,
+            output_tokens=self.output_tokens + other.output_tokens,
+            cache_creation_input_tokens=(
+                self.cache_creation_input_tokens + other.cache_creation_input_tokens
+            ),
+            cache_read_input_tokens=(
+                self.cache_read_input_tokens + other.cache_read_input_tokens
+            ),
+        )
+
+
+class UsageByModel(dict):
+    """Token usage of requests answered by different models, by model.
+
+    Wrapper clients like RoutingClient answer with different models, so
+    the tokens of a loop are kept per model and each model's tokens are
+    priced with its own prices (see PricingConfig.calculate_total_cost).
+    """
+
+    def add(self, usage: TokenUsage):
+        current = self.get(usage.model)
+        self[usage.model] = usage if current is None else current + usage
+
+    def merge(self, other: "UsageByModel"):
+        for usage in other.values():
+            self.add(usage)
+
+    def total(self, model: str) -> TokenUsage:
+        """The tokens of all models together. The total is under the one
+        model if there is only one, model if there are none, otherwise
+        under the models joined by '+'."""
+        models = sorted(self)
+        if len(models) == 1:
+            return self[models[0]]
+
+        return TokenUsage(
+            model="+".join(models) if models else model,
+            input_tokens=sum(u.input_tokens for u in self.values()),
+            output_tokens=sum(u.output_tokens for u in self.values()),
+            cache_creation_input_tokens=sum(
+                u.cache_creation_input_tokens for u in self.values()
+            ),
+            cache_read_input_tokens=sum(
+                u.cache_read_input_tokens for u in self.values()
+            ),
+        )
 
 
 @dataclass
@@ -52,7 +115,14 @@ class PricingConfig:
             k: dict(v) for k, v in FALLBACK_PRICING.items()
         }
 
-    def register_model(self, model: str, input_price: Price, output_price: Price) -> None:
+    def register_model(
+        self,
+        model: str,
+        input_price: Price,
+        output_price: Price,
+        cache_write_price: Price = None,
+        cache_read_price: Price = None,
+    ) -> None:
         """Register fallback pricing for a model not covered by genai_prices.
 
         Prices are per 1M tokens (e.g. 0.6 for $0.60 per 1M tokens). Re-registering
@@ -61,13 +131,28 @@ class PricingConfig:
         :param str model: Model name (case-insensitive)
         :param Price input_price: Price per 1M input tokens
         :param Price output_price: Price per 1M output tokens
+        :param Price cache_write_price: Price per 1M tokens written to the prompt cache (input_price if not set)
+        :param Price cache_read_price: Price per 1M tokens read from the prompt cache (input_price if not set)
         """
-        self._fallback_pricing[model.lower()] = {
+        pricing = {
             "input": Decimal(str(input_price)),
             "output": Decimal(str(output_price)),
         }
-
-    def calculate_cost(self, model: str, input_tokens: int, output_tokens: int):
+        if cache_write_price is not None:
+            pricing["cache_write"] = Decimal(str(cache_write_price))
+        if cache_read_price is not None:
+            pricing["cache_read"] = Decimal(str(cache_read_price))
+
+        self._fallback_pricing[model.lower()] = pricing
+
+    def calculate_cost(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_creation_input_tokens: int = 0,
+        cache_read_input_tokens: int = 0,
+    ):
         """Calculate cost for a LLM API call based on token usage.
 
         Falls back to user-registered pricing when the model is not known to
@@ -75,8 +160,10 @@ class PricingConfig:
         when no pricing is available.
 
         :param str model: Name of LLM model
-        :param int input_tokens: Number of input tokens
+        :param int input_tokens: Number of input tokens, including cached tokens
         :param int output_tokens: Number of output tokens
+        :param int cache_creation_input_tokens: Input tokens written to the prompt cache
+        :param int cache_read_input_tokens: Input tokens read from the prompt cache
         :return CostInfo | None: Object containing input cost, ouput cost and total cost, or None if model not found
         """
         try:
@@ -84,7 +171,12 @@ class PricingConfig:
             if ":" in model:
                 provider, model = model.rsplit(":", maxsplit=1)
 
-            token_usage = Usage(input_tokens=input_tokens, output_tokens=output_tokens)
+            token_usage = Usage(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cache_write_tokens=cache_creation_input_tokens,
+                cache_read_tokens=cache_read_input_tokens,
+            )
             price_data = calc_price(token_usage, provider_id=provider, model_ref=model)
 
             return CostInfo(
@@ -97,7 +189,15 @@ class PricingConfig:
             model_key = model.lower()
             if model_key in self._fallback_pricing:
                 pricing = self._fallback_pricing[model_key]
-                input_cost = (pricing["input"] * input_tokens) / Decimal("1000000")
+                uncached_tokens = (
+                    input_tokens - cache_creation_input_tokens - cache_read_input_tokens
+                )
+                input_cost = (
+                    pricing["input"] * uncached_tokens
+                    + pricing.get("cache_write", pricing["input"])
+                    * cache_creation_input_tokens
+                    + pricing.get("cache_read", pricing["input"]) * cache_read_input_tokens
+                ) / Decimal("1000000")
                 output_cost = (pricing["output"] * output_tokens) / Decimal("1000000")
                 return CostInfo.create(input_cost=input_cost, output_cost=output_cost)
 
@@ -109,6 +209,29 @@ class PricingConfig:
             )
             return None
 
+    def calculate_usage_cost(self, usage: TokenUsage):
+        """Calculate cost of a TokenUsage, see calculate_cost."""
+        return self.calculate_cost(
+            usage.model,
+            usage.input_tokens,
+            usage.output_tokens,
+            cache_creation_input_tokens=usage.cache_creation_input_tokens,
+            cache_read_input_tokens=usage.cache_read_input_tokens,
+        )
+
+    def calculate_total_cost(self, usages: Iterable[TokenUsage]):
+        """Sum of the costs of usages, each priced with its own model.
+
+        :return CostInfo | None: The total cost, or None if a model has no pricing
+        """
+        total = CostInfo.create(Decimal(0), Decimal(0))
+        for usage in usages:
+            cost = self.calculate_usage_cost(usage)
+            if cost is None:
+                return None
+            total = total + cost
+        return total
+
     def all_available_models(self):
         """Lists all available models which has price data.
 
@@ -0,0 +1,533 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Sequence
+
+from toyaikit.chat.context import estimate_tokens
+from toyaikit.deadlines import DeadlineExceeded, request_timeout
+from toyaikit.llm import AsyncLLMClient, LLMClient
+from toyaikit.tools import Tools
+
+# Bucket key of the request being sent, read by the httpx response hooks
+_current_key: ContextVar[str | None] = ContextVar("ratelimit_key", default=None)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+@dataclass
+class RateLimit:
+    """Requests and tokens per minute allowed for a model."""
+
+    requests_per_minute: int = None
+    tokens_per_minute: int = None
+
+
+def parse_reset(value: str, now: float = None) -> float | None:
+    """
+    Seconds until a rate limit resets, from a header value. Understands
+    OpenAI durations ("1s", "6m0s", "20ms"), plain seconds and Anthropic's
+    RFC 3339 timestamps.
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(n + unit for n, unit in parts) == value:
+        units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+        return sum(float(n) * units[unit] for n, unit in parts)
+
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    if now is None:
+        now = time.time()
+    return max(reset_at.timestamp() - now, 0.0)
+
+
+def _first_header(headers, names: Sequence[str]) -> str | None:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _to_int(value: str | None) -> int | None:
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def get_response_tokens(response) -> int | None:
+    """Total tokens of a Responses, Chat Completions or Messages response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+
+    total = getattr(usage, "total_tokens", None)
+    if isinstance(total, int):
+        return total
+
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is None:
+        input_tokens = getattr(usage, "prompt_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None)
+    if output_tokens is None:
+        output_tokens = getattr(usage, "completion_tokens", None)
+
+    if not isinstance(input_tokens, int) or not isinstance(output_tokens, int):
+        return None
+    return input_tokens + output_tokens
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity per `period` seconds.
+
+    Callers reserve what they need up front and the level may go below
+    zero: the returned delay is how long the caller has to wait for its
+    share. Later callers see the deficit and wait longer, so waiting
+    callers are served in order.
+    """
+
+    def __init__(self, capacity: float, period: float, now: float):
+        self.capacity = capacity
+        self.period = period
+        self.level = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def _refill(self, now: float):
+        elapsed = max(now - self.updated, 0.0)
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take amount from the bucket and return the seconds to wait."""
+        self._refill(now)
+        # A request bigger than the bucket would never fit otherwise
+        self.level -= min(amount, self.capacity)
+
+        delay = 0.0
+        if self.level < 0:
+            delay = -self.level / self.rate
+        return max(delay, self.blocked_until - now)
+
+    def adjust(self, amount: float, now: float):
+        """Take (or give back, if negative) amount after the fact."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+    def update(
+        self,
+        now: float,
+        limit: int = None,
+        remaining: int = None,
+        reset: float = None,
+    ):
+        """Correct the bucket with what the provider reported."""
+        self._refill(now)
+
+        if limit:
+            self.capacity = limit
+            self.level = min(self.level, limit)
+
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+            if remaining <= 0 and reset:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class _Buckets:
+    def __init__(self):
+        self.requests = None
+        self.tokens = None
+
+
+class RateLimitScheduler:
+    """
+    Shared scheduler for the requests of many clients, threads and loops.
+
+    Every request of a RateLimitedClient goes through it. It keeps a
+    requests-per-minute and a tokens-per-minute bucket per model (or
+    per key/model, if the client has a key), queues callers until their
+    request fits, and retries rate-limited (429) and server (5xx) errors
+    with jittered exponential backoff, honoring retry-after.
+
+    Limits come from `limits` (by model or by "key/model") or
+    `default_limit`, and are corrected from the rate limit headers of
+    the provider: x-ratelimit-* for OpenAI and anthropic-ratelimit-* for
+    Anthropic. The headers of errors are always used. For successful
+    responses install the scheduler's hooks in the HTTP client of the SDK:
+
+        scheduler = RateLimitScheduler()
+        openai_client = OpenAI(
+            http_client=httpx.Client(event_hooks=scheduler.event_hooks),
+        )
+
+    (async_event_hooks for httpx.AsyncClient.) Without configured limits,
+    the buckets are created from the headers when they first arrive.
+
+    The SDKs retry some errors themselves; set max_retries=0 on the SDK
+    client to leave retrying to the scheduler.
+
+    Within a loop with a deadline, a request that would have to wait past
+    the deadline fails right away with DeadlineExceeded.
+
+    Args:
+        limits: RateLimits by model or "key/model"
+        default_limit: RateLimit for everything else
+        max_retries: How many times a request is retried
+        base_delay: Backoff of the first retry, doubled on each retry
+        max_delay: Upper bound of the backoff
+        token_counter: Estimates the input tokens of a request
+        clock: Monotonic clock, for tests
+        sleep: Sleep function, for tests
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, RateLimit] = None,
+        default_limit: RateLimit = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        token_counter: Callable[[Sequence], int] = estimate_tokens,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.token_counter = token_counter
+        self.clock = clock
+        self.sleep = sleep
+
+        self.retries = 0
+        self.waited_seconds = 0.0
+
+        self._buckets: dict[str, _Buckets] = {}
+        self._lock = threading.Lock()
+
+    def _get_buckets(self, key: str) -> _Buckets:
+        buckets = self._buckets.get(key)
+        if buckets is not None:
+            return buckets
+
+        buckets = _Buckets()
+        model = key.rsplit("/", 1)[-1]
+        limit = self.limits.get(key) or self.limits.get(model) or self.default_limit
+
+        now = self.clock()
+        if limit is not None and limit.requests_per_minute:
+            buckets.requests = TokenBucket(limit.requests_per_minute, 60.0, now)
+        if limit is not None and limit.tokens_per_minute:
+            buckets.tokens = TokenBucket(limit.tokens_per_minute, 60.0, now)
+
+        self._buckets[key] = buckets
+        return buckets
+
+    def reserve(self, key: str, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens, return the seconds to wait."""
+        with self._lock:
+            buckets = self._get_buckets(key)
+            now = self.clock()
+
+            delay = 0.0
+            if buckets.requests is not None:
+                delay = max(delay, buckets.requests.reserve(1, now))
+            if buckets.tokens is not None:
+                delay = max(delay, buckets.tokens.reserve(tokens, now))
+
+            self.waited_seconds += delay
+
+        return delay
+
+    def record_usage(self, key: str, reserved_tokens: int, used_tokens: int):
+        """Settle the difference between the reserved and the used tokens."""
+        with self._lock:
+            buckets = self._get_buckets(key)
+            if buckets.tokens is not None:
+                buckets.tokens.adjust(used_tokens - reserved_tokens, self.clock())
+
+    def update_from_headers(self, key: str, headers):
+        """Correct the buckets of key with the rate limit headers of a response."""
+        requests = dict(
+            limit=_to_int(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-limit-requests",
+                        "anthropic-ratelimit-requests-limit",
+                    ],
+                )
+            ),
+            remaining=_to_int(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-remaining-requests",
+                        "anthropic-ratelimit-requests-remaining",
+                    ],
+                )
+            ),
+            reset=parse_reset(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-reset-requests",
+                        "anthropic-ratelimit-requests-reset",
+                    ],
+                )
+            ),
+        )
+        tokens = dict(
+            limit=_to_int(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-limit-tokens",
+                        "anthropic-ratelimit-tokens-limit",
+                        "anthropic-ratelimit-input-tokens-limit",
+                    ],
+                )
+            ),
+            remaining=_to_int(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-remaining-tokens",
+                        "anthropic-ratelimit-tokens-remaining",
+                        "anthropic-ratelimit-input-tokens-remaining",
+                    ],
+                )
+            ),
+            reset=parse_reset(
+                _first_header(
+                    headers,
+                    [
+                        "x-ratelimit-reset-tokens",
+                        "anthropic-ratelimit-tokens-reset",
+                        "anthropic-ratelimit-input-tokens-reset",
+                    ],
+                )
+            ),
+        )
+
+        with self._lock:
+            buckets = self._get_buckets(key)
+            now = self.clock()
+
+            for name, values in (("requests", requests), ("tokens", tokens)):
+                bucket = getattr(buckets, name)
+                if bucket is None:
+                    if not values["limit"]:
+                        continue
+                    bucket = TokenBucket(values["limit"], 60.0, now)
+                    setattr(buckets, name, bucket)
+                bucket.update(now, **values)
+
+    def _on_response(self, response):
+        key = _current_key.get()
+        if key is not None:
+            self.update_from_headers(key, response.headers)
+
+    async def _aon_response(self, response):
+        self._on_response(response)
+
+    @property
+    def event_hooks(self) -> dict:
+        """Event hooks for an httpx.Client used by the SDK client."""
+        return {"response": [self._on_response]}
+
+    @property
+    def async_event_hooks(self) -> dict:
+        """Event hooks for an httpx.AsyncClient used by the SDK client."""
+        return {"response": [self._aon_response]}
+
+    def get_retry_delay(self, key: str, error: Exception, attempt: int) -> float | None:
+        """
+        Seconds to wait before retrying after error, or None if it
+        shouldn't be retried.
+        """
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            return None
+        if status_code not in RETRYABLE_STATUS_CODES and status_code < 500:
+            return None
+        if attempt >= self.max_retries:
+            return None
+
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        if headers:
+            self.update_from_headers(key, headers)
+
+        # Full jitter: spreads the retries of concurrent callers so they
+        # don't come back all at once
+        backoff = min(self.max_delay, self.base_delay * 2**attempt)
+        delay = random.uniform(0, backoff)
+
+        retry_after = _first_header(headers, ["retry-after-ms"])
+        if retry_after is not None:
+            delay = max(delay, float(retry_after) / 1000)
+        else:
+            retry_after = parse_reset(_first_header(headers, ["retry-after"]))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        self.retries += 1
+        return delay
+
+    def call(self, key: str, chat_messages: List, send: Callable):
+        """Send a request through the scheduler: wait, send, retry."""
+        tokens = self.token_counter(chat_messages)
+        attempt = 0
+
+        while True:
+            delay = self.reserve(key, tokens)
+            if delay > 0:
+                self._check_deadline(key, tokens, delay)
+                self.sleep(delay)
+
+            token = _current_key.set(key)
+            try:
+                response = send()
+            except Exception as e:
+                self.record_usage(key, tokens, 0)
+                retry_delay = self.get_retry_delay(key, e, attempt)
+                if retry_delay is None:
+                    raise
+                attempt += 1
+                self._check_deadline(key, 0, retry_delay, error=e)
+                self.sleep(retry_delay)
+                continue
+            finally:
+                _current_key.reset(token)
+
+            self._settle(key, tokens, response)
+            return response
+
+    async def acall(self, key: str, chat_messages: List, send: Callable):
+        """Async version of call(), send returns an awaitable."""
+        tokens = self.token_counter(chat_messages)
+        attempt = 0
+
+        while True:
+            delay = self.reserve(key, tokens)
+            if delay > 0:
+                self._check_deadline(key, tokens, delay)
+                await asyncio.sleep(delay)
+
+            token = _current_key.set(key)
+            try:
+                response = await send()
+            except Exception as e:
+                self.record_usage(key, tokens, 0)
+                retry_delay = self.get_retry_delay(key, e, attempt)
+                if retry_delay is None:
+                    raise
+                attempt += 1
+                self._check_deadline(key, 0, retry_delay, error=e)
+                await asyncio.sleep(retry_delay)
+                continue
+            finally:
+                _current_key.reset(token)
+
+            self._settle(key, tokens, response)
+            return response
+
+    def _check_deadline(
+        self, key: str, reserved_tokens: int, delay: float, error: Exception = None
+    ):
+        # Fail right away instead of waiting past the deadline of the loop
+        timeout = request_timeout()
+        if timeout is None or delay <= timeout:
+            return
+        if reserved_tokens:
+            self.record_usage(key, reserved_tokens, 0)
+        raise DeadlineExceeded(
+            f"Waiting {delay:.1f}s for the rate limit of {key} would miss "
+            f"the deadline, {timeout:.1f}s left"
+        ) from error
+
+    def _settle(self, key: str, reserved_tokens: int, response):
+        # Streams report usage only once consumed, keep the estimate then
+        used_tokens = get_response_tokens(response)
+        if used_tokens is not None:
+            self.record_usage(key, reserved_tokens, used_tokens)
+
+
+class RateLimitedClient(LLMClient):
+    """
+    Wraps an LLMClient so its requests go through a RateLimitScheduler.
+
+    Share one scheduler between all clients that use the same quota.
+    key separates the buckets of clients with different API keys.
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        scheduler: RateLimitScheduler,
+        key: str = None,
+    ):
+        self.client = client
+        self.scheduler = scheduler
+        self.key = key
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    @property
+    def bucket_key(self) -> str:
+        if self.key is None:
+            return self.model
+        return f"{self.key}/{self.model}"
+
+    def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        return self.scheduler.call(
+            self.bucket_key,
+            chat_messages,
+            lambda: self.client.send_request(
+                chat_messages=chat_messages, tools=tools, **kwargs
+            ),
+        )
+
+
+class AsyncRateLimitedClient(RateLimitedClient, AsyncLLMClient):
+    """RateLimitedClient for an AsyncLLMClient."""
+
+    async def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        return await self.scheduler.acall(
+            self.bucket_key,
+            chat_messages,
+            lambda: self.client.send_request(
+                chat_messages=chat_messages, tools=tools, **kwargs
+            ),
+        )
@@ -0,0 +1,56 @@
+import json
+
+
+class RawObject(dict):
+    """
+    A JSON object of a raw API response with attribute access.
+
+    Clients with raw_responses=True return responses as RawObjects
+    instead of the SDK's pydantic models: response.output[0].type works as
+    with the models, but nothing is validated and missing fields raise
+    AttributeError instead of being None. Being a dict, a RawObject can be
+    sent back to the API as is, e.g. as part of the next request's history.
+
+    model_dump(), model_dump_json() and model_validate_json() are there so
+    code written for the SDK models, like ResponseCache, works with both.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def model_dump(self, exclude_none: bool = False, **kwargs) -> dict:
+        data = json.loads(json.dumps(self))
+        if exclude_none:
+            data = _without_none(data)
+        return data
+
+    def model_dump_json(self, **kwargs) -> str:
+        return json.dumps(self)
+
+    @classmethod
+    def model_validate_json(cls, data: str | bytes) -> "RawObject":
+        return parse_raw_json(data)
+
+
+def _without_none(value):
+    if isinstance(value, dict):
+        return {k: _without_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_without_none(v) for v in value]
+    return value
+
+
+def parse_raw_json(data: str | bytes) -> RawObject:
+    """Parse the JSON body of a response into RawObjects."""
+    return json.loads(data, object_hook=RawObject)
+
+
+def parse_raw_response(raw_response) -> RawObject:
+    """Parse the body of a with_raw_response result without the SDK
+    building its models."""
+    return parse_raw_json(raw_response.content)
@@ -0,0 +1,312 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, List
+
+from toyaikit.chat.messages import decode_messages
+from toyaikit.formats import get_message_format, get_response_usage
+from toyaikit.llm import (
+    AsyncLLMClient,
+    LLMClient,
+    collect_models,
+    report_discarded,
+    report_model,
+)
+from toyaikit.pricing import CostInfo, PricingConfig, TokenUsage
+from toyaikit.tools import Tools
+
+SMALL = "small"
+LARGE = "large"
+
+
+def _no_cost() -> CostInfo:
+    return CostInfo.create(Decimal(0), Decimal(0))
+
+
+@dataclass
+class RouteStats:
+    """Requests, latency, tokens and cost of a route of a RoutingClient."""
+
+    model: str
+    requests: int = 0
+    errors: int = 0
+    # Small-model responses that were rejected and sent to the large model
+    escalations: int = 0
+    total_latency: float = 0.0
+    tokens: TokenUsage = None
+    cost: CostInfo = field(default_factory=_no_cost)
+
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = TokenUsage(model=self.model, input_tokens=0, output_tokens=0)
+
+    @property
+    def average_latency(self) -> float | None:
+        if self.requests == 0:
+            return None
+        return self.total_latency / self.requests
+
+
+class RoutingClient(LLMClient):
+    """
+    Sends each request either to a large model or to a small (cheaper,
+    faster) one.
+
+    A request goes to the small model when:
+
+    - the classifier, if given, says so: it gets the messages and returns
+      True for the small model, False for the large one or None to use the
+      rules below;
+    - otherwise, when the last message is a tool result (with
+      small_after_tool_results, e.g. a final answer from a search result)
+      and the history has at most max_small_messages messages;
+    - and the small model has been doing well: when fewer than
+      min_success_rate of its last success_window responses were
+      accepted, it only gets every probe_every-th of its requests, to
+      notice when it does better again.
+
+    A small-model response is accepted unless it raises an error or
+    accept(response) returns False; then the request is sent to the large
+    model. Streams are routed the same way but not checked.
+
+    stats has the requests, latency, tokens and cost of each route, priced
+    with pricing_config; savings() estimates what the small model saved.
+
+    Usage:
+        llm_client = RoutingClient(
+            large=OpenAIClient(model="gpt-4o"),
+            small=OpenAIClient(model="gpt-4o-mini"),
+        )
+
+    Args:
+        large: Client for hard requests and escalations
+        small: Client of the same API for easy requests
+        classifier: Optional function of the messages deciding the route
+        small_after_tool_results: Send requests that continue after tool
+            results to the small model
+        max_small_messages: Longest history for the small model
+        accept: Optional check of small-model responses
+        min_success_rate: Accepted share of recent small-model responses
+            below which the small model is only probed
+        success_window: Number of recent small-model responses considered
+        probe_every: How often an eligible request is sent to a small model
+            that isn't doing well
+        message_format: Format of the messages, detected if not given
+        pricing_config: Prices of the models
+    """
+
+    def __init__(
+        self,
+        large: LLMClient,
+        small: LLMClient,
+        classifier: Callable[[List], bool | None] = None,
+        small_after_tool_results: bool = True,
+        max_small_messages: int = 30,
+        accept: Callable[[object], bool] = None,
+        min_success_rate: float = 0.8,
+        success_window: int = 50,
+        probe_every: int = 10,
+        message_format: str = None,
+        pricing_config: PricingConfig = None,
+    ):
+        self.large = large
+        self.small = small
+        self.classifier = classifier
+        self.small_after_tool_results = small_after_tool_results
+        self.max_small_messages = max_small_messages
+        self.accept = accept
+        self.min_success_rate = min_success_rate
+        self.probe_every = probe_every
+        self.message_format = message_format or get_message_format(large)
+        self.pricing_config = pricing_config or PricingConfig()
+
+        self.stats = {
+            LARGE: RouteStats(model=large.model),
+            SMALL: RouteStats(model=small.model),
+        }
+        self.last_route = LARGE
+
+        self._outcomes = deque(maxlen=success_window)
+        self._held_back = 0
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        """Model of the client that answered the last request."""
+        return self.stats[self.last_route].model
+
+    @property
+    def small_success_rate(self) -> float | None:
+        """Share of the recent small-model responses that were accepted."""
+        if not self._outcomes:
+            return None
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def _is_easy(self, chat_messages: List) -> bool:
+        if self.classifier is not None:
+            easy = self.classifier(chat_messages)
+            if easy is not None:
+                return easy
+
+        if len(chat_messages) > self.max_small_messages or not chat_messages:
+            return False
+        if not self.small_after_tool_results:
+            return False
+
+        last = decode_messages(chat_messages[-1:], self.message_format)
+        return bool(last) and last[-1].role == "tool"
+
+    def choose_route(self, chat_messages: List) -> str:
+        """SMALL or LARGE for a request with chat_messages."""
+        if not self._is_easy(chat_messages):
+            return LARGE
+
+        with self._lock:
+            success_rate = self.small_success_rate
+            if success_rate is None or success_rate >= self.min_success_rate:
+                return SMALL
+
+            self._held_back += 1
+            if self._held_back >= self.probe_every:
+                self._held_back = 0
+                return SMALL
+            return LARGE
+
+    def _record(self, route: str, started_at: float, response=None, error=None):
+        latency = time.monotonic() - started_at
+        stats = self.stats[route]
+
+        # Streams have no usage until they are consumed
+        tokens = None
+        if getattr(response, "usage", None) is not None:
+            input_tokens, output_tokens = get_response_usage(
+                response, self.message_format
+            )
+            tokens = TokenUsage(
+                model=stats.model,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+            )
+
+        with self._lock:
+            stats.requests += 1
+            stats.total_latency += latency
+            if error is not None:
+                stats.errors += 1
+            if tokens is not None:
+                stats.tokens = stats.tokens + tokens
+                # None for a model without pricing
+                cost = self.pricing_config.calculate_usage_cost(tokens)
+                if cost is not None:
+                    stats.cost = stats.cost + cost
+
+    def _record_outcome(self, accepted: bool):
+        with self._lock:
+            self._outcomes.append(accepted)
+            if not accepted:
+                self.stats[SMALL].escalations += 1
+
+    def _accepted(self, response, stream: bool) -> bool:
+        return stream or self.accept is None or self.accept(response)
+
+    def savings(self) -> Decimal | None:
+        """What the small-model requests would have cost more on the large
+        model, estimated from their tokens. None if either model has no
+        price."""
+        small = self.stats[SMALL]
+        large_tokens = TokenUsage(
+            model=self.stats[LARGE].model,
+            input_tokens=small.tokens.input_tokens,
+            output_tokens=small.tokens.output_tokens,
+        )
+        large_cost = self.pricing_config.calculate_usage_cost(large_tokens)
+        small_cost = self.pricing_config.calculate_usage_cost(small.tokens)
+        if large_cost is None or small_cost is None:
+            return None
+        return large_cost.total_cost - small_cost.total_cost
+
+    def _send(self, route: str, chat_messages: List, tools: Tools, kwargs: dict):
+        client = self.small if route == SMALL else self.large
+        started_at = time.monotonic()
+        try:
+            # Only the model of the response returned is reported
+            with collect_models() as models:
+                response = client.send_request(
+                    chat_messages=chat_messages, tools=tools, **kwargs
+                )
+        except Exception as e:
+            self._record(route, started_at, error=e)
+            raise
+        self._record(route, started_at, response=response)
+        return response, models[0] if models else client.model
+
+    def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        route = self.choose_route(chat_messages)
+
+        if route == SMALL:
+            try:
+                response, model = self._send(SMALL, chat_messages, tools, kwargs)
+            except Exception:
+                response = None
+                accepted = False
+            else:
+                accepted = self._accepted(response, kwargs.get("stream"))
+
+            self._record_outcome(accepted)
+            if accepted:
+                self.last_route = SMALL
+                report_model(model)
+                return response
+            if response is not None:
+                report_discarded(response, model)
+
+        response, model = self._send(LARGE, chat_messages, tools, kwargs)
+        self.last_route = LARGE
+        report_model(model)
+        return response
+
+
+class AsyncRoutingClient(RoutingClient, AsyncLLMClient):
+    """RoutingClient for AsyncLLMClients."""
+
+    async def _send(self, route: str, chat_messages: List, tools: Tools, kwargs):
+        client = self.small if route == SMALL else self.large
+        started_at = time.monotonic()
+        try:
+            # Only the model of the response returned is reported
+            with collect_models() as models:
+                response = await client.send_request(
+                    chat_messages=chat_messages, tools=tools, **kwargs
+                )
+        except Exception as e:
+            self._record(route, started_at, error=e)
+            raise
+        self._record(route, started_at, response=response)
+        return response, models[0] if models else client.model
+
+    async def send_request(self, chat_messages: List, tools: Tools = None, **kwargs):
+        route = self.choose_route(chat_messages)
+
+        if route == SMALL:
+            try:
+                response, model = await self._send(SMALL, chat_messages, tools, kwargs)
+            except Exception:
+                response = None
+                accepted = False
+            else:
+                accepted = self._accepted(response, kwargs.get("stream"))
+
+            self._record_outcome(accepted)
+            if accepted:
+                self.last_route = SMALL
+                report_model(model)
+                return response
+            if response is not None:
+                report_discarded(response, model)
+
+        response, model = await self._send(LARGE, chat_messages, tools, kwargs)
+        self.last_route = LARGE
+        report_model(model)
+        return response
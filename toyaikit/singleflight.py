@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from typing import List
+
+from pydantic import BaseModel
+
+from toyaikit.cache import request_key
+from toyaikit.llm import AsyncLLMClient, LLMClient
+from toyaikit.tools import Tools
+
+
+class _Call:
+    """A request in flight and the callers waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SingleFlightClient(LLMClient):
+    """
+    Wraps an LLMClient so identical requests sent at the same time share
+    one call.
+
+    Requests are identical when their request_key() is the same (see
+    toyaikit.cache). The first one is sent, the others wait for it and
+    get the same response, or the same error. Requests that arrive after
+    the response are sent again, combine with CachedClient to reuse
+    responses for longer. Streamed requests are always sent.
+
+    calls counts the requests sent to the client, collapsed the ones that
+    shared the call of another.
+
+    Usage:
+        llm_client = SingleFlightClient(OpenAIClient())
+    """
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+
+        self.calls = 0
+        self.collapsed = 0
+
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct requests being sent."""
+        return len(self._in_flight)
+
+    def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        **kwargs,
+    ):
+        if kwargs.get("stream"):
+            return self.client.send_request(
+                chat_messages=chat_messages,
+                tools=tools,
+                output_format=output_format,
+                **kwargs,
+            )
+
+        key = request_key(self.client, chat_messages, tools, output_format, **kwargs)
+
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self.client.send_request(
+                chat_messages=chat_messages,
+                tools=tools,
+                output_format=output_format,
+                **kwargs,
+            )
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+
+class AsyncSingleFlightClient(SingleFlightClient, AsyncLLMClient):
+    """SingleFlightClient for an AsyncLLMClient."""
+
+    async def send_request(
+        self,
+        chat_messages: List,
+        tools: Tools = None,
+        output_format: BaseModel = None,
+        **kwargs,
+    ):
+        if kwargs.get("stream"):
+            return await self.client.send_request(
+                chat_messages=chat_messages,
+                tools=tools,
+                output_format=output_format,
+                **kwargs,
+            )
+
+        key = request_key(self.client, chat_messages, tools, output_format, **kwargs)
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.client.send_request(
+                    chat_messages=chat_messages,
+                    tools=tools,
+                    output_format=output_format,
+                    **kwargs,
+                )
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.calls += 1
+        else:
+            self.collapsed += 1
+
+        # A cancelled caller stops waiting, the call goes on for the others
+        return await asyncio.shield(task)
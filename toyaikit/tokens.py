@@ -0,0 +1,140 @@
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from typing import Sequence
+
+from toyaikit.tools import convert_tools
+from toyaikit.utils import to_jsonable
+
+# Characters per token of the heuristic, by model name prefix. Anthropic
+# doesn't publish its tokenizer, Claude models produce more tokens for the
+# same text than OpenAI's
+CHARS_PER_TOKEN = {
+    "claude": 3.5,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+DEFAULT_ENCODING = "o200k_base"
+
+_estimator_ids = itertools.count()
+
+
+def _serialize(value) -> str:
+    return json.dumps(value, default=to_jsonable, ensure_ascii=False)
+
+
+def load_encoding(model: str = None):
+    """
+    tiktoken encoding of an OpenAI model, None if tiktoken isn't installed
+    or the model isn't an OpenAI model.
+    """
+    if model is not None and model.startswith(tuple(CHARS_PER_TOKEN)):
+        return None
+
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except (KeyError, TypeError):
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+class TokenEstimator:
+    """
+    Estimates the input tokens of a request before it's sent.
+
+    Text is counted with the model's tiktoken encoding when tiktoken is
+    installed ('pip install tiktoken') and the model is an OpenAI model,
+    otherwise with a characters-per-token heuristic. A message is counted
+    as its JSON, which includes its role and structure.
+
+    The count of each message is memoized, so estimating a growing
+    history only counts the new messages; for a Conversation the running
+    total is kept in its state. Messages must not be changed once counted.
+
+    A TokenEstimator can be used as the token_counter of a ContextPolicy,
+    the policy then counts the tools into the budget as well.
+
+    Args:
+        model: Model the requests are for, selects encoding and heuristic
+        encoding: An object with encode(text), e.g. a tiktoken Encoding,
+            instead of the model's
+        chars_per_token: Ratio of the heuristic, by model if not given
+        max_cached_messages: Number of message counts memoized
+    """
+
+    def __init__(
+        self,
+        model: str = None,
+        encoding=None,
+        chars_per_token: float = None,
+        max_cached_messages: int = 10_000,
+    ):
+        self.model = model
+        self.encoding = encoding if encoding is not None else load_encoding(model)
+
+        if chars_per_token is None:
+            chars_per_token = DEFAULT_CHARS_PER_TOKEN
+            for prefix, ratio in CHARS_PER_TOKEN.items():
+                if model is not None and model.startswith(prefix):
+                    chars_per_token = ratio
+        self.chars_per_token = chars_per_token
+
+        self.max_cached_messages = max_cached_messages
+        # id -> (message, tokens); the message is kept so its id isn't reused
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self._state_key = ("token_estimate", next(_estimator_ids))
+
+    def count_text(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return int(len(text) / self.chars_per_token)
+
+    def count_message(self, message) -> int:
+        key = id(message)
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None and cached[0] is message:
+                self._counts.move_to_end(key)
+                return cached[1]
+
+        tokens = self.count_text(_serialize(message))
+
+        with self._lock:
+            self._counts[key] = (message, tokens)
+            if len(self._counts) > self.max_cached_messages:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: Sequence) -> int:
+        state = getattr(messages, "state", None)
+        if not isinstance(state, dict):
+            return sum(self.count_message(message) for message in messages)
+
+        counted, total = state.get(self._state_key, (0, 0))
+        if counted < len(messages):
+            total += sum(self.count_message(m) for m in messages[counted:])
+            state[self._state_key] = (len(messages), total)
+        return total
+
+    def __call__(self, messages: Sequence) -> int:
+        return self.count_messages(messages)
+
+    def count_tools(self, tools) -> int:
+        """Tokens of the tool schemas, counted once per Tools version."""
+        if tools is None:
+            return 0
+        return convert_tools(
+            tools,
+            self._state_key,
+            lambda schemas: self.count_text(_serialize(schemas)) if schemas else 0,
+        )
+
+    def estimate_request(self, messages: Sequence, tools=None) -> int:
+        """Input tokens of a request with messages and tools."""
+        return self.count_messages(messages) + self.count_tools(tools)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import string
+import threading
+from collections import OrderedDict
+
+READ_TOOL_OUTPUT = "read_tool_output"
+
+
+def _handle(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class MemoryBlobStore:
+    """
+    Tool outputs kept in memory, up to max_total_chars characters in all.
+
+    When a new output doesn't fit, the least recently used ones are
+    evicted, and reading them raises KeyError. Use a DiskBlobStore when
+    the outputs must be kept longer than that.
+
+    Args:
+        max_total_chars: Characters kept at most; the last output stored
+            is kept even if it's longer
+    """
+
+    def __init__(self, max_total_chars: int = 50_000_000):
+        self.max_total_chars = max_total_chars
+        self._blobs = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: str) -> str:
+        """Store data and return its handle."""
+        handle = _handle(data)
+        with self._lock:
+            if handle in self._blobs:
+                self._blobs.move_to_end(handle)
+                return handle
+
+            self._blobs[handle] = data
+            self._total_chars += len(data)
+            while self._total_chars > self.max_total_chars and len(self._blobs) > 1:
+                _, evicted = self._blobs.popitem(last=False)
+                self._total_chars -= len(evicted)
+        return handle
+
+    def get(self, handle: str) -> str:
+        """Return the data stored under handle, KeyError if there is none."""
+        with self._lock:
+            data = self._blobs[handle]
+            self._blobs.move_to_end(handle)
+            return data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._blobs)
+
+
+class DiskBlobStore:
+    """
+    Tool outputs stored as files in a directory, one file per output, so
+    they survive restarts and don't take memory.
+
+    Args:
+        directory: Directory for the files, created if it doesn't exist
+    """
+
+    def __init__(self, directory: str = ".toyaikit_tool_outputs"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, handle: str) -> str:
+        # handles come from the model, so only accept the ones put() creates
+        if not handle or any(c not in string.hexdigits for c in handle):
+            raise KeyError(handle)
+        return os.path.join(self.directory, f"{handle}.txt")
+
+    def put(self, data: str) -> str:
+        """Store data and return its handle."""
+        handle = _handle(data)
+        path = self._path(handle)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return handle
+
+    def get(self, handle: str) -> str:
+        """Return the data stored under handle, KeyError if there is none."""
+        try:
+            with open(self._path(handle), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(handle) from None
+
+
+class ToolOutputPolicy:
+    """
+    Keeps large tool outputs out of the history.
+
+    An output longer than max_chars is put into the store, and the model
+    gets a preview of its first preview_chars characters with a handle
+    instead. Tools with an output policy register a read_tool_output
+    tool, so the model can read the rest page by page when it needs it.
+
+    Usage:
+        tools = Tools(output_policy=ToolOutputPolicy(max_chars=8000))
+
+    Args:
+        max_chars: Longest output sent to the model as it is
+        preview_chars: Length of the preview of a stored output
+        store: MemoryBlobStore (default), DiskBlobStore or any object
+            with put(data) -> handle and get(handle) -> data
+    """
+
+    def __init__(
+        self,
+        max_chars: int = 8000,
+        preview_chars: int = 2000,
+        store=None,
+    ):
+        if preview_chars > max_chars:
+            raise ValueError("preview_chars must not be larger than max_chars")
+
+        self.max_chars = max_chars
+        self.preview_chars = preview_chars
+        self.store = store if store is not None else MemoryBlobStore()
+
+    def apply(self, output: str, tool_name: str = None) -> str:
+        """Return the output to send to the model for a tool output."""
+        # pages of stored outputs are limited by read_tool_output itself
+        if len(output) <= self.max_chars or tool_name == READ_TOOL_OUTPUT:
+            return output
+
+        handle = self.store.put(output)
+        reference = {
+            "preview": output[: self.preview_chars],
+            "handle": handle,
+            "total_length": len(output),
+            "note": (
+                f"The output is truncated after {self.preview_chars} of "
+                f"{len(output)} characters. Call {READ_TOOL_OUTPUT} with this "
+                "handle to read the rest."
+            ),
+        }
+        return json.dumps(reference, indent=2)
+
+    def read_tool_output(self, handle: str, offset: int = 0, length: int = 4000):
+        """
+        Read a part of a tool output that was too long to return in full.
+
+        Args:
+            handle: The handle from the truncated output
+            offset: Position of the first character to read
+            length: Number of characters to read
+        """
+        data = self.store.get(handle)
+        offset = max(int(offset), 0)
+        length = min(max(int(length), 1), self.max_chars)
+
+        content = data[offset : offset + length]
+        end = offset + len(content)
+
+        return {
+            "handle": handle,
+            "offset": offset,
+            "content": content,
+            "total_length": len(data),
+            "next_offset": end if end < len(data) else None,
+        }
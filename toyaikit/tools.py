@@ -1,14 +1,33 @@
+import asyncio
+import functools
 import inspect
 import json
+from concurrent.futures import Executor
 from typing import get_type_hints
 
 from openai.types.responses.response_input_param import FunctionCallOutput
 
+from toyaikit.tool_outputs import ToolOutputPolicy
+
 
 class Tools:
-    def __init__(self):
+    def __init__(self, output_policy: ToolOutputPolicy = None):
+        """
+        Args:
+            output_policy: Optional ToolOutputPolicy for large outputs. Its
+                read_tool_output tool is added automatically.
+        """
         self.tools = {}
         self.functions = {}
+        self.output_policy = output_policy
+
+        # Bumped by add_tool, the converted schemas are kept per version
+        self.version = 0
+        self._tools_list = None
+        self._converted = {}
+
+        if output_policy is not None:
+            self.add_tool(output_policy.read_tool_output)
 
     def add_tool(self, function, schema=None):
         """
@@ -45,6 +64,10 @@ class Tools:
         self.tools[function.__name__] = schema
         self.functions[function.__name__] = function
 
+        self.version += 1
+        self._tools_list = None
+        self._converted = {}
+
     def add_tools(self, instance):
         """
         Add all tools from an instance.
@@ -57,15 +80,41 @@ class Tools:
         """
         Get the tools in the Tools object.
 
+        The list is kept until a tool is added, don't change it.
+
         Returns:
             list: A list of tools in the Tools object.
         """
-        return list(self.tools.values())
+        if self._tools_list is None:
+            self._tools_list = list(self.tools.values())
+        return self._tools_list
+
+    def get_converted_tools(self, key, convert):
+        """
+        Get convert(self.get_tools()), computed once per version.
+
+        Clients use it to convert the schemas into the format of their API
+        once instead of on every request.
+
+        Args:
+            key: Identifies the conversion, e.g. the client type and its options.
+            convert: Function of the list of tools.
+        """
+        version, converted = self._converted.get(key, (None, None))
+        if version != self.version:
+            version = self.version
+            converted = convert(self.get_tools())
+            self._converted[key] = (version, converted)
+        return converted
 
     def function_call(self, tool_call_response) -> FunctionCallOutput:
         """
         Handle a function call from the LLM.
 
+        Async tool functions are run to completion with asyncio.run, so
+        this must not be called from a running event loop for them (use
+        afunction_call instead).
+
         Args:
             tool_call_response: The tool call response from the LLM.
 
@@ -73,35 +122,93 @@ class Tools:
             dict: The result of the function call or error details if the call fails.
         """
         try:
-            function_name = tool_call_response.name
-            arguments_raw = tool_call_response.arguments
-            arguments = json.loads(arguments_raw)
+            f, arguments = self._resolve_function_call(tool_call_response)
 
-            call_id = tool_call_response.call_id
+            if inspect.iscoroutinefunction(f):
+                result = asyncio.run(f(**arguments))
+            else:
+                result = f(**arguments)
 
-            if function_name not in self.functions:
-                raise KeyError(f"Unknown function: {function_name}")
+            return self._function_call_output(tool_call_response, result)
 
-            f = self.functions[function_name]
-            result = f(**arguments)
+        except Exception as e:
+            return self._function_call_error(tool_call_response, e)
+
+    async def afunction_call(
+        self, tool_call_response, executor: Executor = None
+    ) -> FunctionCallOutput:
+        """
+        Handle a function call from the LLM inside an event loop.
 
-            return FunctionCallOutput(
-                type="function_call_output",
-                call_id=call_id,
-                output=json.dumps(result, indent=2),
-            )
+        Async tool functions are awaited directly, regular functions are
+        run in the executor (the default thread pool if not given).
+
+        Args:
+            tool_call_response: The tool call response from the LLM.
+            executor: Optional executor for regular (blocking) functions.
+
+        Returns:
+            dict: The result of the function call or error details if the call fails.
+        """
+        try:
+            f, arguments = self._resolve_function_call(tool_call_response)
+
+            if inspect.iscoroutinefunction(f):
+                result = await f(**arguments)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(
+                    executor, functools.partial(f, **arguments)
+                )
+
+            return self._function_call_output(tool_call_response, result)
 
         except Exception as e:
-            error_name = e.__class__.__name__
-            error_message = str(e)
-            error = {"error": f"{error_name}: {error_message}"}
-            call_id = tool_call_response.call_id
-
-            return FunctionCallOutput(
-                type="function_call_output",
-                call_id=call_id,
-                output=json.dumps(error, indent=2),
-            )
+            return self._function_call_error(tool_call_response, e)
+
+    def _resolve_function_call(self, tool_call_response):
+        function_name = tool_call_response.name
+        arguments_raw = tool_call_response.arguments
+        arguments = json.loads(arguments_raw)
+
+        if function_name not in self.functions:
+            raise KeyError(f"Unknown function: {function_name}")
+
+        return self.functions[function_name], arguments
+
+    def _function_call_output(self, tool_call_response, result) -> FunctionCallOutput:
+        output = json.dumps(result, indent=2)
+        if self.output_policy is not None:
+            output = self.output_policy.apply(output, tool_call_response.name)
+
+        return FunctionCallOutput(
+            type="function_call_output",
+            call_id=tool_call_response.call_id,
+            output=output,
+        )
+
+    def _function_call_error(self, tool_call_response, e) -> FunctionCallOutput:
+        error_name = e.__class__.__name__
+        error_message = str(e)
+        error = {"error": f"{error_name}: {error_message}"}
+        call_id = tool_call_response.call_id
+
+        return FunctionCallOutput(
+            type="function_call_output",
+            call_id=call_id,
+            output=json.dumps(error, indent=2),
+        )
+
+
+def convert_tools(tools, key, convert):
+    """
+    Convert the schemas of tools with convert. The result is cached in
+    Tools objects (see Tools.get_converted_tools), other tool providers
+    (e.g. MCPTools) are converted every time.
+    """
+    if getattr(tools, "version", None) is None:
+        return convert(tools.get_tools())
+    return tools.get_converted_tools(key, convert)
 
 
 def generate_function_schema(func, description=None):
@@ -1,5 +1,7 @@
 import re
 
+from pydantic import BaseModel
+
 
 def strip_matching_outer_html_tags(text: str) -> str:
     """
@@ -15,3 +17,19 @@ def strip_matching_outer_html_tags(text: str) -> str:
     if match:
         return match.group(2).strip()
     return text.strip()
+
+
+def get_field(obj, name: str, default=None):
+    """A field of a message or content part, whether it's a dict or an
+    object (e.g. a pydantic model of the SDKs)."""
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def to_jsonable(value):
+    """The default of json.dumps for messages: pydantic models as their
+    JSON data, anything else as its str()."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    return str(value)